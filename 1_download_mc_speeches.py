@@ -1,19 +1,173 @@
-import json, requests, sys
+import argparse
+import json
+import os
+import sys
+import time
+import requests
+from requests.adapters import HTTPAdapter
 
+# --- START: CONFIGURATION ---
 endpoint = "https://api.millercenter.org/speeches"
 out_file = "speeches.json"
+# Every fetched page is appended here, one speech per line
+ndjson_file = "speeches.ndjson"
+# Remembers the LastEvaluatedKey of the last page that was stored
+checkpoint_file = "speeches.sync.json"
 
-r = requests.post(url=endpoint)
-data = r.json()
-items = data['Items']
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 1.0
+REQUEST_TIMEOUT = 60
+# --- END: CONFIGURATION ---
 
-while 'LastEvaluatedKey' in data:
-    parameters = {"LastEvaluatedKey": data['LastEvaluatedKey']['doc_name']}
-    r = requests.post(url = endpoint, params = parameters)
-    data = r.json()
-    items += data['Items']
-    print(f'{len(items)} speeches')
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
-with open(out_file, "w") as out:
-    out.write(json.dumps(items))
-    print(f'wrote results to file: {out_file}')
\ No newline at end of file
+def make_session(pool_size=4):
+    """Creates a requests.Session that keeps its connections alive between pages."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def post_with_retry(session, url, params=None, retries=MAX_RETRIES, backoff=BACKOFF_SECONDS):
+    """POSTs to the API, retrying connection errors and 429/5xx answers with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            r = session.post(url=url, params=params, timeout=REQUEST_TIMEOUT)
+            if r.status_code not in RETRY_STATUS_CODES:
+                if not r.ok:
+                    # Other 4xx answers will not change on a retry
+                    raise RuntimeError(f"{url} answered HTTP {r.status_code} {r.reason}, not retrying")
+                return r.json()
+            error = f"HTTP {r.status_code}"
+        except (requests.ConnectionError, requests.Timeout, ValueError) as e:
+            error = str(e)
+
+        if attempt == retries:
+            raise RuntimeError(f"giving up on {url} after {retries + 1} attempts: {error}")
+        delay = backoff * 2 ** attempt
+        print(f"request failed ({error}), retrying in {delay:.1f}s...")
+        time.sleep(delay)
+
+def load_stored_doc_names(path):
+    """Returns the doc_name of every speech already stored in the NDJSON file."""
+    doc_names = set()
+    if not os.path.exists(path):
+        return doc_names
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                doc_names.add(json.loads(line)['doc_name'])
+            except (ValueError, KeyError):
+                # A line cut short by an interrupted run; the speech is fetched again
+                continue
+    return doc_names
+
+def ends_with_newline(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return True
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+def sync(session, url, ndjson_path, checkpoint_path):
+    """
+    Pages through the API and appends every speech that is not stored yet to the NDJSON file.
+    Resumes from the checkpointed LastEvaluatedKey when the previous sync was interrupted.
+    Returns the number of new speeches.
+    """
+    stored = load_stored_doc_names(ndjson_path)
+    checkpoint = load_checkpoint(checkpoint_path)
+    last_key = None
+    if checkpoint and not checkpoint.get('complete'):
+        last_key = checkpoint.get('last_evaluated_key')
+        print(f"resuming interrupted sync after '{last_key}'")
+    print(f'{len(stored)} speeches already stored')
+
+    new_count = 0
+    with open(ndjson_path, "a", encoding="utf-8") as out:
+        # Terminate a line left half-written by an interrupted run before appending
+        if not ends_with_newline(ndjson_path):
+            out.write("\n")
+        while True:
+            parameters = {"LastEvaluatedKey": last_key} if last_key else None
+            data = post_with_retry(session, url, params=parameters)
+
+            for item in data['Items']:
+                if item.get('doc_name') in stored:
+                    continue
+                out.write(json.dumps(item) + "\n")
+                stored.add(item.get('doc_name'))
+                new_count += 1
+            out.flush()
+            os.fsync(out.fileno())
+
+            last_key = data['LastEvaluatedKey']['doc_name'] if 'LastEvaluatedKey' in data else None
+            save_checkpoint(checkpoint_path, {'last_evaluated_key': last_key, 'complete': last_key is None})
+            print(f'{len(stored)} speeches ({new_count} new)')
+            if last_key is None:
+                break
+    return new_count
+
+def export_json(ndjson_path, json_path):
+    """Writes the NDJSON store as the JSON array the preprocessing script reads, one line at a time."""
+    count = 0
+    with open(ndjson_path, "r", encoding="utf-8") as src, open(json_path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for line in src:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                json.loads(line)
+            except ValueError:
+                continue
+            out.write(("," if count else "") + line)
+            count += 1
+        out.write("]")
+    return count
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download (or incrementally sync) the Miller Center speeches.")
+    parser.add_argument('--endpoint', default=endpoint, help=f"speeches API (default: {endpoint})")
+    parser.add_argument('--full', action='store_true',
+                        help="discard the stored speeches and checkpoint and download everything again")
+    parser.add_argument('--no-export', action='store_true',
+                        help=f"only update {ndjson_file}, do not rewrite {out_file}")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+
+    if args.full:
+        for path in (ndjson_file, checkpoint_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    session = make_session()
+    try:
+        new_count = sync(session, args.endpoint, ndjson_file, checkpoint_file)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        print(f"Progress is kept in '{ndjson_file}'; run the script again to resume.")
+        sys.exit(1)
+    print(f'sync complete: {new_count} new speeches')
+
+    if not args.no_export:
+        total = export_json(ndjson_file, out_file)
+        print(f'wrote {total} speeches to file: {out_file}')
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,19 @@
-import json
+import argparse
+import itertools
+from collections import deque
+import os
 import re
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-import spacy
+import time
+from importlib import metadata
 import pandas as pd
 import sys
+import instrumentation
+from instrumentation import count, timed_iter, timer, tracing
+from nltk_resources import english_stopwords, ensure_nltk_data
+from speech_cache import SpeechCache, content_hash
+from speech_dedup import DUPLICATES_PATH, load_duplicates
+from speech_store import PREPROCESSED, SpeechWriter
+from speech_stream import chunked, iter_speeches
 
 # === START: CONFIGURATION - UPDATE THESE VARIABLES ===
 # Replace these strings with the exact key names from your speeches.json file
@@ -15,80 +23,285 @@ DATE_KEY = 'date'
 TEXT_KEY = 'transcript'
 DOC_NAME_KEY = 'doc_name'
 TITLE_KEY = 'title'
+
+# Batching options for spaCy's nlp.pipe (overridable from the command line)
+BATCH_SIZE = 50
+N_PROCESS = 1
+# Speeches read, looked up in the cache and written to the output at a time
+CHUNK_SIZE = 500
 # === END: CONFIGURATION ===
 
-# Make sure you've downloaded the necessary NLTK data and spaCy model
-try:
-    nltk.data.find('corpora/stopwords')
-except nltk.downloader.DownloadError:
-    nltk.download('stopwords')
-try:
-    nltk.data.find('tokenizers/punkt')
-except nltk.downloader.DownloadError:
-    nltk.download('punkt')
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    print("SpaCy model 'en_core_web_sm' not found. Please run 'python -m spacy download en_core_web_sm'")
-    sys.exit()
+# Lemmatization only needs the tagger, the attribute ruler and the lemmatizer.
+# The dependency parser and the NER do not influence lemmas, so they are never loaded.
+SPACY_MODEL = "en_core_web_sm"
+UNUSED_PIPES = ["parser", "ner"]
+
+OUTPUT_COLUMNS = ['president', 'date', 'doc_name', 'title', 'processed_text']
+
+# Anything that changes the output of preprocess_text must be part of the cache key
+CACHE_STAGE = 'preprocess'
+# The installed version is read from the package metadata, so spaCy itself is only imported
+# once a speech actually has to be lemmatized
+CACHE_CONFIG = {'model': SPACY_MODEL, 'spacy': metadata.version('spacy'), 'stopwords': 'nltk-english'}
+
+# Loaded on first use and shared by every call instead of being rebuilt per speech
+STOP_WORDS = None
+word_tokenize = None
+
+nlp = None
+
+def load_nltk():
+    """
+    Loads the NLTK stopwords and tokenizer, downloading their data only if it is missing.
+    """
+    global STOP_WORDS, word_tokenize
+    if STOP_WORDS is None:
+        ensure_nltk_data('stopwords', 'punkt_tab')
+        from nltk.tokenize import word_tokenize
+        STOP_WORDS = english_stopwords()
+
+def load_nlp():
+    """
+    Loads the spaCy pipeline with only the components lemmatization needs.
+    """
+    global nlp
+    if nlp is None:
+        import spacy
+        try:
+            with timer('preprocess.load_model'):
+                nlp = spacy.load(SPACY_MODEL, exclude=UNUSED_PIPES)
+        except OSError:
+            print(f"SpaCy model '{SPACY_MODEL}' not found. Please run 'python -m spacy download {SPACY_MODEL}'")
+            sys.exit()
+    return nlp
+
+def clean_text(text):
+    """
+    Lowercases the text, strips non-letters and removes stopwords.
+    Returns the remaining tokens joined by spaces, ready for lemmatization.
+    """
+    if not isinstance(text, str) or not text.strip():
+        return ""
+
+    if STOP_WORDS is None:
+        load_nltk()
+    with timer('preprocess.tokenize'):
+        text = text.lower()
+        text = re.sub(r'[^a-zA-Z\s]', '', text, re.I|re.A)
+
+        tokens = word_tokenize(text)
+
+        filtered_tokens = [word for word in tokens if word not in STOP_WORDS]
+        return " ".join(filtered_tokens)
 
 def preprocess_text(text):
     """
     Cleans and prepares text data for sentiment analysis.
     """
-    if not isinstance(text, str) or not text.strip():
+    cleaned = clean_text(text)
+    if not cleaned:
         return ""
-    
-    text = text.lower()
-    text = re.sub(r'[^a-zA-Z\s]', '', text, re.I|re.A)
-    
-    tokens = word_tokenize(text)
-    
-    stop_words = set(stopwords.words('english'))
-    filtered_tokens = [word for word in tokens if word not in stop_words]
-    
-    doc = nlp(" ".join(filtered_tokens))
-    lemmatized_tokens = [token.lemma_ for token in doc]
-    
-    return " ".join(lemmatized_tokens)
-
-# Main script execution
-output_csv_path = 'preprocessed_speeches.csv'
-
-try:
-    with open(JSON_FILE_PATH, 'r', encoding='utf-8') as f:
-        speeches_data = json.load(f)
-except FileNotFoundError:
-    print(f"Error: The file {JSON_FILE_PATH} was not found.")
-    sys.exit()
-
-preprocessed_results = []
-
-for speech in speeches_data:
-    try:
-        president_name = speech.get(PRESIDENT_KEY, 'Unknown')
-        speech_date = speech.get(DATE_KEY, 'Unknown')
-        full_text = speech.get(TEXT_KEY, '')
-        doc_name = speech.get(DOC_NAME_KEY, 'Unknown')
-        speech_title = speech.get(TITLE_KEY, 'Unknown')
-
-        if full_text and isinstance(full_text, str) and full_text.strip():
-            processed_text = preprocess_text(full_text)
+
+    with timer('preprocess.lemmatize'):
+        doc = load_nlp()(cleaned)
+        return " ".join(token.lemma_ for token in doc)
+
+def preprocess_texts(texts, batch_size=BATCH_SIZE, n_process=N_PROCESS):
+    """
+    Batched version of preprocess_text built on nlp.pipe.
+    Yields one processed string per input text, in the same order.
+    """
+    cleaned_texts = (clean_text(text) for text in texts)
+    for doc in load_nlp().pipe(cleaned_texts, batch_size=batch_size, n_process=n_process):
+        yield " ".join(token.lemma_ for token in doc)
+
+def speech_record(speech):
+    """Splits a downloaded speech into its output row (without processed_text) and its transcript."""
+    row = {
+        'president': speech.get(PRESIDENT_KEY, 'Unknown'),
+        'date': speech.get(DATE_KEY, 'Unknown'),
+        'doc_name': speech.get(DOC_NAME_KEY, 'Unknown'),
+        'title': speech.get(TITLE_KEY, 'Unknown'),
+    }
+    return row, speech.get(TEXT_KEY, '')
+
+def speech_records(speeches):
+    for speech in speeches:
+        try:
+            yield speech_record(speech)
+        except Exception as e:
+            print(f"Skipping an entry due to an error: {e}")
+
+def preprocess_stream(speeches, writer, cache=None, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE, n_process=N_PROCESS):
+    """
+    Streams speeches through the cache and the spaCy pipeline into writer, chunk_size speeches
+    at a time. Cached speeches are looked up per chunk; the others go through a single nlp.pipe
+    fed lazily from the chunks, and every chunk is written as soon as all its speeches are done.
+    Only the chunks still waiting for spaCy are held in memory. When a batch fails, its speeches
+    are redone one at a time and a speech that still fails is written with an empty processed_text.
+    Returns (speeches, preprocessed).
+    """
+    # Chunks not written yet, by chunk number. spaCy gets plain (chunk number, row) contexts,
+    # since with n_process > 1 they travel through the worker processes.
+    waiting = {}
+    counts = {'chunks': 0, 'written': 0, 'speeches': 0, 'preprocessed': 0}
+
+    def flush_done():
+        while counts['written'] in waiting and waiting[counts['written']]['remaining'] == 0:
+            chunk = waiting.pop(counts['written'])
+            counts['written'] += 1
+            with timer('preprocess.write'):
+                writer.write(pd.DataFrame(chunk['rows'], columns=OUTPUT_COLUMNS))
+                if cache is not None:
+                    cache.put_many(CACHE_STAGE, [
+                        (chunk['rows'][i]['doc_name'], chunk['hashes'][i], chunk['rows'][i]['processed_text'])
+                        for i in chunk['pending'] if i not in chunk['failed']
+                    ])
+
+    def pending_texts():
+        """Yields (transcript, (chunk number, row index)) for every speech spaCy has to process."""
+        for records in chunked(speech_records(speeches), chunk_size):
+            rows = [row for row, _ in records]
+            hashes = [content_hash(text, CACHE_CONFIG) for _, text in records]
+            keys = [(row['doc_name'], digest) for row, digest in zip(rows, hashes)]
+            with timer('preprocess.cache_lookup'):
+                cached = cache.get_many(CACHE_STAGE, keys) if cache is not None else {}
+
+            pending = []
+            for i, row in enumerate(rows):
+                if keys[i] in cached:
+                    row['processed_text'] = cached[keys[i]]
+                else:
+                    pending.append(i)
+            chunk = {'rows': rows, 'hashes': hashes, 'pending': pending, 'remaining': len(pending), 'failed': set()}
+            number = counts['chunks']
+            waiting[number] = chunk
+            counts['chunks'] += 1
+            counts['speeches'] += len(rows)
+            count('docs', len(rows))
+            flush_done()
+            for i in pending:
+                yield records[i][1], (number, i)
+
+    def finish(context, doc=None, error=None):
+        number, i = context
+        chunk = waiting[number]
+        if error is None:
+            chunk['rows'][i]['processed_text'] = " ".join(token.lemma_ for token in doc)
+            counts['preprocessed'] += 1
+            count('docs_preprocessed')
+            if tracing():
+                count('tokens', len(doc))
         else:
-            processed_text = ""
-
-        preprocessed_results.append({
-            'president': president_name,
-            'date': speech_date,
-            'doc_name': doc_name,
-            'title': speech_title,
-            'processed_text': processed_text
-        })
-    except Exception as e:
-        print(f"Skipping an entry due to an error: {e}")
-
-df = pd.DataFrame(preprocessed_results)
-df.to_csv(output_csv_path, index=False)
-
-print(f"\nPreprocessing complete! The cleaned data has been saved to '{output_csv_path}'.")
-print(f"A total of {len(df)} speeches were processed.")
\ No newline at end of file
+            print(f"Skipping an entry due to an error: {error}")
+            chunk['rows'][i]['processed_text'] = ""
+            chunk['failed'].add(i)
+        chunk['remaining'] -= 1
+        flush_done()
+
+    # Speeches handed to spaCy whose doc has not come back yet, in order
+    in_flight = deque()
+    source = {'failed': False}
+
+    def cleaned_texts(items):
+        try:
+            for text, context in items:
+                try:
+                    text = clean_text(text)
+                except Exception as e:
+                    finish(context, error=e)
+                    continue
+                in_flight.append((text, context))
+                yield text, context
+        except Exception:
+            # Reading the speeches failed, not spaCy: that is not a batch to redo
+            source['failed'] = True
+            raise
+
+    items = pending_texts()
+    first = next(items, None)
+    if first is not None:
+        # spaCy is only loaded once a speech actually needs it
+        print(f"Preprocessing (batch_size={batch_size}, n_process={n_process})...")
+        nlp = load_nlp()
+        texts = cleaned_texts(itertools.chain([first], items))
+        while True:
+            docs = nlp.pipe(texts, as_tuples=True, batch_size=batch_size, n_process=n_process)
+            try:
+                # Pulling a batch from the pipe also reads, looks up and tokenizes its speeches. Those
+                # have timers of their own, so the self time of preprocess.lemmatize is spaCy's.
+                for doc, context in timed_iter(docs, 'preprocess.lemmatize'):
+                    in_flight.popleft()
+                    finish(context, doc)
+                break
+            except Exception:
+                if source['failed']:
+                    raise
+            # The failed batch, and whatever spaCy had read past it, is redone one speech at a
+            # time; then a new pipe carries on with the speeches not read yet
+            while in_flight:
+                text, context = in_flight.popleft()
+                try:
+                    doc = nlp(text)
+                except Exception as e:
+                    finish(context, error=e)
+                else:
+                    finish(context, doc)
+    flush_done()
+    return counts['speeches'], counts['preprocessed']
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Clean and lemmatize the downloaded speeches.")
+    parser.add_argument('--input', default=JSON_FILE_PATH,
+                        help=f"speeches as a JSON array or NDJSON, e.g. speeches.ndjson (default: {JSON_FILE_PATH})")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"number of speeches per nlp.pipe batch (default: {BATCH_SIZE})")
+    parser.add_argument('--n-process', type=int, default=N_PROCESS,
+                        help=f"number of spaCy worker processes (default: {N_PROCESS})")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"speeches read, looked up in the cache and written at a time (default: {CHUNK_SIZE})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="reprocess every speech instead of reusing cached results")
+    parser.add_argument('--duplicates', default=DUPLICATES_PATH,
+                        help=f"near-duplicate map written by speech_dedup.py (default: {DUPLICATES_PATH})")
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help="also preprocess the speeches listed in the near-duplicate map")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    instrumentation.setup(args, stage='preprocess')
+
+    if not os.path.exists(args.input):
+        print(f"Error: The file {args.input} was not found.")
+        sys.exit()
+
+    # Near-duplicates found by speech_dedup.py are left out here, so no later stage sees them
+    duplicates = {}
+    if not args.keep_duplicates:
+        try:
+            duplicates = load_duplicates(args.input, args.duplicates)
+        except ValueError as e:
+            print(f"Warning: {e}. No speech is left out.")
+    speeches = (speech for i, speech in enumerate(iter_speeches(args.input)) if i not in duplicates)
+
+    cache = None if args.no_cache else SpeechCache()
+    start = time.perf_counter()
+    with SpeechWriter(PREPROCESSED, OUTPUT_COLUMNS) as writer:
+        total, preprocessed = preprocess_stream(speeches, writer, cache, chunk_size=args.chunk_size,
+                                                batch_size=args.batch_size, n_process=args.n_process)
+    elapsed = time.perf_counter() - start
+    if cache is not None:
+        cache.close()
+    print(f"{total - preprocessed} speeches reused from the cache, {preprocessed} preprocessed.")
+    if duplicates:
+        print(f"{len(duplicates)} near-duplicate speeches listed in '{args.duplicates}' were left out.")
+
+    print(f"\nPreprocessing complete! The cleaned data has been saved to {', '.join(repr(path) for path in writer.written)}.")
+    print(f"A total of {total} speeches were processed.")
+    if preprocessed and elapsed > 0:
+        print(f"Throughput: {preprocessed / elapsed:.2f} speeches/sec ({elapsed:.1f}s total).")
+
+if __name__ == '__main__':
+    main()
@@ -1,34 +1,324 @@
+import argparse
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
 import pandas as pd
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+import instrumentation
+from instrumentation import count, timer, tracing
+from segment_store import ROW_COLUMNS, SEGMENT_DIR, SEGMENT_MODES, WINDOW_WORDS, SegmentScores, segment_text
+from sentiment_cube import SentimentCube
+from speech_cache import SpeechCache, content_hash
+from speech_dedup import DUPLICATES_PATH, load_duplicates
+from speech_store import ANALYZED, PREPROCESSED, load_speeches, save_speeches
+from speech_stream import iter_speeches
 
-def analyze_sentiment(text):
+# --- START: CONFIGURATION ---
+INPUT_TABLE = PREPROCESSED
+OUTPUT_TABLE = ANALYZED
+# Number of speeches sent to a worker at a time
+CHUNK_SIZE = 100
+# Segment mode: the raw transcripts are read from the downloaded speeches
+TRANSCRIPTS_PATH = 'speeches.json'
+DOC_NAME_KEY = 'doc_name'
+TEXT_KEY = 'transcript'
+# Number of segments sent to a worker at a time
+SEGMENT_CHUNK_SIZE = 2000
+SEGMENT_TABLE_PATH = 'segment_sentiment_by_president.csv'
+# Scoring engine: 'vader' (vaderSentiment, text by text) or 'vectorized' (see vectorized_vader)
+ENGINE = 'vader'
+# --- END: CONFIGURATION ---
+
+# VADER scores and the columns they are written to. The compound score keeps
+# its historical 'sentiment_score' name so downstream scripts keep working.
+SCORE_COLUMNS = {
+    'neg': 'sentiment_neg',
+    'neu': 'sentiment_neu',
+    'pos': 'sentiment_pos',
+    'compound': 'sentiment_score',
+}
+EMPTY_SCORES = {'neg': 0.0, 'neu': 0.0, 'pos': 0.0, 'compound': 0.0}
+
+ENGINES = ('vader', 'vectorized')
+
+CACHE_STAGE = 'sentiment'
+CACHE_CONFIG = {'engine': 'vader', 'scores': list(SCORE_COLUMNS)}
+SEGMENT_CACHE_STAGE = 'segments'
+
+# Per-speech statistics of the segment scores added to the table in segment mode
+SEGMENT_STAT_COLUMNS = ['segment_count', 'segment_mean', 'segment_var', 'segment_trend']
+
+# One analyzer per process: loading the VADER lexicon and emoji tables is expensive
+_analyzer = None
+
+def get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        with timer('sentiment.load_lexicon'):
+            from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+            _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+_vectorized = None
+
+def get_vectorized():
+    global _vectorized
+    if _vectorized is None:
+        with timer('sentiment.load_lexicon'):
+            from vectorized_vader import VectorizedVader
+            _vectorized = VectorizedVader()
+    return _vectorized
+
+def load_engine(engine=ENGINE):
+    """Loads the lexicon of an engine, once per process."""
+    return get_vectorized() if engine == 'vectorized' else get_analyzer()
+
+def analyze_sentiment(text, engine=ENGINE):
     """
-    Analyzes the sentiment of a given text using VADER.
-    Returns the compound sentiment score.
+    Analyzes the sentiment of a given text using VADER (or its vectorized engine).
+    Returns a dict with the neg, neu, pos and compound scores.
     """
-    analyzer = SentimentIntensityAnalyzer()
+    if engine == 'vectorized':
+        return dict(zip(SCORE_COLUMNS, score_chunk([text], engine)[0]))
+    count('docs')
     if isinstance(text, str) and text.strip():
-        return analyzer.polarity_scores(text)['compound']
-    return 0.0
+        if tracing():
+            count('tokens', len(text.split()))
+        analyzer = get_analyzer()
+        with timer('sentiment.vader'):
+            return analyzer.polarity_scores(text)
+    return dict(EMPTY_SCORES)
 
-# --- START: CONFIGURATION ---
-INPUT_CSV_PATH = 'preprocessed_speeches.csv'
-OUTPUT_CSV_PATH = 'analyzed_speeches.csv'
-# --- END: CONFIGURATION ---
+def score_chunk(texts, engine=ENGINE):
+    """Scores a list of texts and returns one row of (neg, neu, pos, compound) per text."""
+    if engine == 'vectorized':
+        # The whole chunk is scored at once with array operations
+        count('docs', len(texts))
+        if tracing():
+            count('tokens', sum(len(text.split()) for text in texts if isinstance(text, str)))
+        vectorized = get_vectorized()
+        with timer('sentiment.vectorized'):
+            return vectorized.score_texts(texts).tolist()
+    rows = []
+    for text in texts:
+        scores = analyze_sentiment(text)
+        rows.append([scores[key] for key in SCORE_COLUMNS])
+    return rows
+
+def score_texts(texts, workers=1, chunk_size=CHUNK_SIZE, engine=ENGINE):
+    """
+    Scores every text with the given engine, fanning chunks out to a process pool when workers > 1.
+    Returns a DataFrame with one column per entry of SCORE_COLUMNS, in input order.
+    """
+    texts = list(texts)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=load_engine, initargs=(engine,)) as executor:
+            results = list(executor.map(score_chunk, chunks, repeat(engine)))
+    else:
+        results = [score_chunk(chunk, engine) for chunk in chunks]
+
+    rows = [row for chunk_rows in results for row in chunk_rows]
+    values = np.array(rows, dtype=float).reshape(len(rows), len(SCORE_COLUMNS))
+    return pd.DataFrame(values, columns=list(SCORE_COLUMNS.values()))
+
+def score_with_cache(df, workers, chunk_size, cache, engine=ENGINE):
+    """
+    Scores only the speeches whose processed text changed since they were cached.
+    Returns (scores DataFrame aligned with df, number of speeches actually scored).
+    """
+    texts = df['processed_text'].tolist()
+    doc_names = df['doc_name'].tolist()
+    config = dict(CACHE_CONFIG, engine=engine)
+    hashes = [content_hash(text, config) for text in texts]
+    keys = list(zip(doc_names, hashes))
+    with timer('sentiment.cache_lookup'):
+        cached = cache.get_many(CACHE_STAGE, keys)
+
+    hit = [key in cached for key in keys]
+    pending = [i for i, is_hit in enumerate(hit) if not is_hit]
+    fresh = score_texts([texts[i] for i in pending], workers=workers, chunk_size=chunk_size, engine=engine)
+    with timer('sentiment.cache_store'):
+        cache.put_many(CACHE_STAGE, [
+            (doc_names[i], hashes[i], row) for i, row in zip(pending, fresh.to_numpy().tolist())
+        ])
+
+    values = np.empty((len(texts), len(SCORE_COLUMNS)), dtype=float)
+    for i, key in enumerate(keys):
+        if hit[i]:
+            values[i] = cached[key]
+    if pending:
+        values[pending] = fresh.to_numpy()
+    return pd.DataFrame(values, columns=list(SCORE_COLUMNS.values())), len(pending)
+
+def load_transcripts(path, doc_names, duplicates=()):
+    """
+    The raw transcript of every row, read from the downloaded speeches. doc_names are not
+    guaranteed unique, so the n-th row of a doc_name gets the n-th speech with that name.
+    The speeches at the positions in duplicates are skipped, as in 2_preprocessing_speeches.py,
+    so the rows line up with the speeches that were preprocessed. Rows without a speech get an
+    empty transcript.
+    """
+    wanted = set(doc_names)
+    by_name = {}
+    for i, speech in enumerate(iter_speeches(path)):
+        if i in duplicates:
+            continue
+        doc_name = speech.get(DOC_NAME_KEY, 'Unknown')
+        if doc_name in wanted:
+            by_name.setdefault(doc_name, []).append(speech.get(TEXT_KEY, ''))
+    seen = Counter()
+    transcripts = []
+    for doc_name in doc_names:
+        texts = by_name.get(doc_name, [])
+        transcripts.append(texts[seen[doc_name]] if seen[doc_name] < len(texts) else '')
+        seen[doc_name] += 1
+    return transcripts
+
+def score_segments(df, transcripts, mode='sentence', window=WINDOW_WORDS, workers=1,
+                   chunk_size=SEGMENT_CHUNK_SIZE, cache=None, engine=ENGINE):
+    """
+    Splits every transcript into segments (see segment_store) and scores them, all speeches'
+    segments going through the worker pool together in chunks of chunk_size. With a cache,
+    only the speeches whose transcript or segmentation changed are scored.
+    Returns (SegmentScores aligned with df, number of speeches actually scored).
+    """
+    settings = {'mode': mode, 'window': window if mode == 'window' else None}
+    config = dict(CACHE_CONFIG, engine=engine, **settings)
+    doc_names = df['doc_name'].tolist()
+    hashes = [content_hash(text, config) for text in transcripts]
+    per_speech = [None] * len(transcripts)
+    if cache is not None:
+        keys = list(zip(doc_names, hashes))
+        with timer('sentiment.cache_lookup'):
+            cached = cache.get_many(SEGMENT_CACHE_STAGE, keys)
+        for i, key in enumerate(keys):
+            if key in cached:
+                per_speech[i] = cached[key]
+
+    pending = [i for i, scores in enumerate(per_speech) if scores is None]
+    segments = [segment_text(transcripts[i], mode, window) for i in pending]
+    count('segments', sum(len(texts) for texts in segments))
+    fresh = score_texts([text for texts in segments for text in texts], workers=workers,
+                        chunk_size=chunk_size, engine=engine).to_numpy()
+    start = 0
+    for i, texts in zip(pending, segments):
+        per_speech[i] = fresh[start:start + len(texts)].tolist()
+        start += len(texts)
+    if cache is not None:
+        with timer('sentiment.cache_store'):
+            cache.put_many(SEGMENT_CACHE_STAGE, [(doc_names[i], hashes[i], per_speech[i]) for i in pending])
+
+    return SegmentScores.from_lists(per_speech, df[ROW_COLUMNS], settings), len(pending)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Score every preprocessed speech with VADER.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of scoring processes (default: number of CPUs)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"speeches per worker task (default: {CHUNK_SIZE})")
+    parser.add_argument('--engine', choices=ENGINES, default=ENGINE,
+                        help=f"'vader' scores text by text with vaderSentiment, 'vectorized' scores whole chunks "
+                             f"with array operations (see vectorized_vader.py) (default: {ENGINE})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="rescore every speech instead of reusing cached scores")
+    parser.add_argument('--segments', choices=SEGMENT_MODES,
+                        help=f"also score every sentence (or window of --window words) of the raw transcripts "
+                             f"and store the scores in {SEGMENT_DIR}/")
+    parser.add_argument('--window', type=int, default=WINDOW_WORDS,
+                        help=f"words per segment with --segments window (default: {WINDOW_WORDS})")
+    parser.add_argument('--input', default=TRANSCRIPTS_PATH,
+                        help=f"downloaded speeches the transcripts are read from (default: {TRANSCRIPTS_PATH})")
+    parser.add_argument('--duplicates', default=DUPLICATES_PATH,
+                        help=f"near-duplicate map written by speech_dedup.py (default: {DUPLICATES_PATH})")
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help="also read the transcripts of the speeches listed in the near-duplicate map, "
+                             "as when they were preprocessed with --keep-duplicates")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    instrumentation.setup(args, stage='sentiment')
+
+    try:
+        df = load_speeches(INPUT_TABLE)
+    except FileNotFoundError as e:
+        print(f"Error: The file {e} was not found.")
+        exit()
+
+    # Apply sentiment analysis to the 'processed_text' column
+    print(f"Analyzing sentiment for each speech with the {args.engine} engine and {args.workers} worker(s)...")
+    start = time.perf_counter()
+    with timer('sentiment.score'):
+        if args.no_cache:
+            scores = score_texts(df['processed_text'], workers=args.workers, chunk_size=args.chunk_size,
+                                 engine=args.engine)
+            scored = len(df)
+        else:
+            cache = SpeechCache()
+            scores, scored = score_with_cache(df, args.workers, args.chunk_size, cache, engine=args.engine)
+            cache.close()
+    if not args.no_cache:
+        print(f"{len(df) - scored} speeches reused from the cache, {scored} scored.")
+    elapsed = time.perf_counter() - start
+
+    for column in scores.columns:
+        df[column] = scores[column].to_numpy()
+
+    segments = None
+    if args.segments:
+        print(f"Scoring the {args.segments} segments of every transcript...")
+        # Skip the same near-duplicates as 2_preprocessing_speeches.py, so the n-th speech of a
+        # doc_name is the one its n-th row was preprocessed from
+        duplicates = {}
+        try:
+            if not args.keep_duplicates:
+                try:
+                    duplicates = load_duplicates(args.input, args.duplicates)
+                except ValueError as e:
+                    print(f"Warning: {e}. No speech is left out.")
+            transcripts = load_transcripts(args.input, df['doc_name'].tolist(), duplicates)
+        except FileNotFoundError:
+            print(f"Error: The file {args.input} was not found.")
+            exit()
+        with timer('sentiment.segments'):
+            cache = None if args.no_cache else SpeechCache()
+            segments, scored_segments = score_segments(df, transcripts, args.segments, args.window,
+                                                       workers=args.workers, cache=cache, engine=args.engine)
+            if cache is not None:
+                cache.close()
+            segments.save()
+        per_speech = segments.speech_stats()
+        for column in SEGMENT_STAT_COLUMNS:
+            df[column] = per_speech[column].to_numpy()
+        print(f"{int(segments.offsets[-1])} segments stored in '{SEGMENT_DIR}/' "
+              f"({len(df) - scored_segments} speeches reused from the cache, {scored_segments} scored).")
 
-try:
-    df = pd.read_csv(INPUT_CSV_PATH)
-except FileNotFoundError:
-    print(f"Error: The file {INPUT_CSV_PATH} was not found.")
-    exit()
+    # Save the updated DataFrame to a new CSV file
+    with timer('sentiment.write'):
+        written = save_speeches(df, OUTPUT_TABLE)
 
-# Apply sentiment analysis to the 'processed_text' column
-print("Analyzing sentiment for each speech...")
-df['sentiment_score'] = df['processed_text'].apply(analyze_sentiment)
+    # Fold the new scores into the aggregate cube the charts read from
+    with timer('sentiment.cube'):
+        cube = SentimentCube()
+        changes = cube.sync(OUTPUT_TABLE, df=df)
+        cube.close()
 
-# Save the updated DataFrame to a new CSV file
-df.to_csv(OUTPUT_CSV_PATH, index=False)
+    print("\nSentiment analysis complete!")
+    if scored and elapsed > 0:
+        print(f"Scored {scored} speeches in {elapsed:.1f}s ({scored / elapsed:.2f} speeches/sec).")
+    print(f"The results have been saved to {', '.join(repr(path) for path in written)}.")
+    if segments is not None:
+        segments.group_stats('president').to_csv(SEGMENT_TABLE_PATH)
+        print(f"Segment sentiment per president saved to '{SEGMENT_TABLE_PATH}'.")
+    if changes is not None:
+        print(f"Sentiment cube updated: {changes['added']} speeches added, "
+              f"{changes['changed']} changed, {changes['removed']} removed.")
+    print("You can now begin to visualize your data.")
 
-print("\nSentiment analysis complete!")
-print(f"The results have been saved to '{OUTPUT_CSV_PATH}'.")
-print("You can now begin to visualize your data.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,59 +1,179 @@
+import argparse
+import hashlib
+import json
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import instrumentation
+from instrumentation import count, timer
+from segment_store import load_segments
+from speech_store import ANALYZED, load_speeches
 
 # --- START: CONFIGURATION ---
-INPUT_CSV_PATH = 'analyzed_speeches.csv'
+INPUT_TABLE = ANALYZED
 OUTPUT_DIR = 'individual_sentiment_plots'
+# With --source segments: mean segment score of every speech, with a band of one standard deviation
+SEGMENT_OUTPUT_DIR = 'individual_segment_sentiment_plots'
+# Fingerprint of the data behind every plot (per output directory), to skip the plots whose data did not change
+FINGERPRINTS_NAME = 'fingerprints.json'
+# Bump when the look of the plots changes, so every plot is rendered again
+PLOT_VERSION = 1
 # --- END: CONFIGURATION ---
 
-try:
-    df = pd.read_csv(INPUT_CSV_PATH)
-except FileNotFoundError:
-    print(f"Error: The file {INPUT_CSV_PATH} was not found. Please ensure the sentiment analysis script ran successfully.")
-    exit()
+def plot_path(president, output_dir=OUTPUT_DIR):
+    return os.path.join(output_dir, f"{president.replace(' ', '_')}_sentiment.png")
 
-# Create an output directory if it doesn't exist
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
+def fingerprint(president, president_df):
+    """Hash of everything a president's plot is drawn from."""
+    digest = hashlib.sha256(f"{PLOT_VERSION}\0{president}\0".encode('utf-8'))
+    digest.update(president_df['date'].to_numpy(dtype='datetime64[ns]').view('int64').tobytes())
+    digest.update(president_df['sentiment_score'].to_numpy(dtype='float64').tobytes())
+    if 'segment_std' in president_df:
+        digest.update(president_df['segment_std'].to_numpy(dtype='float64').tobytes())
+    return digest.hexdigest()
 
-print("Generating individual plots for each president...")
+def load_fingerprints(path=os.path.join(OUTPUT_DIR, FINGERPRINTS_NAME)):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
-# Convert the 'date' column to datetime objects
-df['date'] = pd.to_datetime(df['date'], errors='coerce')
+def save_fingerprints(fingerprints, path=os.path.join(OUTPUT_DIR, FINGERPRINTS_NAME)):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(fingerprints, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
 
-# Drop rows with invalid dates and sort by date
-df = df.dropna(subset=['date'])
-df.sort_values(by='date', inplace=True)
+def init_renderer():
+    """Non-interactive backend and seaborn style, set once per process."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-# Get a list of unique presidents
-presidents = df['president'].unique()
-
-# Loop through each president and create a plot
-for president in presidents:
-    # Filter the DataFrame for the current president
-    president_df = df[df['president'] == president]
-    
-    # Set the style and create a figure
+    plt.switch_backend('Agg')
     sns.set_style("whitegrid")
-    plt.figure(figsize=(12, 6))
-    
-    # Plot the sentiment scores over time
-    sns.lineplot(data=president_df, x='date', y='sentiment_score', marker='o')
-    
-    # Add titles and labels
-    plt.title(f'Sentiment Trends for {president}', fontsize=16)
-    plt.xlabel('Date', fontsize=12)
-    plt.ylabel('VADER Compound Sentiment Score', fontsize=12)
-    plt.axhline(y=0, color='r', linestyle='--', linewidth=1) # Add a horizontal line at 0
-    
+
+def load_segment_means():
+    """Mean and standard deviation of the segment scores of every speech, from the segment store."""
+    stats = load_segments().speech_stats()
+    stats = stats[stats['segment_count'] > 0]
+    return pd.DataFrame({'president': stats['president'], 'date': stats['date'],
+                         'sentiment_score': stats['segment_mean'],
+                         'segment_std': stats['segment_var'].fillna(0.0) ** 0.5})
+
+def render_plot(president, president_df, output_path):
+    """
+    Draws the sentiment of one president's speeches over time and saves it to output_path.
+    With a segment_std column, a band of one standard deviation is drawn around the scores.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    with timer('plot.draw'):
+        plt.figure(figsize=(12, 6))
+
+        # Plot the sentiment scores over time
+        sns.lineplot(data=president_df, x='date', y='sentiment_score', marker='o')
+        if 'segment_std' in president_df:
+            plt.fill_between(president_df['date'], president_df['sentiment_score'] - president_df['segment_std'],
+                             president_df['sentiment_score'] + president_df['segment_std'], alpha=0.2)
+
+        # Add titles and labels
+        plt.title(f'Sentiment Trends for {president}', fontsize=16)
+        plt.xlabel('Date', fontsize=12)
+        if 'segment_std' in president_df:
+            plt.ylabel('Mean VADER Compound Score of the Segments', fontsize=12)
+        else:
+            plt.ylabel('VADER Compound Sentiment Score', fontsize=12)
+        plt.axhline(y=0, color='r', linestyle='--', linewidth=1) # Add a horizontal line at 0
+
     # Save the plot to a file
-    filename = f"{president.replace(' ', '_')}_sentiment.png"
-    plt.tight_layout()
-    plt.savefig(os.path.join(OUTPUT_DIR, filename))
-    plt.close()
-    
-    print(f"Created plot for {president} and saved to '{os.path.join(OUTPUT_DIR, filename)}'")
-
-print("\nAll individual plots have been generated.")
\ No newline at end of file
+    with timer('plot.save'):
+        plt.tight_layout()
+        plt.savefig(output_path)
+        plt.close()
+    count('plots')
+    return president, output_path
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Plot the sentiment of every president's speeches over time.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of rendering processes (default: number of CPUs)")
+    parser.add_argument('--force', action='store_true',
+                        help="render every plot, even when its data did not change")
+    parser.add_argument('--source', choices=['speech', 'segments'], default='speech',
+                        help="plot the score of every whole speech, or the mean of its segment scores "
+                             "(written by 3_sentiment_analysis.py --segments) in " + SEGMENT_OUTPUT_DIR)
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    instrumentation.setup(args, stage='president_plots')
+
+    try:
+        if args.source == 'segments':
+            df = load_segment_means()
+        else:
+            df = load_speeches(INPUT_TABLE, columns=['president', 'date', 'sentiment_score'])
+    except FileNotFoundError as e:
+        print(f"Error: The file {e} was not found. Please ensure the sentiment analysis script ran successfully.")
+        exit()
+    output_dir = SEGMENT_OUTPUT_DIR if args.source == 'segments' else OUTPUT_DIR
+    fingerprints_path = os.path.join(output_dir, FINGERPRINTS_NAME)
+
+    # Create an output directory if it doesn't exist
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    print("Generating individual plots for each president...")
+
+    # Convert the 'date' column to datetime objects
+    df['date'] = pd.to_datetime(df['date'], errors='coerce')
+
+    # Drop rows with invalid dates and sort by date
+    df = df.dropna(subset=['date'])
+    df.sort_values(by='date', inplace=True)
+
+    # Partition once, keeping the presidents in order of their first speech
+    previous = load_fingerprints(fingerprints_path)
+    fingerprints = {}
+    jobs = []
+    for president, president_df in df.groupby('president', sort=False, observed=True):
+        president = str(president)
+        fingerprints[president] = fingerprint(president, president_df)
+        output_path = plot_path(president, output_dir)
+        if not args.force and previous.get(president) == fingerprints[president] and os.path.exists(output_path):
+            continue
+        jobs.append((president, president_df.reset_index(drop=True), output_path))
+
+    skipped = len(fingerprints) - len(jobs)
+    if args.workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(jobs)), initializer=init_renderer) as executor:
+            futures = [executor.submit(render_plot, *job) for job in jobs]
+            rendered = [future.result() for future in as_completed(futures)]
+    else:
+        init_renderer()
+        rendered = [render_plot(*job) for job in jobs]
+
+    order = {job[0]: i for i, job in enumerate(jobs)}
+    for president, output_path in sorted(rendered, key=lambda item: order[item[0]]):
+        print(f"Created plot for {president} and saved to '{output_path}'")
+    save_fingerprints(fingerprints, fingerprints_path)
+
+    # Remove the plots of presidents who are no longer in the table
+    current_paths = {plot_path(president, output_dir) for president in fingerprints}
+    removed = 0
+    for president in previous.keys() - fingerprints.keys():
+        stale_path = plot_path(president, output_dir)
+        if stale_path not in current_paths and os.path.exists(stale_path):
+            os.remove(stale_path)
+            removed += 1
+
+    if skipped:
+        print(f"\n{skipped} plots were already up to date.")
+    if removed:
+        print(f"{removed} plots of presidents no longer in the table were removed.")
+    print("\nAll individual plots have been generated.")
+
+if __name__ == '__main__':
+    main()
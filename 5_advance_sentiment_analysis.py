@@ -1,48 +1,132 @@
+import numpy as np
 import pandas as pd
-import nltk
-from nltk.corpus import stopwords
 from collections import Counter
 from wordcloud import WordCloud
 import matplotlib.pyplot as plt
-
-# Download NLTK stopwords if not already downloaded
-try:
-    stopwords.words('english')
-except LookupError:
-    nltk.download('stopwords')
+from dtm_store import load_dtm
+from instrumentation import timer
+from nltk_resources import english_stopwords
+from speech_store import ANALYZED, load_speeches
 
 # --- START: CONFIGURATION & DATA LOADING ---
-INPUT_CSV_PATH = 'analyzed_speeches.csv'
+INPUT_TABLE = ANALYZED
 POSITIVE_WORDCLOUD_PATH = 'positive_sentiment_wordcloud.png'
 NEGATIVE_WORDCLOUD_PATH = 'negative_sentiment_wordcloud.png'
+DISTINCTIVE_WORDS_PATH = 'distinctive_words.csv'
+# Speeches counted at a time
+CHUNK_SIZE = 500
+# Words kept per bucket in DISTINCTIVE_WORDS_PATH
+DISTINCTIVE_TOP_N = 50
 
 # --- END: CONFIGURATION ---
 
 # 1. Load the data
 try:
-    df = pd.read_csv(INPUT_CSV_PATH)
-except FileNotFoundError:
-    print(f"Error: The file {INPUT_CSV_PATH} was not found. Please ensure it exists in the current directory.")
+    df = load_speeches(INPUT_TABLE, columns=['president', 'sentiment_score'])
+    dtm = load_dtm(INPUT_TABLE)
+except FileNotFoundError as e:
+    print(f"Error: The file {e} was not found. Please ensure it exists in the current directory.")
     exit()
 
 # 2. Categorize speeches based on sentiment score
 print("Categorizing speeches by sentiment...")
-positive_speeches = df[df['sentiment_score'] > 0.1]
-negative_speeches = df[df['sentiment_score'] < -0.1]
+positive_speeches = (df['sentiment_score'] > 0.1).to_numpy()
+negative_speeches = (df['sentiment_score'] < -0.1).to_numpy()
+neutral_speeches = df['sentiment_score'].between(-0.1, 0.1).to_numpy()
+sentiment_labels = np.select([positive_speeches, negative_speeches, neutral_speeches],
+                             ['positive', 'negative', 'neutral'], default=None)
 
 # 3. Clean and count words
-def get_word_counts(text_series):
-    """Cleans text and returns a Counter of word frequencies."""
-    all_words = ' '.join(text_series.dropna()).lower()
-    cleaned_words = [
-        word for word in all_words.split() 
-        if word.isalpha() and word not in stopwords.words('english')
-    ]
-    return Counter(cleaned_words)
-
-print("Counting words in positive and negative speeches...")
-positive_word_counts = get_word_counts(positive_speeches['processed_text'])
-negative_word_counts = get_word_counts(negative_speeches['processed_text'])
+# Downloaded only if they are missing
+STOP_WORDS = english_stopwords()
+
+def clean_word(term):
+    """Keeps alphabetic, non-stopword terms of the shared document-term matrix."""
+    return [term] if term.isalpha() and term not in STOP_WORDS else []
+
+def get_word_counts(words, mask):
+    """Returns a Counter of word frequencies over the speeches selected by mask."""
+    selected = np.where(np.asarray(mask, dtype=bool), 'selected', None)
+    return count_buckets(words, {'mask': selected})['mask'].get('selected', Counter())
+
+def count_buckets(words, bucketings, chunk_size=CHUNK_SIZE):
+    """
+    Counts word frequencies for several ways of bucketing the speeches in a single pass over
+    the document-term matrix, chunk_size speeches at a time. bucketings maps a name to one
+    label per speech (None to leave the speech out). Returns {name: {label: Counter}}, each
+    Counter ordered by first occurrence like get_word_counts.
+    """
+    num_terms = len(words.vocab)
+    coded = {}
+    for name, labels in bucketings.items():
+        codes, uniques = pd.factorize(pd.Series(labels, dtype=object), sort=True)
+        coded[name] = (codes, list(uniques),
+                       np.zeros((len(uniques), num_terms), dtype=np.int64),
+                       np.full((len(uniques), num_terms), len(words.tokens), dtype=np.int64))
+
+    lengths = np.diff(words.offsets)
+    for lo in range(0, len(lengths), chunk_size):
+        hi = min(lo + chunk_size, len(lengths))
+        chunk_tokens = words.tokens[words.offsets[lo]:words.offsets[hi]]
+        token_rows = np.repeat(np.arange(lo, hi), lengths[lo:hi])
+        for codes, uniques, totals, first_seen in coded.values():
+            token_codes = codes[token_rows]
+            counted = token_codes >= 0
+            keys = token_codes[counted] * num_terms + chunk_tokens[counted]
+            present, first_index, counts = np.unique(keys, return_index=True, return_counts=True)
+            bucket, term = np.divmod(present, num_terms)
+            totals[bucket, term] += counts
+            position = words.offsets[lo] + np.flatnonzero(counted)[first_index]
+            first_seen[bucket, term] = np.minimum(first_seen[bucket, term], position)
+
+    results = {}
+    for name, (codes, uniques, totals, first_seen) in coded.items():
+        results[name] = {}
+        for i, label in enumerate(uniques):
+            present = np.flatnonzero(totals[i])
+            ordered = present[np.argsort(first_seen[i, present], kind='stable')]
+            results[name][label] = Counter({words.vocab[t]: int(totals[i, t]) for t in ordered})
+    return results
+
+def log_odds(counts_by_label):
+    """
+    Log-odds ratio of every word in each bucket against all other buckets, with an informative
+    Dirichlet prior taken from the counts of all buckets (Monroe et al., "Fightin' Words").
+    Returns {label: Series of z-scores indexed by word}; large values are words distinctive of the bucket.
+    """
+    counts = pd.DataFrame(counts_by_label).fillna(0).sort_index()
+    prior = counts.sum(axis=1)
+    prior_total = prior.sum()
+    scores = {}
+    for label in counts.columns:
+        inside = counts[label]
+        outside = prior - inside
+        n_inside, n_outside = inside.sum(), outside.sum()
+        delta = (np.log((inside + prior) / (n_inside + prior_total - inside - prior))
+                 - np.log((outside + prior) / (n_outside + prior_total - outside - prior)))
+        variance = 1 / (inside + prior) + 1 / (outside + prior)
+        scores[label] = delta / np.sqrt(variance)
+    return scores
+
+def distinctive_words_table(buckets, top_n=DISTINCTIVE_TOP_N):
+    """The top_n most distinctive words of every bucket, with their raw frequency and log-odds z-score."""
+    rows = []
+    for name, counts_by_label in buckets.items():
+        if len(counts_by_label) < 2:
+            continue
+        for label, scores in log_odds(counts_by_label).items():
+            for word, score in scores.nlargest(top_n).items():
+                rows.append({'bucketing': name, 'bucket': label, 'word': word,
+                             'count': counts_by_label[label].get(word, 0), 'log_odds_z': score})
+    return pd.DataFrame(rows, columns=['bucketing', 'bucket', 'word', 'count', 'log_odds_z'])
+
+print("Counting words per sentiment bucket and per president...")
+with timer('keywords.count'):
+    words = dtm.project(clean_word)
+    buckets = count_buckets(words, {'sentiment': sentiment_labels,
+                                    'president': df['president'].astype(object).where(df['president'].notna(), None)})
+positive_word_counts = buckets['sentiment'].get('positive', Counter())
+negative_word_counts = buckets['sentiment'].get('negative', Counter())
 
 # Print the top 20 words for each category
 print("\nTop 20 most frequent words in POSITIVE speeches:")
@@ -53,22 +137,39 @@ print("\nTop 20 most frequent words in NEGATIVE speeches:")
 for word, count in negative_word_counts.most_common(20):
     print(f"- {word}: {count}")
 
+# Words that set each bucket apart, rather than the ones frequent everywhere
+with timer('keywords.log_odds'):
+    distinctive = distinctive_words_table(buckets)
+for label in ('positive', 'negative'):
+    top = distinctive[(distinctive['bucketing'] == 'sentiment') & (distinctive['bucket'] == label)].head(10)
+    if not top.empty:
+        print(f"\nMost distinctive words in {label.upper()} speeches (log-odds z-score):")
+        for row in top.itertuples():
+            print(f"- {row.word}: {row.log_odds_z:.2f} ({row.count} occurrences)")
+distinctive.to_csv(DISTINCTIVE_WORDS_PATH, index=False)
+print(f"\nDistinctive words per sentiment bucket and per president saved to '{DISTINCTIVE_WORDS_PATH}'.")
+
 # 4. Generate word clouds
 def generate_wordcloud(word_counts, output_path, title):
     """Generates and saves a word cloud from word counts."""
-    wordcloud = WordCloud(
-        width=800, 
-        height=400, 
-        background_color='white',
-        min_font_size=10
-    ).generate_from_frequencies(word_counts)
-
-    plt.figure(figsize=(10, 5))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.title(title, fontsize=16)
-    plt.axis('off')
-    plt.savefig(output_path)
-    plt.close()
+    if not word_counts:
+        print(f"\nNo words to draw for '{title}', skipping '{output_path}'.")
+        return
+    with timer('plot.wordcloud'):
+        wordcloud = WordCloud(
+            width=800, 
+            height=400, 
+            background_color='white',
+            min_font_size=10
+        ).generate_from_frequencies(word_counts)
+
+    with timer('plot.save'):
+        plt.figure(figsize=(10, 5))
+        plt.imshow(wordcloud, interpolation='bilinear')
+        plt.title(title, fontsize=16)
+        plt.axis('off')
+        plt.savefig(output_path)
+        plt.close()
     print(f"\nWord cloud for '{title}' saved to '{output_path}'.")
 
 # Generate and save the word clouds
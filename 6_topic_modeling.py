@@ -1,79 +1,327 @@
-import pandas as pd
-import nltk
-from gensim import corpora, models
-from gensim.models import CoherenceModel
-import pyLDAvis.gensim_models as gensimvis
-import pyLDAvis
-import matplotlib.pyplot as plt
-
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from coherence_index import load_index
+from dtm_store import load_dtm
+import instrumentation
+from instrumentation import count, timer
+from nltk_resources import english_stopwords, ensure_nltk_data
+from speech_store import ANALYZED
+
 import string
 
-# Download NLTK resources (only once)
-nltk.download('punkt')
-nltk.download('stopwords')
+# gensim, pyLDAvis, matplotlib and NLTK are imported where they are used, so --help starts at once.
+# The NLTK data is only downloaded when it is missing.
+STOP_WORDS = None
+word_tokenize = None
+
+def load_nltk():
+    global STOP_WORDS, word_tokenize
+    if STOP_WORDS is None:
+        ensure_nltk_data('stopwords', 'punkt_tab')
+        from nltk.tokenize import word_tokenize
+        STOP_WORDS = english_stopwords()
 
 def preprocess(text):
-    stop_words = set(stopwords.words('english'))
+    if STOP_WORDS is None:
+        load_nltk()
     tokens = word_tokenize(text.lower())
-    tokens = [word for word in tokens if word.isalpha() and word not in stop_words]
+    tokens = [word for word in tokens if word.isalpha() and word not in STOP_WORDS]
     return tokens
 
-def compute_coherence(dictionary, corpus, texts, limit, start=2, step=1):
-    coherence_values = []
-    model_list = []
+# Settings shared by every candidate model of the sweep. The seed is the same for every K,
+# so a model trained in a worker process is identical to the one of a serial run.
+LDA_PASSES = 10
+LDA_SEED = 42
+SWEEP_RESULTS_PATH = 'coherence_sweep.jsonl'
+SWEEP_MODEL_DIR = 'lda_sweep'
+SWEEP_TIMINGS_PATH = 'sweep_timings.json'
+
+# Successive halving: cumulative passes at each rung, and the share of candidates kept after a rung
+HALVING_RUNGS = (2, 5, LDA_PASSES)
+HALVING_KEEP = 0.5
+
+# Corpus handed to each worker process once, by the pool initializer
+_sweep_data = {}
+
+def _init_sweep_worker(dictionary, corpus):
+    _sweep_data.update(dictionary=dictionary, corpus=corpus)
+
+def train_candidate(num_topics, seed=LDA_SEED, passes=LDA_PASSES, dictionary=None, corpus=None):
+    """Trains one candidate model. Coherence is scored by the caller, in the main process."""
+    from gensim import models
 
-    for num_topics in range(start, limit, step):
+    dictionary = dictionary if dictionary is not None else _sweep_data['dictionary']
+    corpus = corpus if corpus is not None else _sweep_data['corpus']
+
+    with timer('lda.train'):
         model = models.LdaModel(corpus=corpus,
                                 id2word=dictionary,
                                 num_topics=num_topics,
-                                random_state=42,
-                                passes=10,
+                                random_state=seed,
+                                passes=passes,
                                 alpha='auto')
-        model_list.append(model)
+    count('lda.passes', passes)
+    return num_topics, model
+
+def advance_candidate(num_topics, model, passes, seed=LDA_SEED, dictionary=None, corpus=None):
+    """Trains a new candidate for `passes` passes, or continues training an existing one."""
+    if model is None:
+        return train_candidate(num_topics, seed, passes, dictionary, corpus)
+    corpus = corpus if corpus is not None else _sweep_data['corpus']
+    with timer('lda.update'):
+        model.update(corpus, passes=passes)
+    count('lda.passes', passes)
+    return num_topics, model
 
+def score_coherence(model, texts, dictionary, index=None):
+    """
+    c_v coherence of a model. With a co-occurrence index (see coherence_index) the window counts
+    are looked up instead of rescanning every text; both give the same value.
+    """
+    count('coherence.models')
+    if index is not None:
+        with timer('coherence.index'):
+            return index.coherence(model)
+    with timer('coherence.rescan'):
+        from gensim.models import CoherenceModel
         coherencemodel = CoherenceModel(model=model,
                                         texts=texts,
                                         dictionary=dictionary,
                                         coherence='c_v')
-        coherence_values.append(coherencemodel.get_coherence())
+        return coherencemodel.get_coherence()
+
+def _sweep_key(dictionary, corpus, seed, passes):
+    """
+    Identifies the corpus and settings a sweep result belongs to: a sha256 of the vocabulary
+    (with its ids) and of every document's bag of words, so any change to the text, not only
+    to its size, invalidates the results of earlier sweeps.
+    """
+    digest = hashlib.sha256(json.dumps(sorted(dictionary.token2id.items())).encode('utf-8'))
+    for doc in corpus:
+        digest.update(f"{len(doc)}:{','.join(f'{term}={weight}' for term, weight in doc)};".encode('utf-8'))
+    return f"corpus={digest.hexdigest()},seed={seed},passes={passes}"
+
+def _load_finished(results_path, key):
+    """Reads the coherence of the candidates an earlier (possibly interrupted) sweep finished."""
+    finished = {}
+    if not results_path or not os.path.exists(results_path):
+        return finished
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get('key') == key and os.path.exists(record.get('model_path', '')):
+                finished[record['num_topics']] = record
+    return finished
+
+def compute_coherence(dictionary, corpus, texts, limit, start=2, step=1, workers=1, seed=LDA_SEED,
+                      passes=LDA_PASSES, results_path=None, model_dir=SWEEP_MODEL_DIR, index=None):
+    """
+    Trains one model per number of topics in range(start, limit, step) and scores its c_v coherence.
+    Candidates are trained concurrently when workers > 1 and scored in the main process, from
+    the co-occurrence index when one is given. With a results_path, every finished
+    candidate is appended to it as soon as it is scored (its model saved to model_dir), and the
+    candidates already recorded there are loaded instead of being trained again.
+    Returns the models and their coherence values, ordered by number of topics.
+    """
+    from gensim import models
+
+    candidates = list(range(start, limit, step))
+    key = _sweep_key(dictionary, corpus, seed, passes)
+    finished = _load_finished(results_path, key)
+    models_by_k = {}
+    coherence_by_k = {}
 
+    for num_topics in candidates:
+        if num_topics in finished:
+            models_by_k[num_topics] = models.LdaModel.load(finished[num_topics]['model_path'])
+            coherence_by_k[num_topics] = finished[num_topics]['coherence']
+            print(f"  K={num_topics}: coherence {coherence_by_k[num_topics]:.4f} (from {results_path})")
+
+    def record(num_topics, model):
+        coherence = score_coherence(model, texts, dictionary, index)
+        models_by_k[num_topics] = model
+        coherence_by_k[num_topics] = coherence
+        print(f"  K={num_topics}: coherence {coherence:.4f}")
+        if results_path:
+            os.makedirs(model_dir, exist_ok=True)
+            model_path = os.path.join(model_dir, f'lda_{num_topics}.model')
+            model.save(model_path)
+            with open(results_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'key': key, 'num_topics': num_topics, 'coherence': coherence,
+                                    'model_path': model_path}) + "\n")
+
+    pending = [k for k in candidates if k not in models_by_k]
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)), initializer=_init_sweep_worker,
+                                 initargs=(dictionary, corpus)) as executor:
+            futures = [executor.submit(train_candidate, k, seed, passes) for k in pending]
+            for future in as_completed(futures):
+                record(*future.result())
+    else:
+        for num_topics in pending:
+            record(*train_candidate(num_topics, seed, passes, dictionary, corpus))
+
+    model_list = [models_by_k[k] for k in candidates]
+    coherence_values = [coherence_by_k[k] for k in candidates]
     return model_list, coherence_values
 
-def run_topic_modeling():
-    # Load dataset
-    df = pd.read_csv("analyzed_speeches.csv")
-    texts = df['processed_text'].dropna().apply(preprocess).tolist()
+def successive_halving(dictionary, corpus, texts, limit, start=2, step=1, workers=1, seed=LDA_SEED,
+                       rungs=HALVING_RUNGS, keep=HALVING_KEEP, index=None):
+    """
+    Adaptive alternative to compute_coherence. Every candidate is trained for the passes of the
+    first rung and scored; only the best `keep` share moves on to the next rung, where training
+    continues up to that rung's number of passes. Only the survivors of the last rung get all passes.
+    Returns {num_topics: model}, {num_topics: last coherence} and {num_topics: passes trained}
+    for every candidate (pruned candidates keep the score of the rung they were dropped at).
+    """
+    alive = {num_topics: None for num_topics in range(start, limit, step)}
+    coherence_by_k = {}
+    passes_by_k = {}
+    done_passes = 0
+
+    executor = None
+    if workers > 1 and len(alive) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(workers, len(alive)), initializer=_init_sweep_worker,
+                                       initargs=(dictionary, corpus))
+    try:
+        for rung, total_passes in enumerate(rungs):
+            extra_passes = total_passes - done_passes
+            print(f"  rung {rung + 1}/{len(rungs)}: {len(alive)} candidates, {total_passes} passes")
+            if executor is not None:
+                futures = [executor.submit(advance_candidate, k, model, extra_passes, seed)
+                           for k, model in alive.items()]
+                results = [future.result() for future in as_completed(futures)]
+            else:
+                results = [advance_candidate(k, model, extra_passes, seed, dictionary, corpus)
+                           for k, model in alive.items()]
+
+            for num_topics, model in sorted(results, key=lambda result: result[0]):
+                coherence = score_coherence(model, texts, dictionary, index)
+                alive[num_topics] = model
+                coherence_by_k[num_topics] = coherence
+                passes_by_k[num_topics] = total_passes
+                print(f"    K={num_topics}: coherence {coherence:.4f}")
+            done_passes = total_passes
+
+            if rung < len(rungs) - 1:
+                survivors = max(1, math.ceil(len(alive) * keep))
+                ranked = sorted(alive, key=lambda k: coherence_by_k[k], reverse=True)[:survivors]
+                alive = {k: alive[k] for k in sorted(ranked)}
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
-    # Build dictionary and corpus
-    dictionary = corpora.Dictionary(texts)
-    corpus = [dictionary.doc2bow(text) for text in texts]
+    return alive, coherence_by_k, passes_by_k
+
+def record_sweep_time(mode, seconds, path=SWEEP_TIMINGS_PATH):
+    """Stores the sweep time of a mode and prints it next to the other mode's last time."""
+    timings = {}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            timings = json.load(f)
+    timings[mode] = seconds
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(timings, f, indent=2)
+    for name, value in sorted(timings.items()):
+        marker = "  <- this run" if name == mode else ""
+        print(f"  {name:>11} sweep: {value:8.1f}s{marker}")
+
+def run_topic_modeling(workers=1, seed=LDA_SEED, results_path=SWEEP_RESULTS_PATH, mode='exhaustive',
+                       coherence='index'):
+    # Load the shared document-term matrix and apply preprocess once per vocabulary term
+    with timer('topics.load'):
+        dtm = load_dtm(ANALYZED)
+        docs = dtm.select(dtm.rows['has_text']).project(preprocess)
+        texts = list(docs.sequences())
+
+        # Build dictionary and corpus
+        dictionary, corpus = docs.to_gensim()
+    count('docs', dictionary.num_docs)
+    count('tokens', dictionary.num_pos)
+
+    # Window counts of the top words are computed once and reused by every candidate (and every run)
+    with timer('coherence.load_index'):
+        index = load_index(docs, dictionary, name='topic_modeling') if coherence == 'index' else None
 
     # Optimize number of topics
     print("Finding optimal number of topics...")
-    model_list, coherence_values = compute_coherence(dictionary, corpus, texts, start=2, limit=15, step=1)
+    start = time.perf_counter()
+    topic_counts = list(range(2, 15))
+    if mode == 'halving':
+        finalists, coherence_by_k, passes_by_k = successive_halving(dictionary, corpus, texts, start=2, limit=15,
+                                                                    step=1, workers=workers, seed=seed,
+                                                                    index=index)
+        coherence_values = [coherence_by_k[k] for k in topic_counts]
+        pruned = [k for k in topic_counts if k not in finalists]
+    else:
+        model_list, coherence_values = compute_coherence(dictionary, corpus, texts, start=2, limit=15, step=1,
+                                                         workers=workers, seed=seed, results_path=results_path,
+                                                         index=index)
+        finalists = dict(zip(topic_counts, model_list))
+        pruned = []
+    print(f"Sweep finished in {time.perf_counter() - start:.1f}s")
+    record_sweep_time(mode, time.perf_counter() - start)
 
     # Plot coherence
-    plt.plot(range(2, 15), coherence_values)
-    plt.xlabel("Num Topics")
-    plt.ylabel("Coherence score")
-    plt.title("Optimal Number of Topics")
-    plt.savefig("coherence_scores.png")
-    plt.close()
-
-    # Best model
-    best_idx = coherence_values.index(max(coherence_values))
-    optimal_model = model_list[best_idx]
-    num_topics = 2 + best_idx
+    with timer('plot.save'):
+        import matplotlib.pyplot as plt
+        plt.plot(topic_counts, coherence_values)
+        if pruned:
+            plt.scatter(pruned, [coherence_values[topic_counts.index(k)] for k in pruned], marker='x', color='gray',
+                        label='pruned early (score at pruning)')
+            plt.legend()
+        plt.xlabel("Num Topics")
+        plt.ylabel("Coherence score")
+        plt.title("Optimal Number of Topics")
+        plt.savefig("coherence_scores.png")
+        plt.close()
+
+    # Best model, among the candidates trained with all passes
+    num_topics = max(finalists, key=lambda k: coherence_values[topic_counts.index(k)])
+    optimal_model = finalists[num_topics]
+    best_idx = topic_counts.index(num_topics)
 
     print(f"Best number of topics: {num_topics}")
     print(f"Coherence Score: {coherence_values[best_idx]:.4f}")
 
     # Save visualization
-    vis = gensimvis.prepare(optimal_model, corpus, dictionary)
-    pyLDAvis.save_html(vis, 'lda_visualization.html')
+    with timer('lda.visualize'):
+        import pyLDAvis
+        import pyLDAvis.gensim_models as gensimvis
+        vis = gensimvis.prepare(optimal_model, corpus, dictionary)
+        pyLDAvis.save_html(vis, 'lda_visualization.html')
     print("LDA visualization saved to lda_visualization.html")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the best number of LDA topics and visualize that model.")
+    parser.add_argument('--mode', choices=['exhaustive', 'halving'], default='exhaustive',
+                        help="train every K with all passes, or prune weak K values early with successive halving")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of candidate models trained concurrently (default: 1)")
+    parser.add_argument('--seed', type=int, default=LDA_SEED,
+                        help=f"random_state of every candidate model (default: {LDA_SEED}, the historical run)")
+    parser.add_argument('--results', default=SWEEP_RESULTS_PATH,
+                        help=f"file the coherence of each finished candidate is streamed to (default: {SWEEP_RESULTS_PATH})")
+    parser.add_argument('--coherence', choices=['index', 'rescan'], default='index',
+                        help="look c_v window counts up in the persisted co-occurrence index, "
+                             "or rescan every text for each candidate like CoherenceModel does")
+    parser.add_argument('--restart', action='store_true',
+                        help="ignore the results of an earlier sweep instead of resuming it")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    run_topic_modeling()
+    args = parse_args()
+    instrumentation.setup(args, stage='topics')
+    if args.restart and os.path.exists(args.results):
+        os.remove(args.results)
+    run_topic_modeling(workers=args.workers, seed=args.seed, results_path=args.results, mode=args.mode,
+                       coherence=args.coherence)
@@ -1,58 +1,248 @@
+import argparse
+import json
+import os
+import numpy as np
 import pandas as pd
-import gensim
-import pyLDAvis.gensim_models as gensimvis
-import pyLDAvis
-from gensim import corpora, models
-from gensim.models import CoherenceModel
-import matplotlib.pyplot as plt
-import seaborn as sns
 import re
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+from coherence_index import load_index
+from dtm_store import load_dtm
+import instrumentation
+from instrumentation import timer
+from nltk_resources import english_stopwords, ensure_nltk_data
+from speech_store import ANALYZED
 
-def preprocess_text(text):
-    stop_words = set(stopwords.words('english'))
-    lemmatizer = WordNetLemmatizer()
+# gensim, pyLDAvis, matplotlib and NLTK are imported where they are used, so --help starts at once
+STOP_WORDS = None
+LEMMATIZER = None
+
+# Documents inferred per batch by document_topic_matrix
+INFERENCE_CHUNKSIZE = 2000
+
+NUM_TOPICS = 12
+TOPIC_TABLE_PATH = 'topic_distribution_by_president.csv'
+# Model, dictionary and serialized corpus kept between runs for incremental updates
+MODEL_STATE_DIR = 'lda_by_president'
+# Retrain from scratch once this share of the tokens folded in since the last full
+# training belongs to words the model's vocabulary does not have
+DRIFT_THRESHOLD = 0.05
+
+def load_nltk():
+    global STOP_WORDS, LEMMATIZER
+    if STOP_WORDS is None:
+        ensure_nltk_data('wordnet')
+        from nltk.stem import WordNetLemmatizer
+        STOP_WORDS = english_stopwords()
+        LEMMATIZER = WordNetLemmatizer()
 
+def preprocess_text(text):
+    if STOP_WORDS is None:
+        load_nltk()
     text = text.lower()
     text = re.sub(r'\W+', ' ', text)
     tokens = text.split()
-    tokens = [lemmatizer.lemmatize(word) for word in tokens if word not in stop_words and len(word) > 2]
+    tokens = [LEMMATIZER.lemmatize(word) for word in tokens if word not in STOP_WORDS and len(word) > 2]
     return tokens
 
-def load_and_prepare_data(filepath):
-    df = pd.read_csv(filepath)
-    df['tokens'] = df['processed_text'].apply(preprocess_text)
-    return df
+def load_and_prepare_data(table=ANALYZED):
+    # preprocess_text runs once per vocabulary term of the shared document-term matrix
+    dtm = load_dtm(table).project(preprocess_text)
+    df = dtm.rows[['doc_name', 'president']].copy()
+    df['tokens'] = list(dtm.sequences())
+    return df, dtm
+
+def train_lda_model(dtm, num_topics=NUM_TOPICS):
+    from gensim import models
 
-def train_lda_model(df, num_topics=12):
-    dictionary = corpora.Dictionary(df['tokens'])
-    corpus = [dictionary.doc2bow(text) for text in df['tokens']]
-    lda_model = models.LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics, passes=10, random_state=42)
+    dictionary, corpus = dtm.to_gensim()
+    with timer('lda.train'):
+        lda_model = models.LdaModel(corpus=corpus, id2word=dictionary, num_topics=num_topics, passes=10, random_state=42)
+    instrumentation.count('lda.passes', 10)
     return lda_model, corpus, dictionary
 
-def compute_coherence(lda_model, tokens, dictionary):
-    coherence_model = CoherenceModel(model=lda_model, texts=tokens, dictionary=dictionary, coherence='c_v')
-    return coherence_model.get_coherence()
+def compute_coherence(lda_model, tokens, dictionary, index=None):
+    # The persisted co-occurrence index gives the same c_v value without rescanning the texts
+    instrumentation.count('coherence.models')
+    if index is not None:
+        with timer('coherence.index'):
+            return index.coherence(lda_model)
+    with timer('coherence.rescan'):
+        from gensim.models import CoherenceModel
+        coherence_model = CoherenceModel(model=lda_model, texts=tokens, dictionary=dictionary, coherence='c_v')
+        return coherence_model.get_coherence()
+
+def document_topic_matrix(lda_model, corpus, chunksize=INFERENCE_CHUNKSIZE):
+    """
+    Returns the dense (documents x topics) matrix of topic probabilities, inferred in batches.
+    Probabilities below the model's minimum_probability are zeroed, like lda_model[doc] omits them.
+    """
+    from gensim import utils
+
+    minimum_probability = max(lda_model.minimum_probability, 1e-8)
+    blocks = []
+    for chunk in utils.grouper(corpus, chunksize):
+        with timer('lda.inference'):
+            gamma, _ = lda_model.inference(chunk)
+        blocks.append(gamma / gamma.sum(axis=1, keepdims=True))
+    if not blocks:
+        return np.zeros((0, lda_model.num_topics))
+    matrix = np.vstack(blocks)
+    matrix[matrix < minimum_probability] = 0.0
+    return matrix
+
+def president_means(presidents, topic_matrix, num_topics):
+    """Mean topic distribution per president, as one scatter-add over the factorized labels."""
+    codes, labels = pd.factorize(presidents, sort=True)
+    valid = codes >= 0
+    sums = np.zeros((len(labels), num_topics))
+    np.add.at(sums, codes[valid], topic_matrix[valid])
+    counts = np.bincount(codes[valid], minlength=len(labels))
+
+    return pd.DataFrame(sums / counts[:, None], columns=[f'Topic {i}' for i in range(num_topics)],
+                        index=pd.Index(list(labels), name='president'))
 
 def analyze_topics_per_president(df, lda_model, corpus, num_topics):
-    df['topic_distribution'] = [lda_model[doc] for doc in corpus]
-    topic_matrix = []
+    topic_matrix = document_topic_matrix(lda_model, corpus)
+    return president_means(df['president'], topic_matrix, num_topics)
+
+def _state_path(name, state_dir=MODEL_STATE_DIR):
+    return os.path.join(state_dir, name)
+
+def save_state(state, state_dir=MODEL_STATE_DIR):
+    """Persists the model, dictionary, document index and document-topic matrix (the corpus is written separately)."""
+    os.makedirs(state_dir, exist_ok=True)
+    state['model'].save(_state_path('lda.model', state_dir))
+    state['dictionary'].save(_state_path('dictionary.dict', state_dir))
+    np.save(_state_path('doc_topics.npy', state_dir), state['doc_topics'])
+    with open(_state_path('documents.json', state_dir), 'w', encoding='utf-8') as f:
+        json.dump({'doc_names': state['doc_names'], 'presidents': state['presidents'],
+                   'folded_tokens': state['folded_tokens'], 'unknown_tokens': state['unknown_tokens']}, f)
+
+def load_state(state_dir=MODEL_STATE_DIR):
+    """Loads what save_state persisted, or returns None when there is no complete saved state."""
+    from gensim import corpora, models
+
+    names = ['lda.model', 'dictionary.dict', 'doc_topics.npy', 'documents.json', 'corpus.mm']
+    if not all(os.path.exists(_state_path(name, state_dir)) for name in names):
+        return None
+    with open(_state_path('documents.json', state_dir), 'r', encoding='utf-8') as f:
+        state = json.load(f)
+    state['model'] = models.LdaModel.load(_state_path('lda.model', state_dir))
+    state['dictionary'] = corpora.Dictionary.load(_state_path('dictionary.dict', state_dir))
+    state['doc_topics'] = np.load(_state_path('doc_topics.npy', state_dir))
+    return state
 
-    for dist in df['topic_distribution']:
-        row = [0.0] * num_topics
-        for topic_id, weight in dist:
-            row[topic_id] = weight
-        topic_matrix.append(row)
+def serialize_corpus(bows, state_dir=MODEL_STATE_DIR):
+    """Writes the bag-of-words corpus as a Matrix Market file, replacing the previous one atomically."""
+    from gensim import corpora
 
-    topic_df = pd.DataFrame(topic_matrix, columns=[f'Topic {i}' for i in range(num_topics)])
-    df_topics = pd.concat([df[['president']], topic_df], axis=1)
+    os.makedirs(state_dir, exist_ok=True)
+    path = _state_path('corpus.mm', state_dir)
+    tmp_path = _state_path('corpus.tmp.mm', state_dir)
+    corpora.MmCorpus.serialize(tmp_path, bows)
+    for suffix in ('', '.index'):
+        os.replace(tmp_path + suffix, path + suffix)
 
-    grouped = df_topics.groupby('president').mean()
-    return grouped
+def stored_corpus(state_dir=MODEL_STATE_DIR):
+    from gensim import corpora
+    return corpora.MmCorpus(_state_path('corpus.mm', state_dir))
+
+def model_view(lda_model, dictionary, corpus):
+    """
+    The dictionary and corpus restricted to the words the model was trained with. An updated
+    dictionary also holds words added by later speeches, which the model has no topics for.
+    """
+    if len(dictionary) == lda_model.num_terms:
+        return dictionary, corpus
+    from gensim import corpora
+    known = corpora.Dictionary()
+    known.token2id = {token: i for token, i in dictionary.token2id.items() if i < lda_model.num_terms}
+    known.dfs = {i: freq for i, freq in dictionary.dfs.items() if i < lda_model.num_terms}
+    known.cfs = {i: freq for i, freq in dictionary.cfs.items() if i < lda_model.num_terms}
+    known.num_docs = dictionary.num_docs
+    return known, [[(i, count) for i, count in bow if i < lda_model.num_terms] for bow in corpus]
+
+def _labels(series):
+    return [None if pd.isna(value) else str(value) for value in series]
+
+def full_train(df, dtm, num_topics=NUM_TOPICS):
+    """Trains the model from scratch and returns the new state and the topic table of every president."""
+    lda_model, corpus, dictionary = train_lda_model(dtm, num_topics=num_topics)
+    serialize_corpus(corpus)
+    doc_topics = document_topic_matrix(lda_model, corpus)
+    state = {'model': lda_model, 'dictionary': dictionary, 'doc_topics': doc_topics,
+             'doc_names': df['doc_name'].astype(str).tolist(), 'presidents': _labels(df['president']),
+             'folded_tokens': 0, 'unknown_tokens': 0}
+    save_state(state)
+    return state, president_means(df['president'], doc_topics, num_topics)
+
+def update_model(state, df, drift_threshold=DRIFT_THRESHOLD, table_path=TOPIC_TABLE_PATH):
+    """
+    Folds the speeches the saved model has not seen into it with online LDA updates and extends
+    the dictionary with their words. Only the new speeches are inferred, and only the rows of
+    their presidents are recomputed in the saved topic table.
+    Returns (state, topic table), or None when the vocabulary drifted past drift_threshold
+    (or the topic table is missing) and a full retrain is needed.
+    """
+    if not os.path.exists(table_path):
+        return None
+    lda_model, dictionary = state['model'], state['dictionary']
+    new_rows = df[~df['doc_name'].astype(str).isin(set(state['doc_names']))]
+    topic_table = pd.read_csv(table_path, index_col='president')
+    if new_rows.empty:
+        print("No new speeches since the saved model; nothing to update.")
+        return state, topic_table
+
+    dictionary.add_documents(new_rows['tokens'])
+    new_bows = [dictionary.doc2bow(tokens) for tokens in new_rows['tokens']]
+    known_bows = [[(i, count) for i, count in bow if i < lda_model.num_terms] for bow in new_bows]
+
+    # Words new to the dictionary cannot be added to the model's topics: track how much they weigh
+    folded = sum(count for bow in new_bows for _, count in bow)
+    unknown = folded - sum(count for bow in known_bows for _, count in bow)
+    folded_tokens = state['folded_tokens'] + folded
+    unknown_tokens = state['unknown_tokens'] + unknown
+    drift = unknown_tokens / folded_tokens if folded_tokens else 0.0
+    print(f"{len(new_rows)} new speeches; {drift:.1%} of the tokens folded in since the last full "
+          f"training are out of the model's vocabulary.")
+    if drift > drift_threshold:
+        print(f"Drift above {drift_threshold:.1%}: retraining from scratch.")
+        return None
+
+    with timer('lda.update'):
+        lda_model.update(known_bows)
+    instrumentation.count('lda.passes', lda_model.passes)
+    serialize_corpus(list(stored_corpus()) + new_bows)
+    new_topics = document_topic_matrix(lda_model, known_bows)
+    state.update(doc_topics=np.vstack([state['doc_topics'], new_topics]),
+                 doc_names=state['doc_names'] + new_rows['doc_name'].astype(str).tolist(),
+                 presidents=state['presidents'] + _labels(new_rows['president']),
+                 folded_tokens=folded_tokens, unknown_tokens=unknown_tokens)
+    save_state(state)
+
+    # Recompute the rows of the presidents the new speeches belong to
+    affected = set(new_rows['president'].dropna().astype(str))
+    presidents = pd.Series(state['presidents'])
+    in_affected = presidents.isin(affected).to_numpy()
+    updated = president_means(presidents[in_affected].reset_index(drop=True), state['doc_topics'][in_affected],
+                              lda_model.num_topics)
+    topic_table = pd.concat([topic_table.drop(index=list(affected), errors='ignore'), updated]).sort_index()
+    topic_table.index.name = 'president'
+    return state, topic_table
+
+def save_visualization(lda_model, dictionary, output_path='lda_visualization_12_topics.html'):
+    import pyLDAvis
+    import pyLDAvis.gensim_models as gensimvis
+
+    vis_dictionary, vis_corpus = model_view(lda_model, dictionary, stored_corpus())
+    with timer('lda.visualize'):
+        vis = gensimvis.prepare(lda_model, vis_corpus, vis_dictionary)
+        pyLDAvis.save_html(vis, output_path)
+    print(f"LDA visualization saved to {output_path}")
 
 def plot_heatmap(topic_dist_by_president):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     plt.figure(figsize=(12, 8))
     ax = sns.heatmap(topic_dist_by_president, annot=True, cmap='viridis')
 
@@ -64,28 +254,53 @@ def plot_heatmap(topic_dist_by_president):
     plt.tight_layout()
     plt.show()
 
-def save_topic_table(topic_dist_by_president, output_path='topic_distribution_by_president.csv'):
+def save_topic_table(topic_dist_by_president, output_path=TOPIC_TABLE_PATH):
     topic_dist_by_president.to_csv(output_path)
     print(f"Saved topic distribution table to: {output_path}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Model the topics of the speeches and average them per president.")
+    parser.add_argument('--update', action='store_true',
+                        help=f"fold new speeches into the model saved in {MODEL_STATE_DIR}/ instead of retraining")
+    parser.add_argument('--drift-threshold', type=float, default=DRIFT_THRESHOLD,
+                        help="share of out-of-vocabulary tokens in the folded-in speeches above which "
+                             f"--update retrains from scratch (default: {DRIFT_THRESHOLD})")
+    parser.add_argument('--no-visualization', action='store_true',
+                        help="skip the pyLDAvis HTML (pyLDAvis is then never imported)")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
 def main():
-    csv_path = 'analyzed_speeches.csv'
-    df = load_and_prepare_data(csv_path)
+    args = parse_args()
+    instrumentation.setup(args, stage='topics_by_president')
+    with timer('topics.load'):
+        df, dtm = load_and_prepare_data(ANALYZED)
+    instrumentation.count('docs', len(df))
+    instrumentation.count('tokens', len(dtm.tokens))
 
-    num_topics = 12
-    lda_model, corpus, dictionary = train_lda_model(df, num_topics=num_topics)
+    result = None
+    if args.update:
+        state = load_state()
+        if state is None:
+            print(f"No saved model in {MODEL_STATE_DIR}/; training from scratch.")
+        else:
+            result = update_model(state, df, drift_threshold=args.drift_threshold)
+    if result is None:
+        result = full_train(df, dtm, num_topics=NUM_TOPICS)
+    state, topic_dist_by_president = result
+    lda_model, dictionary = state['model'], state['dictionary']
 
-    coherence = compute_coherence(lda_model, df['tokens'], dictionary)
+    with timer('coherence.load_index'):
+        index = load_index(dtm, dictionary, name='topic_modeling_by_president')
+    coherence = compute_coherence(lda_model, df['tokens'], dictionary, index)
     print(f'Coherence Score: {coherence:.4f}')
 
     # Save visualization
-    vis = gensimvis.prepare(lda_model, corpus, dictionary)
-    pyLDAvis.save_html(vis, 'lda_visualization_12_topics.html')
-    print("LDA visualization saved to lda_visualization_12_topics.html")
-
-    topic_dist_by_president = analyze_topics_per_president(df, lda_model, corpus, num_topics=num_topics)
+    if not args.no_visualization:
+        save_visualization(lda_model, dictionary)
 
-    plot_heatmap(topic_dist_by_president)
+    with timer('plot.draw'):
+        plot_heatmap(topic_dist_by_president)
     save_topic_table(topic_dist_by_president)
 
 if __name__ == '__main__':
@@ -1,73 +1,377 @@
+import argparse
+import os
+import time
+from collections import Counter, deque
+from importlib import metadata
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-from collections import Counter
-import nltk
-from nltk.corpus import stopwords
-from nltk.util import ngrams
-from textstat import textstat
 import re
 import string
+import instrumentation
+from instrumentation import count, timer
+from nltk_resources import english_stopwords
+from presidents import PRESIDENT_TO_PARTY, term_of
+from sketches import HyperLogLog, SpaceSaving
+from speech_cache import SpeechCache, content_hash
+from speech_store import ANALYZED, load_speeches
 
-# Download NLTK stopwords if not already downloaded
-try:
-    stopwords.words('english')
-except LookupError:
-    nltk.download('stopwords')
-
-# --- START: CONFIGURATION & DATA LOADING ---
-INPUT_CSV_PATH = 'analyzed_speeches.csv'
+# --- START: CONFIGURATION ---
+INPUT_TABLE = ANALYZED
 OUTPUT_CSV_PATH = 'rhetorical_analysis_results.csv'
-
+# Other groupings are written to rhetorical_analysis_by_<grouping>.csv
+GROUPINGS = ('president', 'party', 'year', 'term')
+# Number of speeches sent to a worker at a time
+CHUNK_SIZE = 50
+NGRAM_SIZES = (2, 3)
+# Largest n-gram size accepted by --max-n
+MAX_NGRAM_SIZE = 5
+TOP_NGRAMS = 5
+# Default error bounds of --sketch: n-gram counts within NGRAM_ERROR * total n-grams,
+# DISTINCT_ERROR standard error on the number of word types
+NGRAM_ERROR = 0.0005
+DISTINCT_ERROR = 0.01
 # --- END: CONFIGURATION ---
 
-# Load the data
-try:
-    df = pd.read_csv(INPUT_CSV_PATH)
-except FileNotFoundError:
-    print(f"Error: The file {INPUT_CSV_PATH} was not found. Please ensure it exists in the current directory.")
-    exit()
-
-def get_rhetorical_metrics(text_series):
-    """Calculates lexical diversity, readability, and n-grams for a series of texts."""
-    all_text = ' '.join(text_series.dropna().astype(str))
-    
-    # 1. Advanced text cleaning and tokenization
-    # Remove punctuation
-    text_without_punct = all_text.translate(str.maketrans('', '', string.punctuation))
-    # Convert to lowercase and split into words
-    words = text_without_punct.lower().split()
-
-    # Clean text for n-gram and diversity analysis
-    stop_words = set(stopwords.words('english'))
-    cleaned_words = [word for word in words if word.isalpha() and word not in stop_words]
-
-    # 2. Lexical Diversity (Type-Token Ratio)
-    lexical_diversity = len(set(cleaned_words)) / len(cleaned_words) if cleaned_words else 0
-    
-    # 3. Readability Score (Flesch-Kincaid Grade Level)
-    readability_score = textstat.flesch_kincaid_grade(text_without_punct)
-    
-    # 4. N-grams (bi-grams and tri-grams)
-    bigrams = Counter(ngrams(cleaned_words, 2)).most_common(5)
-    trigrams = Counter(ngrams(cleaned_words, 3)).most_common(5)
-    
-    return pd.Series({
+CACHE_STAGE = 'rhetoric'
+CACHE_CONFIG = {'metrics': 'rhetoric-partials-v1', 'textstat': metadata.version('textstat'),
+                'stopwords': 'nltk-english'}
+
+NGRAM_COLUMNS = {2: 'Top_5_Bigrams', 3: 'Top_5_Trigrams'}
+
+def ngram_column(n):
+    return NGRAM_COLUMNS.get(n, f'Top_5_{n}grams')
+
+PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+# Loaded (and downloaded if missing) on first use; textstat is imported where it is used
+STOP_WORDS = None
+# textstat's sentence splitting (see textstat count_sentences)
+SENTENCE_PATTERN = re.compile(r'\b[^.!?]+[.!?]*', re.UNICODE)
+SENTENCE_END = re.compile(r'[.!?]')
+
+# Cleaned form of every term seen by this process, so clean_word runs once per term
+_cleaned_terms = {}
+
+def ngrams(words, n):
+    """The n-grams of a list of words as tuples, in order (like nltk.util.ngrams, without importing NLTK)."""
+    return zip(*(words[i:] for i in range(n)))
+
+def clean_word(term):
+    """Strips punctuation from a term and keeps it if it is an alphabetic non-stopword."""
+    global STOP_WORDS
+    if STOP_WORDS is None:
+        STOP_WORDS = english_stopwords()
+    word = term.translate(PUNCTUATION_TABLE)
+    return [word] if word.isalpha() and word not in STOP_WORDS else []
+
+def cleaned_words(text):
+    """The cleaned words of a speech, in order (same tokenization as the shared document-term matrix)."""
+    words = []
+    for term in text.lower().split():
+        if term not in _cleaned_terms:
+            _cleaned_terms[term] = clean_word(term)
+        words.extend(_cleaned_terms[term])
+    return words
+
+# --- Partial states ---
+# Every metric is computed per speech into a partial state that can be merged with the
+# partial of the speeches before it. Merging the partials of a president's speeches, in
+# order, gives exactly what the metrics give on the joined text of all those speeches:
+# - types/tokens for the type-token ratio,
+# - character, word, syllable and sentence counts for Flesch-Kincaid. textstat splits
+#   sentences on .!?, so the sentence fragments at both ends of a speech are kept apart:
+#   an unterminated last fragment continues into the next speech's first one,
+# - n-gram counts in first-occurrence order, plus the words at both ends of the speech
+#   to count the n-grams that span two speeches.
+# Per-speech partials are always exact. In sketch mode the group accumulators are
+# bounded instead: Space-Saving summaries for the n-grams, HyperLogLog for the types.
+
+def _sentence_state(text):
+    """Sentence fragments of a text: the first and last ones as [words, terminated], the middle ones counted."""
+    from textstat import textstat
+
+    matches = list(SENTENCE_PATTERN.finditer(text))
+    fragments = [[textstat.lexicon_count(m.group()), bool(SENTENCE_END.search(m.group()[-1]))] for m in matches]
+    leading = text[:matches[0].start()] if matches else text
+    state = {'lead_stop': bool(SENTENCE_END.search(leading)), 'fragments': fragments,
+             'middle': 0, 'middle_short': 0}
+    return _compress_sentences(state)
+
+def _compress_sentences(state):
+    fragments = state['fragments']
+    if len(fragments) > 2:
+        middle = fragments[1:-1]
+        state['middle'] += len(middle)
+        state['middle_short'] += sum(1 for words, _ in middle if words <= 2)
+        state['fragments'] = [fragments[0], fragments[-1]]
+    return state
+
+def _merge_sentences(a, b):
+    first = [list(fragment) for fragment in a['fragments']]
+    second = [list(fragment) for fragment in b['fragments']]
+    if not first:
+        lead_stop = a['lead_stop'] or b['lead_stop']
+    else:
+        lead_stop = a['lead_stop']
+        last = first[-1]
+        if not last[1]:
+            # The open fragment runs on into the next text until a sentence end
+            if b['lead_stop']:
+                last[1] = True
+            elif second:
+                last[0] += second[0][0]
+                last[1] = second[0][1]
+                second = second[1:]
+    state = {'lead_stop': lead_stop, 'fragments': first + second,
+             'middle': a['middle'] + b['middle'], 'middle_short': a['middle_short'] + b['middle_short']}
+    return _compress_sentences(state)
+
+def _sentence_count(state, chars):
+    """textstat.sentence_count of the joined text."""
+    if chars == 0:
+        return 0
+    total = state['middle'] + len(state['fragments'])
+    short = state['middle_short'] + sum(1 for words, _ in state['fragments'] if words <= 2)
+    return max(1, total - short)
+
+def sketch_config(ngram_error=NGRAM_ERROR, distinct_error=DISTINCT_ERROR):
+    return {'ngram_error': ngram_error, 'distinct_error': distinct_error}
+
+def empty_partial(sizes=NGRAM_SIZES, sketch=None):
+    """An empty partial; with a sketch config (see sketch_config) its n-grams and types are bounded summaries."""
+    if sketch is None:
+        types, counts = set(), {n: Counter() for n in sizes}
+    else:
+        types = HyperLogLog.for_error(sketch['distinct_error'])
+        counts = {n: SpaceSaving.for_error(sketch['ngram_error']) for n in sizes}
+    return {'texts': 0, 'chars': 0, 'words': 0, 'syllables': 0,
+            'sentences': {'lead_stop': False, 'fragments': [], 'middle': 0, 'middle_short': 0},
+            'tokens': 0, 'types': types, 'head': [], 'tail': [], 'ngrams': counts}
+
+def speech_partial(text, sizes=NGRAM_SIZES):
+    """Partial state of a single speech (an empty one for a missing text)."""
+    partial = empty_partial(sizes)
+    count('docs')
+    if not isinstance(text, str):
+        return partial
+    from textstat import textstat
+
+    with timer('rhetoric.speech'):
+        plain = text.translate(PUNCTUATION_TABLE)
+        words = cleaned_words(text)
+        edge = max(sizes) - 1
+        partial.update(texts=1, chars=len(plain), words=textstat.lexicon_count(plain),
+                       syllables=textstat.syllable_count(plain), sentences=_sentence_state(plain),
+                       tokens=len(words), types=set(words), head=words[:edge], tail=words[-edge:] if edge else [],
+                       ngrams={n: Counter(ngrams(words, n)) for n in sizes})
+    count('tokens', len(words))
+    return partial
+
+def merge_partials(a, b):
+    """Merges the partial of later speeches (b) into a, in place, and returns a."""
+    if b['texts'] == 0 and b['tokens'] == 0:
+        return a
+    if a['texts'] and b['texts']:
+        a['chars'] += 1  # the space joining the two texts
+    a['chars'] += b['chars']
+    a['texts'] += b['texts']
+    a['words'] += b['words']
+    a['syllables'] += b['syllables']
+    a['sentences'] = _merge_sentences(a['sentences'], b['sentences'])
+
+    for n, counts in a['ngrams'].items():
+        # n-grams that start in a and end in b come after a's own and before b's own
+        if n > 1:
+            counts.update(ngrams(a['tail'][-(n - 1):] + b['head'][:n - 1], n))
+        counts.update(b['ngrams'][n])
+    edge = max(a['ngrams']) - 1
+    a['head'] = (a['head'] + b['head'])[:edge]
+    a['tail'] = (a['tail'] + b['tail'])[-edge:] if edge else []
+    a['tokens'] += b['tokens']
+    a['types'] |= b['types']
+    return a
+
+def partial_chunk(texts, sizes=NGRAM_SIZES):
+    return [speech_partial(text, sizes) for text in texts]
+
+def partial_to_json(partial):
+    value = dict(partial)
+    value['types'] = sorted(partial['types'])
+    value['ngrams'] = {str(n): [[list(gram), count] for gram, count in counts.items()]
+                       for n, counts in partial['ngrams'].items()}
+    return value
+
+def partial_from_json(value):
+    partial = dict(value)
+    partial['types'] = set(value['types'])
+    partial['ngrams'] = {int(n): Counter({tuple(gram): count for gram, count in counts})
+                         for n, counts in value['ngrams'].items()}
+    return partial
+
+def iter_partials(texts, doc_names=None, workers=1, chunk_size=CHUNK_SIZE, cache=None, sizes=NGRAM_SIZES,
+                  stats=None):
+    """
+    Yields the partial state of every text, in order. The texts go through a process pool chunk by
+    chunk when workers > 1, with at most 2 * workers chunks in flight, so only the partials of those
+    chunks are held at a time. With a cache (and the doc_names of the texts) only the speeches that
+    changed since they were cached are computed; stats['computed'] counts them.
+    """
+    texts = list(texts)
+    config = dict(CACHE_CONFIG, ngrams=list(sizes))
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(texts) > chunk_size else None
+    in_flight = deque()
+
+    def submit(first):
+        chunk = texts[first:first + chunk_size]
+        names = doc_names[first:first + chunk_size] if cache is not None else None
+        hashes, cached = None, {}
+        if cache is not None:
+            hashes = [content_hash(text if isinstance(text, str) else '', config) for text in chunk]
+            with timer('rhetoric.cache_lookup'):
+                cached = cache.get_many(CACHE_STAGE, zip(names, hashes))
+        pending = [i for i in range(len(chunk)) if hashes is None or (names[i], hashes[i]) not in cached]
+        pending_texts = [chunk[i] for i in pending]
+        job = executor.submit(partial_chunk, pending_texts, sizes) if executor is not None else pending_texts
+        in_flight.append((names, hashes, cached, pending, job))
+
+    def collect():
+        names, hashes, cached, pending, job = in_flight.popleft()
+        fresh = job.result() if executor is not None else partial_chunk(job, sizes)
+        if stats is not None:
+            stats['computed'] = stats.get('computed', 0) + len(pending)
+        if cache is not None:
+            with timer('rhetoric.cache_store'):
+                cache.put_many(CACHE_STAGE, [(names[i], hashes[i], partial_to_json(partial))
+                                             for i, partial in zip(pending, fresh)])
+        computed = dict(zip(pending, fresh))
+        for i in range(len(names) if names is not None else len(fresh)):
+            yield computed[i] if i in computed else partial_from_json(cached[names[i], hashes[i]])
+
+    try:
+        for first in range(0, len(texts), chunk_size):
+            submit(first)
+            if len(in_flight) >= 2 * workers:
+                yield from collect()
+        while in_flight:
+            yield from collect()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+def get_rhetorical_metrics(partial):
+    """Lexical diversity, readability and top n-grams from the merged partial of a group of speeches."""
+    # 1. Lexical Diversity (Type-Token Ratio)
+    lexical_diversity = len(partial['types']) / partial['tokens'] if partial['tokens'] else 0
+
+    # 2. Readability Score (Flesch-Kincaid Grade Level), as textstat.flesch_kincaid_grade on the joined text
+    sentences = _sentence_count(partial['sentences'], partial['chars'])
+    words_per_sentence = partial['words'] / sentences if sentences else 0.0
+    syllables_per_word = partial['syllables'] / partial['words'] if partial['words'] else 0.0
+    if words_per_sentence == 0 or syllables_per_word == 0:
+        readability_score = 0.0
+    else:
+        readability_score = (0.39 * words_per_sentence) + (11.8 * syllables_per_word) - 15.59
+
+    # 3. N-grams (bi-grams, tri-grams and any longer ones requested)
+    metrics = {
         'Lexical_Diversity': lexical_diversity,
         'Readability_Score': readability_score,
-        'Top_5_Bigrams': bigrams,
-        'Top_5_Trigrams': trigrams
-    })
+    }
+    for n, counts in partial['ngrams'].items():
+        metrics[ngram_column(n)] = counts.most_common(TOP_NGRAMS)
+    return metrics
+
+def group_labels(df, grouping):
+    """The label of every speech for a grouping (NaN when the speech does not belong to any group)."""
+    if grouping == 'party':
+        return df['president'].astype(object).map(PRESIDENT_TO_PARTY)
+    if grouping == 'year':
+        return pd.to_datetime(df['date'], errors='coerce').dt.year.astype('Int64')
+    if grouping == 'term':
+        years = pd.to_datetime(df['date'], errors='coerce').dt.year
+        terms = [term_of(president, year) if isinstance(president, str) and pd.notna(year) else None
+                 for president, year in zip(df['president'].astype(object), years)]
+        return pd.Series([f"{president} ({term})" if term else None
+                          for president, term in zip(df['president'].astype(object), terms)], index=df.index)
+    return df['president'].astype(object)
+
+def aggregate(partials, labels, sizes=NGRAM_SIZES, sketch=None):
+    """
+    Merges the partials of every group, in speech order. Returns {label: merged partial}, sorted by label.
+    With a sketch config the merged n-grams and types are bounded summaries instead of exact counts, so
+    with partials streamed from iter_partials the memory no longer grows with the corpus.
+    """
+    merged = {}
+    # partials may be a generator (see iter_partials): each one is folded into its group and dropped
+    for partial, label in zip(partials, labels):
+        if pd.isna(label):
+            continue
+        with timer('rhetoric.aggregate'):
+            if label not in merged:
+                merged[label] = empty_partial(sizes, sketch)
+            merge_partials(merged[label], partial)
+    return dict(sorted(merged.items()))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rhetorical metrics (lexical diversity, readability, n-grams) per group of speeches.")
+    parser.add_argument('--group-by', choices=GROUPINGS, default='president',
+                        help="combine the per-speech metrics per president (default), party, year or term")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of processes computing per-speech metrics (default: number of CPUs)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help=f"speeches per worker task (default: {CHUNK_SIZE})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="recompute every speech instead of reusing cached per-speech metrics")
+    parser.add_argument('--max-n', type=int, choices=range(3, MAX_NGRAM_SIZE + 1), default=max(NGRAM_SIZES),
+                        help=f"report the top n-grams for every n from 2 up to this size (default: {max(NGRAM_SIZES)})")
+    parser.add_argument('--sketch', action='store_true',
+                        help="bound the memory of each group: Space-Saving top n-grams and HyperLogLog type counts")
+    parser.add_argument('--ngram-error', type=float, default=NGRAM_ERROR,
+                        help=f"--sketch n-gram count error, as a share of the group's n-grams (default: {NGRAM_ERROR})")
+    parser.add_argument('--distinct-error', type=float, default=DISTINCT_ERROR,
+                        help=f"--sketch standard error of the type count (default: {DISTINCT_ERROR})")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    instrumentation.setup(args, stage='rhetoric')
+
+    # Load the data
+    try:
+        df = load_speeches(INPUT_TABLE, columns=['doc_name', 'president', 'date', 'processed_text'])
+    except FileNotFoundError as e:
+        print(f"Error: The file {e} was not found. Please ensure it exists in the current directory.")
+        exit()
+
+    sizes = tuple(range(2, args.max_n + 1))
+    print("Performing rhetorical analysis on each speech...")
+    start = time.perf_counter()
+    # The per-speech partials are folded into their group as they are computed or read from the cache
+    cache = None if args.no_cache else SpeechCache()
+    stats = {'computed': 0}
+    partials = iter_partials(df['processed_text'], df['doc_name'].astype(str).tolist(), workers=args.workers,
+                             chunk_size=args.chunk_size, cache=cache, sizes=sizes, stats=stats)
+    sketch = sketch_config(args.ngram_error, args.distinct_error) if args.sketch else None
+    groups = aggregate(partials, group_labels(df, args.group_by), sizes=sizes, sketch=sketch)
+    if cache is not None:
+        cache.close()
+        print(f"{len(df) - stats['computed']} speeches reused from the cache, {stats['computed']} analyzed.")
+    print(f"Per-speech metrics combined in {time.perf_counter() - start:.1f}s.")
 
-print("Performing rhetorical analysis on each president's speeches...")
+    # Derive the metrics of every group
+    rhetorical_analysis_df = pd.DataFrame([{args.group_by: label, **get_rhetorical_metrics(partial)}
+                                           for label, partial in groups.items()])
 
-# Group data by president and apply the analysis function
-rhetorical_analysis_df = df.groupby('president').apply(lambda x: get_rhetorical_metrics(x['processed_text'])).reset_index()
+    # Clean up the n-gram columns for saving to CSV
+    for column in map(ngram_column, sizes):
+        rhetorical_analysis_df[column] = rhetorical_analysis_df[column].apply(lambda x: ', '.join([f"'{' '.join(gram)}'" for gram, _ in x]))
 
-# Clean up the n-gram columns for saving to CSV
-rhetorical_analysis_df['Top_5_Bigrams'] = rhetorical_analysis_df['Top_5_Bigrams'].apply(lambda x: ', '.join([f"'{' '.join(gram)}'" for gram, _ in x]))
-rhetorical_analysis_df['Top_5_Trigrams'] = rhetorical_analysis_df['Top_5_Trigrams'].apply(lambda x: ', '.join([f"'{' '.join(gram)}'" for gram, _ in x]))
+    # Save the results to a CSV file
+    output_path = OUTPUT_CSV_PATH if args.group_by == 'president' else f'rhetorical_analysis_by_{args.group_by}.csv'
+    rhetorical_analysis_df.to_csv(output_path, index=False)
+    print(f"\nRhetorical analysis results saved to '{output_path}'.")
 
-# Save the results to a CSV file
-rhetorical_analysis_df.to_csv(OUTPUT_CSV_PATH, index=False)
-print(f"\nRhetorical analysis results saved to '{OUTPUT_CSV_PATH}'.")
+    print("\nRhetorical analysis complete!")
 
-print("\nRhetorical analysis complete!")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+Persisted sliding-window co-occurrence index for c_v topic coherence.
+
+gensim's CoherenceModel(coherence='c_v') rescans every tokenized text with a 110-token
+sliding window each time it scores a model, counting in how many windows each top word
+and each pair of top words occur. Those counts only depend on the corpus, so this index
+computes them once per word and keeps them on disk (occurrences plus a sparse symmetric
+co-occurrence matrix over the words indexed so far). Scoring a model only needs the
+counts of its topics' top words: words already indexed are a lookup, and new words are
+added with one vectorized pass that only counts windows for the new words.
+
+The counts follow gensim's WordOccurrenceAccumulator exactly, including the way it drops
+a word from the window as soon as one of its occurrences slides out at the left edge, so
+the coherence values match CoherenceModel(coherence='c_v').
+
+    index = load_index(docs, dictionary, name='topic_modeling')
+    coherence = index.coherence(lda_model)
+"""
+import hashlib
+import json
+import os
+import numpy as np
+
+# --- START: CONFIGURATION ---
+INDEX_DIR = 'coherence_index'
+# gensim's default window size for c_v
+WINDOW_SIZE = 110
+# Number of speeches whose windows are counted at a time (bounds the peak memory)
+DOC_CHUNK = 256
+# --- END: CONFIGURATION ---
+
+class CooccurrenceIndex:
+    """Window occurrence and co-occurrence counts of a growing set of words of one corpus."""
+
+    def __init__(self, tokens, offsets, window_size=WINDOW_SIZE, path=None):
+        from scipy import sparse
+
+        self.tokens = np.asarray(tokens, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.window_size = window_size
+        self.path = path
+
+        lengths = np.diff(self.offsets)
+        # gensim counts one window for texts shorter than the window (even empty ones)
+        self.windows_per_doc = np.maximum(1, lengths - window_size + 1)
+        self.window_offsets = np.concatenate([[0], np.cumsum(self.windows_per_doc)])
+        self.num_docs = int(self.window_offsets[-1])
+        self.key = self._corpus_key()
+
+        self.terms = np.zeros(0, dtype=np.int64)
+        self.occurrences = np.zeros(0, dtype=np.int64)
+        self.cooccurrences = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self._position = {}
+
+    def _corpus_key(self):
+        digest = hashlib.sha1()
+        digest.update(self.tokens.tobytes())
+        digest.update(self.offsets.tobytes())
+        return f"{digest.hexdigest()}-w{self.window_size}"
+
+    def __getitem__(self, word_or_words):
+        """Same lookups as gensim's accumulators: index[word_id] or index[word_id1, word_id2]."""
+        if hasattr(word_or_words, '__iter__'):
+            first, second = (self._position[int(word_id)] for word_id in word_or_words)
+            return self.cooccurrences[first, second]
+        return self.occurrences[self._position[int(word_or_words)]]
+
+    def _presence_intervals(self, term_ids):
+        """
+        Returns (term rank in term_ids, first window, end window) of the merged runs of windows
+        in which each word counts as present, numbered across the whole corpus.
+        """
+        lookup = np.full(max(int(self.tokens.max(initial=0)), int(term_ids.max())) + 1, -1, dtype=np.int64)
+        lookup[term_ids] = np.arange(len(term_ids))
+        hits = np.flatnonzero(lookup[self.tokens] >= 0)
+        term = lookup[self.tokens[hits]]
+        doc = np.searchsorted(self.offsets, hits, side='right') - 1
+        pos = hits - self.offsets[doc]
+
+        order = np.argsort(term, kind='stable')
+        term, doc, pos = term[order], doc[order], pos[order]
+
+        # An occurrence at pos marks the word present from the window it enters (pos - w + 1)
+        # until the first window after one of its occurrences left at the edge: that is
+        # pos_j + 1 for the first occurrence pos_j of the same text >= pos - w + 1.
+        span = int(np.diff(self.offsets).max(initial=0)) + self.window_size + 1
+        group = term * len(self.windows_per_doc) + doc
+        keys = group * span + pos + self.window_size
+        first_inside = np.searchsorted(keys, group * span + pos + 1)
+        start = np.maximum(0, pos - self.window_size + 1)
+        end = np.minimum(pos[first_inside] + 1, self.windows_per_doc[doc])
+        start = start + self.window_offsets[doc]
+        end = end + self.window_offsets[doc]
+
+        # Merge overlapping runs of the same word
+        stride = self.num_docs + 1
+        shifted_start = term * stride + start
+        shifted_end = term * stride + end
+        running_end = np.maximum.accumulate(shifted_end)
+        begins = np.ones(len(start), dtype=bool)
+        begins[1:] = shifted_start[1:] > running_end[:-1]
+        first = np.flatnonzero(begins)
+        merged_end = np.maximum.reduceat(shifted_end, first) if len(first) else shifted_end[:0]
+        merged_term = term[first]
+        return merged_term, start[first], merged_end - merged_term * stride
+
+    def _count(self, all_terms, new_mask):
+        """Counts windows for the new words against every word of all_terms (new ones included)."""
+        from scipy import sparse
+
+        term, start, end = self._presence_intervals(all_terms)
+        occurrences = np.bincount(term, weights=end - start, minlength=len(all_terms)).astype(np.int64)
+        new_columns = np.flatnonzero(new_mask)
+        counts = sparse.csr_matrix((len(new_columns), len(all_terms)), dtype=np.int64)
+
+        bounds = self.window_offsets[::DOC_CHUNK].tolist() + [self.num_docs]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            selected = (start >= lo) & (start < hi)
+            if not selected.any():
+                continue
+            chunk_term, chunk_start, chunk_end = term[selected], start[selected], end[selected]
+            cuts = np.unique(np.concatenate([chunk_start, chunk_end]))
+            segment_length = np.diff(cuts)
+            first_segment = np.searchsorted(cuts, chunk_start)
+            segments_spanned = np.searchsorted(cuts, chunk_end) - first_segment
+            rows = np.repeat(first_segment, segments_spanned) + (
+                np.arange(segments_spanned.sum()) - np.repeat(np.cumsum(segments_spanned) - segments_spanned,
+                                                              segments_spanned))
+            columns = np.repeat(chunk_term, segments_spanned)
+            presence = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, columns)),
+                                         shape=(len(segment_length), len(all_terms)))
+            weighted = sparse.diags(segment_length, dtype=np.int64) @ presence
+            counts = counts + (presence[:, new_columns].T @ weighted).tocsr()
+        return occurrences, counts
+
+    def ensure(self, term_ids):
+        """Makes sure the counts of every given word are indexed, computing only the missing ones."""
+        from scipy import sparse
+
+        term_ids = np.unique(np.asarray(list(term_ids), dtype=np.int64))
+        missing = np.setdiff1d(term_ids, self.terms)
+        if len(missing) == 0:
+            return
+
+        all_terms = np.union1d(self.terms, missing)
+        new_mask = np.isin(all_terms, missing)
+        occurrences, new_counts = self._count(all_terms, new_mask)
+
+        # Old pairs keep their counts; pairs involving a new word come from new_counts (both orders)
+        old_positions = np.searchsorted(all_terms, self.terms)
+        new_positions = np.flatnonzero(new_mask)
+        old = self.cooccurrences.tocoo()
+        fresh = new_counts.tocoo()
+        mirror = ~new_mask[fresh.col]
+        rows = np.concatenate([old_positions[old.row], new_positions[fresh.row], fresh.col[mirror]])
+        columns = np.concatenate([old_positions[old.col], fresh.col, new_positions[fresh.row[mirror]]])
+        values = np.concatenate([old.data, fresh.data, fresh.data[mirror]])
+        self.cooccurrences = sparse.csr_matrix((values, (rows, columns)), shape=(len(all_terms), len(all_terms)))
+
+        self.terms = all_terms
+        self.occurrences = occurrences
+        self._position = {int(term_id): i for i, term_id in enumerate(all_terms)}
+        if self.path:
+            self.save()
+
+    def coherence(self, model, topn=20):
+        """c_v coherence of a topic model, identical to CoherenceModel(model=model, coherence='c_v', topn=topn)."""
+        from gensim import matutils
+        from gensim.models.coherencemodel import COHERENCE_MEASURES
+
+        topics = [matutils.argsort(topic, topn=topn, reverse=True) for topic in model.get_topics()]
+        self.ensure(np.concatenate(topics))
+        measure = COHERENCE_MEASURES['c_v']
+        segmented_topics = measure.seg(topics)
+        confirmed = measure.conf(segmented_topics, self, topics=topics, measure='nlr', gamma=1,
+                                 with_std=False, with_support=False)
+        return measure.aggr(confirmed)
+
+    def save(self):
+        from scipy import sparse
+
+        os.makedirs(self.path, exist_ok=True)
+        np.savez(os.path.join(self.path, 'counts.npz'), terms=self.terms, occurrences=self.occurrences)
+        sparse.save_npz(os.path.join(self.path, 'cooccurrences.npz'), self.cooccurrences)
+        with open(os.path.join(self.path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'key': self.key, 'terms': len(self.terms)}, f)
+
+    def load(self):
+        """Loads the counts saved for this corpus, if any. Returns True when they were found."""
+        from scipy import sparse
+
+        meta_path = os.path.join(self.path, 'meta.json')
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('key') != self.key:
+                return False
+        with np.load(os.path.join(self.path, 'counts.npz')) as counts:
+            self.terms = counts['terms']
+            self.occurrences = counts['occurrences']
+        self.cooccurrences = sparse.load_npz(os.path.join(self.path, 'cooccurrences.npz')).tocsr()
+        self._position = {int(term_id): i for i, term_id in enumerate(self.terms)}
+        return True
+
+def load_index(dtm, dictionary, name, window_size=WINDOW_SIZE, path=INDEX_DIR):
+    """
+    Returns the index of a document-term matrix (see dtm_store) whose ids follow `dictionary`,
+    reusing the counts persisted under path/name when they were computed for the same corpus.
+    """
+    to_dictionary_id = np.array([dictionary.token2id.get(term, -1) for term in dtm.vocab], dtype=np.int64)
+    index = CooccurrenceIndex(to_dictionary_id[dtm.tokens], dtm.offsets, window_size, os.path.join(path, name))
+    index.load()
+    return index
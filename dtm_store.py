@@ -0,0 +1,211 @@
+"""
+Shared document-term matrix over the processed speeches.
+
+The analyzed table is tokenized once (lowercase, whitespace split) into a vocabulary,
+a scipy CSR matrix of term counts, the token stream of every speech as vocabulary ids,
+and a row index with doc_name, president and date. The result is persisted in DTM_DIR
+and rebuilt only when the analyzed table changes.
+
+Each stage has its own notion of a token (stopword lists, punctuation handling, WordNet
+lemmas...). Since all of them work token by token, a stage derives its own matrix with
+`project`, which applies its token function once per vocabulary term instead of once
+per token occurrence:
+
+    dtm = load_dtm()
+    words = dtm.project(lambda term: [term] if term.isalpha() else [])
+    counts = words.term_counts(mask)
+"""
+import json
+import os
+from collections import Counter
+import numpy as np
+import pandas as pd
+from instrumentation import timer
+from speech_store import ANALYZED, load_speeches, source_path
+
+# --- START: CONFIGURATION ---
+DTM_DIR = 'dtm'
+# --- END: CONFIGURATION ---
+
+ROW_COLUMNS = ['doc_name', 'president', 'date']
+
+class DocumentTermMatrix:
+    """Vocabulary, CSR term counts, token stream and row index of a set of speeches."""
+
+    def __init__(self, vocab, tokens, offsets, rows, matrix=None):
+        self.vocab = list(vocab)
+        self.tokens = np.asarray(tokens, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.rows = rows.reset_index(drop=True)
+        self.matrix = matrix if matrix is not None else self._count_matrix()
+
+    @classmethod
+    def from_texts(cls, texts, rows):
+        """Tokenizes every text once and builds the matrix. NaN texts become empty rows."""
+        vocab = {}
+        tokens = []
+        offsets = [0]
+        for text in texts:
+            if isinstance(text, str):
+                tokens.extend(vocab.setdefault(token, len(vocab)) for token in text.lower().split())
+            offsets.append(len(tokens))
+        return cls(vocab, tokens, offsets, rows)
+
+    def _count_matrix(self):
+        from scipy import sparse
+
+        doc_ids = np.repeat(np.arange(len(self.rows)), np.diff(self.offsets))
+        counts = sparse.coo_matrix(
+            (np.ones(len(self.tokens), dtype=np.int32), (doc_ids, self.tokens)),
+            shape=(len(self.rows), len(self.vocab))
+        ).tocsr()
+        counts.sum_duplicates()
+        return counts
+
+    def project(self, token_fn):
+        """
+        Derives a new matrix by mapping every vocabulary term to a list of output tokens
+        (empty to drop the term). token_fn is called once per term, not per occurrence.
+        """
+        new_vocab = {}
+        out_ids = []
+        out_len = np.zeros(len(self.vocab), dtype=np.int64)
+        for i, term in enumerate(self.vocab):
+            mapped = token_fn(term)
+            out_len[i] = len(mapped)
+            out_ids.extend(new_vocab.setdefault(token, len(new_vocab)) for token in mapped)
+        out_ids = np.asarray(out_ids, dtype=np.int32)
+        out_start = np.cumsum(out_len) - out_len
+
+        # Replace every token of the stream by its (possibly empty) list of outputs
+        lengths = out_len[self.tokens]
+        total = int(lengths.sum())
+        first_output = np.repeat(out_start[self.tokens], lengths)
+        position_in_output = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        tokens = out_ids[first_output + position_in_output]
+        offsets = np.concatenate([[0], np.cumsum(lengths)])[self.offsets]
+        return DocumentTermMatrix(new_vocab, tokens, offsets, self.rows)
+
+    def select(self, mask):
+        """Keeps only the rows where mask is True."""
+        mask = np.asarray(mask, dtype=bool)
+        keep = np.repeat(mask, np.diff(self.offsets))
+        offsets = np.concatenate([[0], np.cumsum(np.diff(self.offsets)[mask])])
+        return DocumentTermMatrix(self.vocab, self.tokens[keep], offsets, self.rows[mask], self.matrix[mask])
+
+    def term_counts(self, mask=None):
+        """
+        Returns a Counter of term frequencies over the rows selected by mask (all rows when None).
+        Terms are inserted in order of first occurrence, like a Counter built over the joined texts.
+        """
+        dtm = self if mask is None else self.select(mask)
+        totals = np.asarray(dtm.matrix.sum(axis=0)).ravel()
+        present, first_seen = np.unique(dtm.tokens, return_index=True)
+        ordered = present[np.argsort(first_seen, kind='stable')]
+        return Counter({dtm.vocab[i]: int(totals[i]) for i in ordered})
+
+    def group_sums(self, column):
+        """Sums the rows per value of a row-index column. Returns (labels, CSR matrix of groups x terms)."""
+        from scipy import sparse
+
+        codes, labels = pd.factorize(self.rows[column], sort=True)
+        valid = codes >= 0
+        indicator = sparse.csr_matrix(
+            (np.ones(valid.sum(), dtype=np.int32), (codes[valid], np.flatnonzero(valid))),
+            shape=(len(labels), len(self.rows))
+        )
+        return list(labels), indicator @ self.matrix
+
+    def sequences(self):
+        """Yields the token list of every row, in row order."""
+        vocab = np.asarray(self.vocab, dtype=object)
+        for start, end in zip(self.offsets[:-1], self.offsets[1:]):
+            yield vocab[self.tokens[start:end]].tolist()
+
+    def to_gensim(self):
+        """
+        Returns (corpora.Dictionary, bag-of-words corpus) for gensim. Token ids are assigned
+        exactly like corpora.Dictionary(texts) would, so models trained on it are unchanged.
+        """
+        from gensim import corpora
+        from gensim.matutils import Sparse2Corpus
+
+        by_term = self.matrix.tocsc()
+        by_term.sort_indices()
+        present = np.flatnonzero(np.diff(by_term.indptr) > 0)
+        first_doc = by_term.indices[by_term.indptr[present]]
+        # gensim numbers the new words of each document in sorted order
+        order = sorted(range(len(present)), key=lambda k: (first_doc[k], self.vocab[present[k]]))
+        term_ids = present[order]
+
+        dictionary = corpora.Dictionary()
+        dictionary.token2id = {self.vocab[i]: new_id for new_id, i in enumerate(term_ids)}
+        doc_freqs = np.diff(by_term.indptr)[term_ids]
+        collection_freqs = np.asarray(self.matrix.sum(axis=0)).ravel()[term_ids]
+        dictionary.dfs = {new_id: int(freq) for new_id, freq in enumerate(doc_freqs)}
+        dictionary.cfs = {new_id: int(freq) for new_id, freq in enumerate(collection_freqs)}
+        dictionary.num_docs = len(self.rows)
+        dictionary.num_pos = len(self.tokens)
+        dictionary.num_nnz = int(self.matrix.nnz)
+
+        bow = self.matrix[:, term_ids].tocsr()
+        bow.sort_indices()
+        return dictionary, Sparse2Corpus(bow, documents_columns=False)
+
+    def save(self, path=DTM_DIR):
+        from scipy import sparse
+
+        os.makedirs(path, exist_ok=True)
+        sparse.save_npz(os.path.join(path, 'matrix.npz'), self.matrix)
+        np.save(os.path.join(path, 'tokens.npy'), self.tokens)
+        np.save(os.path.join(path, 'offsets.npy'), self.offsets)
+        with open(os.path.join(path, 'vocab.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.vocab, f)
+        self.rows.to_pickle(os.path.join(path, 'rows.pkl'))
+
+    @classmethod
+    def load(cls, path=DTM_DIR):
+        from scipy import sparse
+
+        with open(os.path.join(path, 'vocab.json'), 'r', encoding='utf-8') as f:
+            vocab = json.load(f)
+        return cls(
+            vocab,
+            np.load(os.path.join(path, 'tokens.npy')),
+            np.load(os.path.join(path, 'offsets.npy')),
+            pd.read_pickle(os.path.join(path, 'rows.pkl')),
+            sparse.load_npz(os.path.join(path, 'matrix.npz')),
+        )
+
+def _fingerprint(table):
+    path = source_path(table)
+    stat = os.stat(path)
+    return {'source': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def load_dtm(table=ANALYZED, path=DTM_DIR, rebuild=False):
+    """
+    Loads the persisted matrix, rebuilding it first when the source table changed.
+    Raises FileNotFoundError when the table does not exist.
+    """
+    fingerprint = _fingerprint(table)
+    meta_path = os.path.join(path, 'meta.json')
+    if not rebuild and os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == fingerprint:
+                with timer('dtm.load'):
+                    return DocumentTermMatrix.load(path)
+
+    with timer('dtm.build'):
+        df = load_speeches(table, columns=ROW_COLUMNS + ['processed_text'])
+        rows = df[ROW_COLUMNS].copy()
+        rows['has_text'] = df['processed_text'].map(lambda text: isinstance(text, str)).astype(bool)
+        dtm = DocumentTermMatrix.from_texts(df['processed_text'], rows)
+        dtm.save(path)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(fingerprint, f)
+    return dtm
+
+if __name__ == '__main__':
+    dtm = load_dtm(rebuild=True)
+    print(f"Built a {dtm.matrix.shape[0]} x {dtm.matrix.shape[1]} document-term matrix "
+          f"({len(dtm.tokens)} tokens) in '{DTM_DIR}'.")
@@ -0,0 +1,252 @@
+"""
+Timers, counters and peak memory for profiling the pipeline stages.
+
+Hot paths are marked with named timers and counters:
+
+    with timer('sentiment.vader'):
+        scores = analyzer.polarity_scores(text)
+    count('docs')
+
+Tracing is off by default. timer() then returns a shared no-op and count() returns at
+once, so a hook costs one function call. Scripts turn tracing on with --trace trace.json,
+and --profile stage.prof adds a cProfile dump. To trace every script at once, set the
+PIPELINE_TRACE (and PIPELINE_PROFILE) environment variables. `run_pipeline.py --trace DIR`
+writes one trace per stage.
+
+The trace is a Chrome trace-event JSON file. chrome://tracing, Perfetto and speedscope show
+it as a flame chart. Its "summary" holds, for every timer, the calls, total time, self time
+(minus the nested timers) and longest call, as well as the counters, the wall time and the
+peak RSS. Worker processes forked by the stage's process pools record into their own files,
+which are folded into the stage's trace when it is written. The cProfile dump is a pstats
+file (snakeviz, flameprof or gprof2dot draw it as a flame graph).
+"""
+import atexit
+import cProfile
+import glob
+import json
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+import time
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# --- START: CONFIGURATION ---
+TRACE_ENV = 'PIPELINE_TRACE'
+PROFILE_ENV = 'PIPELINE_PROFILE'
+# Individual timer calls kept for the flame chart; past this only the summary is updated
+MAX_EVENTS = 100000
+# --- END: CONFIGURATION ---
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_kb //= 1024
+    return peak_kb / 1024
+
+class Trace:
+    """Timers, counters and trace events recorded by one process."""
+
+    def __init__(self, path, stage, worker=False):
+        self.path = path
+        self.stage = stage
+        self.worker = worker
+        self.pid = os.getpid()
+        self.started_at = time.time()
+        self.started_ns = time.perf_counter_ns()
+        # name -> [calls, total ns, self ns, longest ns]
+        self.timers = defaultdict(lambda: [0, 0, 0, 0])
+        self.counters = defaultdict(int)
+        self.events = []
+        self.dropped_events = 0
+        # Time spent in the nested timers of every open timer
+        self.stack = []
+
+    def record(self, name, start_ns, elapsed_ns, nested_ns):
+        stats = self.timers[name]
+        stats[0] += 1
+        stats[1] += elapsed_ns
+        stats[2] += elapsed_ns - nested_ns
+        stats[3] = max(stats[3], elapsed_ns)
+        if len(self.events) < MAX_EVENTS:
+            self.events.append({'name': name, 'ph': 'X', 'pid': self.pid, 'tid': self.pid,
+                                'ts': start_ns / 1000, 'dur': elapsed_ns / 1000})
+        else:
+            self.dropped_events += 1
+
+    def summary(self):
+        return {
+            'stage': self.stage,
+            'pid': self.pid,
+            'started_at': self.started_at,
+            'wall_seconds': (time.perf_counter_ns() - self.started_ns) / 1e9,
+            'peak_rss_mb': peak_rss_mb(),
+            'timers': {name: {'calls': calls, 'seconds': total / 1e9, 'self_seconds': own / 1e9,
+                              'max_seconds': longest / 1e9}
+                       for name, (calls, total, own, longest) in sorted(self.timers.items())},
+            'counters': dict(sorted(self.counters.items())),
+            'dropped_events': self.dropped_events,
+        }
+
+    def worker_path(self, pid):
+        return f"{self.path}.worker-{pid}.json"
+
+    def merge_workers(self, summary, events):
+        """Folds the trace files left by worker processes into this trace."""
+        summary['workers'] = []
+        for path in sorted(glob.glob(self.worker_path('*'))):
+            with open(path, 'r', encoding='utf-8') as f:
+                worker = json.load(f)
+            os.remove(path)
+            for name, stats in worker['summary']['timers'].items():
+                merged = summary['timers'].setdefault(name, {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0,
+                                                             'max_seconds': 0.0})
+                merged['calls'] += stats['calls']
+                merged['seconds'] += stats['seconds']
+                merged['self_seconds'] += stats['self_seconds']
+                merged['max_seconds'] = max(merged['max_seconds'], stats['max_seconds'])
+            for name, value in worker['summary']['counters'].items():
+                summary['counters'][name] = summary['counters'].get(name, 0) + value
+            summary['dropped_events'] += worker['summary']['dropped_events']
+            summary['workers'].append({key: worker['summary'][key] for key in ('pid', 'wall_seconds', 'peak_rss_mb')})
+            events.extend(worker['traceEvents'])
+        summary['timers'] = dict(sorted(summary['timers'].items()))
+
+    def write(self):
+        summary = self.summary()
+        events = list(self.events)
+        path = self.worker_path(self.pid) if self.worker else self.path
+        if not self.worker:
+            self.merge_workers(summary, events)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'summary': summary}, f)
+        os.replace(tmp_path, path)
+        return path
+
+class _Timer:
+    __slots__ = ('trace', 'name', 'start')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.trace.stack.append(0)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter_ns() - self.start
+        nested = self.trace.stack.pop()
+        if self.trace.stack:
+            self.trace.stack[-1] += elapsed
+        self.trace.record(self.name, self.start, elapsed, nested)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+# The trace of this process, None while tracing is off
+_trace = None
+_profiler = None
+_profile_path = None
+
+def tracing():
+    """True while a trace is recorded; guards counters that are costly to compute."""
+    return _trace is not None
+
+def timer(name):
+    """Context manager timing the block under `name` (a no-op while tracing is off)."""
+    if _trace is None:
+        return _NULL_TIMER
+    return _Timer(_trace, name)
+
+def count(name, value=1):
+    if _trace is not None:
+        _trace.counters[name] += value
+
+def timed_iter(iterable, name):
+    """Yields from iterable, timing every step under `name` (e.g. the batches of nlp.pipe)."""
+    if _trace is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        with timer(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+def enable(trace_path=None, stage=None, profile_path=None):
+    """Starts recording a trace to trace_path and/or a cProfile dump to profile_path."""
+    global _trace, _profiler, _profile_path
+    stage = stage or os.path.basename(sys.argv[0])
+    if trace_path:
+        _trace = Trace(trace_path, stage)
+    if profile_path:
+        _profile_path = profile_path
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+def finish(quiet=False):
+    """Writes the trace and the cProfile dump, then stops recording. Safe to call twice."""
+    global _trace, _profiler, _profile_path
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_profile_path)
+        if not quiet:
+            print(f"cProfile dump saved to '{_profile_path}'.")
+        _profiler = None
+    if _trace is not None and not _trace.worker:
+        path = _trace.write()
+        if not quiet:
+            print(f"Trace saved to '{path}'.")
+    _trace = None
+
+def add_arguments(parser):
+    parser.add_argument('--trace', metavar='PATH',
+                        help="record stage timers, counters and peak memory to a JSON trace file")
+    parser.add_argument('--profile', metavar='PATH', help="also write a cProfile dump of the whole run")
+
+def setup(args, stage=None):
+    """Starts tracing when the script was given --trace or --profile."""
+    if args.trace or args.profile:
+        enable(args.trace, stage=stage, profile_path=args.profile)
+
+class _ForkHook:
+    """Anchor for multiprocessing's after-fork registry, which only holds weak references."""
+
+def _after_fork_in_child(hook):
+    """A forked worker records into its own file, written when the worker exits."""
+    global _trace, _profiler
+    _profiler = None
+    if _trace is not None:
+        parent = _trace
+        _trace = Trace(parent.path, parent.stage, worker=True)
+        multiprocessing.util.Finalize(None, _trace.write, exitpriority=100)
+
+_FORK_HOOK = _ForkHook()
+atexit.register(finish)
+multiprocessing.util.register_after_fork(_FORK_HOOK, _after_fork_in_child)
+
+# Scripts without a --trace flag, and every stage run by a traced parent, follow the environment
+if os.environ.get(TRACE_ENV) or os.environ.get(PROFILE_ENV):
+    if multiprocessing.parent_process() is None:
+        enable(os.environ.get(TRACE_ENV), profile_path=os.environ.get(PROFILE_ENV))
@@ -0,0 +1,130 @@
+"""
+Measures how long every command-line script takes to start: each one runs with --help in a
+fresh interpreter under `python -X importtime`, so nothing but its imports and argument
+parsing is timed.
+
+    python misc/benchmark_imports.py
+    python misc/benchmark_imports.py --repeat 5 --budget 0.5
+
+For every script the wall time (best of --repeat runs), the time spent importing and the
+heaviest top-level imports are reported. Heavy libraries (spaCy, gensim, pyLDAvis,
+matplotlib, NLTK, textstat) are meant to be imported where they are used, so one showing up
+here is a regression. The flat scripts 4_visualize_avg_sentiment_by_party.py and
+5_advance_sentiment_analysis.py have no --help and are not measured. Results are written to
+import_times.json, and the script exits with status 1 when a script starts slower than --budget.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- START: CONFIGURATION ---
+SCRIPTS = [
+    '1_download_mc_speeches.py',
+    '2_preprocessing_speeches.py',
+    '3_sentiment_analysis.py',
+    '4_visualize_data_by_president.py',
+    '6_topic_modeling.py',
+    '6_topic_modeling_by_president.py',
+    '7_rethorical_analysis.py',
+    'run_pipeline.py',
+    'query_service.py',
+    'sentiment_cube.py',
+    'speech_cache.py',
+    'speech_dedup.py',
+]
+RESULTS_PATH = 'import_times.json'
+# Seconds a script may take to print its --help
+BUDGET = 1.0
+# Heaviest top-level imports listed per script
+TOP_IMPORTS = 3
+# --- END: CONFIGURATION ---
+
+# "import time: self [us] | cumulative | imported package", nested imports indented
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+def parse_importtime(stderr):
+    """Returns [(module, cumulative microseconds)] for the top-level imports of an -X importtime log."""
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and not match.group(3):
+            imports.append((match.group(4), int(match.group(2))))
+    return imports
+
+def measure(script, repeat):
+    """Runs `script --help` repeat times and keeps the fastest run."""
+    best = None
+    for _ in range(repeat):
+        command = [sys.executable, '-X', 'importtime', os.path.join(REPO, script), '--help']
+        start = time.perf_counter()
+        process = subprocess.run(command, capture_output=True, text=True, cwd=REPO)
+        elapsed = time.perf_counter() - start
+        if process.returncode != 0:
+            errors = [line for line in process.stderr.splitlines() if not line.startswith('import time:')]
+            return {'error': (errors or ['failed'])[-1]}
+        if best is None or elapsed < best['seconds']:
+            imports = parse_importtime(process.stderr)
+            best = {
+                'seconds': elapsed,
+                'import_seconds': sum(us for _, us in imports) / 1e6,
+                'top_imports': [{'module': name, 'seconds': us / 1e6}
+                                 for name, us in sorted(imports, key=lambda item: -item[1])[:TOP_IMPORTS]],
+            }
+    return best
+
+def measure_interpreter(repeat):
+    """Wall time of an interpreter that imports nothing, the floor of every script."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], capture_output=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Startup time of every script's --help, from -X importtime.")
+    parser.add_argument('--scripts', nargs='+', default=SCRIPTS, metavar='SCRIPT',
+                        help="scripts to measure, relative to the repository (default: every script with a CLI)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per script, the fastest is kept (default: 3)")
+    parser.add_argument('--budget', type=float, default=BUDGET,
+                        help=f"seconds a script may take to start (default: {BUDGET})")
+    parser.add_argument('--output', default=RESULTS_PATH)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    interpreter = measure_interpreter(args.repeat)
+    print(f"Bare interpreter: {interpreter:.3f}s\n")
+    print(f"{'script':36} {'wall s':>7} {'import s':>8}  heaviest top-level imports")
+
+    results = {'interpreter_seconds': interpreter, 'budget': args.budget, 'scripts': {}}
+    over_budget = []
+    for script in args.scripts:
+        result = measure(script, args.repeat)
+        results['scripts'][script] = result
+        if 'error' in result:
+            over_budget.append(script)
+            print(f"{script:36} failed: {result['error']}")
+            continue
+        heaviest = ', '.join(f"{entry['module']} {entry['seconds']:.2f}s" for entry in result['top_imports'])
+        flag = "  OVER BUDGET" if result['seconds'] > args.budget else ""
+        if flag:
+            over_budget.append(script)
+        print(f"{script:36} {result['seconds']:7.3f} {result['import_seconds']:8.3f}  {heaviest}{flag}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to '{args.output}'.")
+    if over_budget:
+        print(f"{len(over_budget)} scripts failed or took longer than {args.budget:g}s to start.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
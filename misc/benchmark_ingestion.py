@@ -0,0 +1,116 @@
+"""
+Measures the peak RSS of ingesting an enlarged copy of the speeches, comparing the old
+json.load of the whole file with the streaming reader and chunked writer used by
+2_preprocessing_speeches.py.
+
+The corpus is enlarged synthetically by repeating the speeches of the input file (the
+bundled sample by default) under new doc_names, and written to a temporary directory:
+
+    python misc/benchmark_ingestion.py --copies 50 200 800
+
+By default the text engine is replaced by lowercasing, so the benchmark runs without the
+spaCy model and measures reading, holding and writing the corpus. Pass --preprocess to run
+the real 2_preprocessing_speeches.py (streaming only; it needs en_core_web_sm and takes much
+longer). Each measurement runs in a fresh interpreter; peak RSS needs the Unix `resource` module.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PATH = os.path.join(REPO, 'misc', 'speeches-sample.json')
+
+MEASURE = r"""
+import json, os, sys, time
+sys.path.insert(0, {repo!r})
+os.chdir({workdir!r})
+try:
+    import resource
+except ImportError:
+    resource = None
+start = time.perf_counter()
+if {mode!r} == 'load':
+    import pandas as pd
+    from speech_store import save_speeches
+    with open({corpus!r}, 'r', encoding='utf-8') as f:
+        speeches = json.load(f)
+    rows = [{{'president': s.get('president'), 'date': s.get('date'), 'doc_name': s.get('doc_name'),
+              'title': s.get('title'), 'processed_text': s.get('transcript', '').lower()}} for s in speeches]
+    save_speeches(pd.DataFrame(rows), 'benchmark_load')
+elif {mode!r} == 'stream':
+    import pandas as pd
+    from speech_store import SpeechWriter
+    from speech_stream import chunked, iter_speeches
+    columns = ['president', 'date', 'doc_name', 'title', 'processed_text']
+    with SpeechWriter('benchmark_stream', columns) as writer:
+        for chunk in chunked(iter_speeches({corpus!r}), 500):
+            writer.write(pd.DataFrame([{{'president': s.get('president'), 'date': s.get('date'),
+                                        'doc_name': s.get('doc_name'), 'title': s.get('title'),
+                                        'processed_text': s.get('transcript', '').lower()}} for s in chunk],
+                                      columns=columns))
+else:
+    import runpy
+    sys.argv = ['2_preprocessing_speeches.py', '--input', {corpus!r}, '--no-cache']
+    runpy.run_path(os.path.join({repo!r}, '2_preprocessing_speeches.py'), run_name='__main__')
+elapsed = time.perf_counter() - start
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+if peak_kb is not None and sys.platform == 'darwin':
+    peak_kb //= 1024
+print(json.dumps({{'seconds': elapsed, 'peak_rss_mb': peak_kb / 1024 if peak_kb else None}}))
+"""
+
+def enlarge(source, copies, path):
+    """Writes `copies` copies of every speech of source as a JSON array, one speech at a time."""
+    with open(source, 'r', encoding='utf-8') as f:
+        speeches = json.load(f)
+    count = 0
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write('[')
+        for copy in range(copies):
+            for speech in speeches:
+                speech = dict(speech, doc_name=f"{speech.get('doc_name')}-copy-{copy}")
+                out.write((',' if count else '') + json.dumps(speech))
+                count += 1
+        out.write(']')
+    return count
+
+def measure(mode, corpus, workdir):
+    code = MEASURE.format(repo=REPO, workdir=workdir, mode=mode, corpus=corpus)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def format_mb(value):
+    return f"{value:8.1f}" if value is not None else "     n/a"
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of loading versus streaming an enlarged corpus.")
+    parser.add_argument('--source', default=SAMPLE_PATH, help="speeches to repeat (default: the bundled sample)")
+    parser.add_argument('--copies', type=int, nargs='+', default=[50, 200, 800],
+                        help="enlargement factors to measure (default: 50 200 800)")
+    parser.add_argument('--preprocess', action='store_true',
+                        help="also run the real 2_preprocessing_speeches.py (needs the spaCy model)")
+    args = parser.parse_args()
+
+    modes = ['load', 'stream'] + (['preprocess'] if args.preprocess else [])
+    print(f"{'copies':>7} {'speeches':>9} {'file MB':>8} {'mode':11} {'seconds':>8} {'peak MB':>8}")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, 'speeches.json')
+        for copies in args.copies:
+            speeches = enlarge(args.source, copies, corpus)
+            size_mb = os.path.getsize(corpus) / 2 ** 20
+            for mode in modes:
+                result = measure(mode, corpus, workdir)
+                results.append({'copies': copies, 'speeches': speeches, 'file_mb': size_mb, 'mode': mode, **result})
+                print(f"{copies:7d} {speeches:9d} {size_mb:8.1f} {mode:11} {result['seconds']:8.2f} "
+                      f"{format_mb(result['peak_rss_mb'])}")
+
+    with open('benchmark_ingestion.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    print("\nResults saved to 'benchmark_ingestion.json'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures how long each stage takes to load its input and the peak RSS of doing so,
+comparing the old full pd.read_csv with speech_store.load_speeches, the column-pruned
+read every stage uses. The file load_speeches picked is reported, so a stage that falls
+back to the CSV shows up.
+
+Run it from the directory holding analyzed_speeches.csv/.parquet:
+
+    python misc/benchmark_loading.py
+
+Each measurement runs in a fresh interpreter so the peak RSS of one load does not
+leak into the next. Peak RSS needs the Unix `resource` module.
+"""
+import json
+import os
+import subprocess
+import sys
+
+# Columns each downstream stage reads from the analyzed table
+STAGE_COLUMNS = {
+    '4_visualize_avg_sentiment_by_party': ['president', 'sentiment_score'],
+    '4_visualize_data_by_president': ['president', 'date', 'sentiment_score'],
+    '5_advance_sentiment_analysis': ['processed_text', 'sentiment_score'],
+    '6_topic_modeling': ['processed_text'],
+    '6_topic_modeling_by_president': ['president', 'processed_text'],
+    '7_rethorical_analysis': ['president', 'processed_text'],
+}
+
+MEASURE = r"""
+import json, sys, time
+sys.path.insert(0, {repo!r})
+import pandas as pd
+import speech_store
+baseline = None
+try:
+    import resource
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+except ImportError:
+    resource = None
+source = speech_store.csv_path(speech_store.ANALYZED)
+start = time.perf_counter()
+if {mode!r} == 'csv':
+    df = pd.read_csv(source)
+else:
+    source = speech_store.source_path(speech_store.ANALYZED)
+    df = speech_store.load_speeches(speech_store.ANALYZED, columns={columns!r})
+elapsed = time.perf_counter() - start
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+if peak_kb is not None and sys.platform == 'darwin':
+    peak_kb //= 1024
+print(json.dumps({{'seconds': elapsed, 'source': source, 'peak_rss_mb': peak_kb / 1024 if peak_kb else None,
+                   'load_rss_mb': (peak_kb - baseline) / 1024 if peak_kb else None}}))
+"""
+
+def measure(mode, columns):
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = MEASURE.format(repo=repo, mode=mode, columns=columns)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def format_mb(value):
+    return f"{value:8.1f}" if value is not None else "     n/a"
+
+def main():
+    if not os.path.exists('analyzed_speeches.parquet') or not os.path.exists('analyzed_speeches.csv'):
+        print("Error: run 3_sentiment_analysis.py first so both analyzed_speeches.csv and .parquet exist.")
+        sys.exit(1)
+
+    print(f"{'stage':38} {'mode':13} {'load s':>8} {'peak MB':>8} {'load MB':>8}  file read")
+    results = {}
+    for stage, columns in STAGE_COLUMNS.items():
+        results[stage] = {}
+        for mode in ('csv', 'load_speeches'):
+            result = measure(mode, columns)
+            results[stage][mode] = result
+            print(f"{stage:38} {mode:13} {result['seconds']:8.3f} "
+                  f"{format_mb(result['peak_rss_mb'])} {format_mb(result['load_rss_mb'])}  {result['source']}")
+
+    with open('benchmark_loading.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    print("\nResults saved to 'benchmark_loading.json'.")
+
+if __name__ == '__main__':
+    main()
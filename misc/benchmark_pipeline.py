@@ -0,0 +1,229 @@
+"""
+Times and memory-profiles every pipeline stage, from preprocessing to the rhetorical
+analysis, on synthetic corpora of growing size, and flags regressions against a baseline.
+
+For every scale a corpus is generated with misc/generate_synthetic_corpus.py (1x is the
+size of the real corpus) in its own directory under --workdir, and the stages of
+run_pipeline.py run there one after the other, each in a fresh interpreter, without the
+speech cache. The state a stage would reuse from an earlier run (the sweep results and
+models, the coherence index, the sentiment cube, the plot fingerprints) is deleted before
+it is measured, so every run is cold even though the corpus is kept between runs. Nothing
+is downloaded; the spaCy model and the NLTK data must be installed.
+
+    python misc/benchmark_pipeline.py --scales 1 10 100
+    python misc/benchmark_pipeline.py --scales 1 --save-baseline       # record a baseline
+    python misc/benchmark_pipeline.py --scales 1 --stages sentiment rhetoric
+
+Results are written to benchmark_results.json. When benchmark_baseline.json exists (or
+--baseline points to another run) every stage is compared with it, and the script exits
+with status 1 when one got slower or bigger than --tolerance allows. Peak RSS is the stage
+process itself; its worker pools are reported separately as children.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.join(REPO, 'misc'))
+
+from generate_synthetic_corpus import BASE_SPEECHES, generate  # noqa: E402
+from run_pipeline import STAGES  # noqa: E402
+
+# --- START: CONFIGURATION ---
+RESULTS_PATH = 'benchmark_results.json'
+BASELINE_PATH = 'benchmark_baseline.json'
+WORKDIR = 'benchmark_runs'
+# Relative slowdown or growth tolerated before a stage is flagged
+TOLERANCE = 0.25
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.5
+MIN_MB = 20
+# Extra arguments per stage, so every run measures the full computation
+BENCHMARK_ARGS = {
+    'preprocess': ['--no-cache'],
+    'sentiment': ['--no-cache'],
+    'president_plots': ['--force'],
+    'topics': ['--restart'],
+    'rhetoric': ['--no-cache'],
+}
+# Files and directories a stage reuses from its last run, deleted from the workdir before it is measured
+COLD_START = {
+    'sentiment': ['sentiment_cube.sqlite'],
+    'president_plots': [os.path.join('individual_sentiment_plots', 'fingerprints.json')],
+    'topics': ['coherence_index', 'lda_sweep', 'coherence_sweep.jsonl'],
+    'topics_by_president': ['coherence_index', 'lda_by_president'],
+}
+# --- END: CONFIGURATION ---
+
+BENCHMARKED_STAGES = [stage for stage in STAGES if stage['name'] != 'download']
+
+MEASURE = r"""
+import json, os, runpy, sys, time
+sys.path.insert(0, {repo!r})
+os.chdir({workdir!r})
+try:
+    import resource
+except ImportError:
+    resource = None
+sys.argv = [{script!r}] + {args!r}
+start = time.perf_counter()
+error = None
+try:
+    runpy.run_path(os.path.join({repo!r}, {script!r}), run_name='__main__')
+except SystemExit as e:
+    error = f"exited early ({{e.code}})"
+elapsed = time.perf_counter() - start
+def peak(who):
+    if resource is None:
+        return None
+    kb = resource.getrusage(who).ru_maxrss
+    return (kb // 1024 if sys.platform == 'darwin' else kb) / 1024
+print(json.dumps({{'seconds': elapsed, 'peak_rss_mb': peak(resource.RUSAGE_SELF) if resource else None,
+                   'children_peak_rss_mb': peak(resource.RUSAGE_CHILDREN) if resource else None,
+                   'error': error}}))
+"""
+
+def clear_stage_state(stage, workdir):
+    """Deletes what the stage would otherwise reuse from an earlier run in workdir."""
+    for name in COLD_START.get(stage['name'], []):
+        path = os.path.join(workdir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+def measure(stage, workdir):
+    """Runs one stage in a fresh interpreter inside workdir and returns its measurements."""
+    clear_stage_state(stage, workdir)
+    args = stage.get('args', []) + BENCHMARK_ARGS.get(stage['name'], [])
+    code = MEASURE.format(repo=REPO, workdir=workdir, script=stage['script'], args=args)
+    process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        return {'error': (process.stderr.strip().splitlines() or ['failed'])[-1]}
+    try:
+        return json.loads(lines[-1])
+    except ValueError:
+        return {'error': lines[-1]}
+
+def prepare_corpus(workdir, speeches, seed):
+    """Generates the scale's corpus, unless the one in workdir was made with the same settings."""
+    os.makedirs(workdir, exist_ok=True)
+    meta_path = os.path.join(workdir, 'corpus.json')
+    settings = {'speeches': speeches, 'seed': seed}
+    if os.path.exists(meta_path) and os.path.exists(os.path.join(workdir, 'speeches.json')):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('settings') == settings:
+            return meta['stats']
+    stats = generate(os.path.join(workdir, 'speeches.json'), speeches, seed=seed)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({'settings': settings, 'stats': stats}, f)
+    return stats
+
+def compare(results, baseline, tolerance):
+    """Returns one row per stage measured in both runs, with the regressions flagged."""
+    rows = []
+    for scale, stages in results['scales'].items():
+        for name, result in stages['stages'].items():
+            before = baseline.get('scales', {}).get(scale, {}).get('stages', {}).get(name)
+            if not before or result.get('error') or before.get('error'):
+                continue
+            row = {'scale': scale, 'stage': name, 'regressions': []}
+            for key, floor in (('seconds', MIN_SECONDS), ('peak_rss_mb', MIN_MB)):
+                if result.get(key) is None or before.get(key) is None:
+                    continue
+                row[key] = (before[key], result[key])
+                if result[key] > before[key] * (1 + tolerance) and result[key] - before[key] > floor:
+                    row['regressions'].append(key)
+            rows.append(row)
+    return rows
+
+def format_value(value, digits=1):
+    return f"{value:9.{digits}f}" if value is not None else "      n/a"
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on scaled synthetic corpora.")
+    parser.add_argument('--scales', type=float, nargs='+', default=[1, 10, 100],
+                        help="corpus sizes relative to the real corpus (default: 1 10 100)")
+    parser.add_argument('--base-speeches', type=int, default=BASE_SPEECHES,
+                        help=f"speeches at scale 1 (default: {BASE_SPEECHES})")
+    parser.add_argument('--stages', nargs='+', choices=[stage['name'] for stage in BENCHMARKED_STAGES],
+                        metavar='STAGE', help="benchmark only these stages (their inputs must be there)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default=WORKDIR)
+    parser.add_argument('--output', default=RESULTS_PATH)
+    parser.add_argument('--baseline', default=BASELINE_PATH, help=f"run to compare with (default: {BASELINE_PATH})")
+    parser.add_argument('--save-baseline', action='store_true', help="also store this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f"relative slowdown or growth flagged as a regression (default: {TOLERANCE})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    stages = [stage for stage in BENCHMARKED_STAGES if not args.stages or stage['name'] in args.stages]
+    results = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'scales': {},
+    }
+
+    print(f"{'scale':>6} {'stage':22} {'seconds':>9} {'peak MB':>9} {'pool MB':>9}")
+    for scale in args.scales:
+        speeches = max(1, int(round(scale * args.base_speeches)))
+        workdir = os.path.abspath(os.path.join(args.workdir, f"scale-{scale:g}"))
+        corpus = prepare_corpus(workdir, speeches, args.seed)
+        entry = {'corpus': corpus, 'stages': {}}
+        results['scales'][f"{scale:g}"] = entry
+        failed = set()
+        for stage in stages:
+            if failed & set(stage['after']):
+                entry['stages'][stage['name']] = {'error': 'skipped after a failed stage'}
+                failed.add(stage['name'])
+                print(f"{scale:6g} {stage['name']:22} skipped after a failed stage")
+                continue
+            result = measure(stage, workdir)
+            entry['stages'][stage['name']] = result
+            if result.get('error'):
+                failed.add(stage['name'])
+                print(f"{scale:6g} {stage['name']:22} failed: {result['error']}")
+            else:
+                print(f"{scale:6g} {stage['name']:22} {format_value(result['seconds'], 2)} "
+                      f"{format_value(result['peak_rss_mb'])} {format_value(result['children_peak_rss_mb'])}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to '{args.output}'.")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.tolerance)
+        print(f"\nCompared with '{args.baseline}' ({baseline.get('created', 'unknown date')}):")
+        for row in rows:
+            seconds = row.get('seconds', (None, None))
+            memory = row.get('peak_rss_mb', (None, None))
+            flag = f"  REGRESSION ({', '.join(row['regressions'])})" if row['regressions'] else ""
+            print(f"{row['scale']:>6} {row['stage']:22} {format_value(seconds[0], 2)} -> {format_value(seconds[1], 2)} s"
+                  f" {format_value(memory[0])} -> {format_value(memory[1])} MB{flag}")
+        regressions = [row for row in rows if row['regressions']]
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to '{args.baseline}'.")
+
+    if regressions:
+        print(f"\n{len(regressions)} stage(s) regressed beyond {args.tolerance:.0%}.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Compares the two scoring engines of 3_sentiment_analysis.py: vaderSentiment's
+polarity_scores, text by text, and the array-based VectorizedVader (vectorized_vader.py).
+
+Both engines score the same texts cut from the downloaded speeches, as whole transcripts,
+as sentences and as windows of words (the --segments modes of the sentiment script). For
+each the throughput of both engines in docs/sec and words/sec is reported, along with the
+difference of the vectorized scores from the reference ones:
+
+    python misc/benchmark_sentiment_engines.py
+    python misc/benchmark_sentiment_engines.py --input speeches.json --limit 200 --repeat 3
+
+Every difference comes from VADER's "but" rule (see vectorized_vader), so texts without
+"but" must score identically, and the run fails (exit status 1) when one does not. On the
+sample corpus (misc/speeches-sample.json) 578 of the 579 sentences and 432 of the 433
+windows score identically, the other two differ by 0.23 and 0.06 in compound. Whole
+transcripts almost all contain "but": their compound scores differ by up to 0.13 (4 of the
+5 within 0.01) and neg/neu/pos by up to 0.003. The share of texts within --tolerance of the
+reference compound score is reported. Results are written to sentiment_engines.json.
+"""
+import argparse
+import json
+import os
+import string
+import sys
+import time
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from segment_store import segment_text  # noqa: E402
+from speech_stream import iter_speeches  # noqa: E402
+from vectorized_vader import SCORE_KEYS, VectorizedVader  # noqa: E402
+
+# --- START: CONFIGURATION ---
+INPUT_PATH = os.path.join(REPO, 'misc', 'speeches-sample.json')
+RESULTS_PATH = 'sentiment_engines.json'
+TEXT_KEY = 'transcript'
+# Compound difference the share of texts within is reported
+TOLERANCE = 0.01
+# --- END: CONFIGURATION ---
+
+KINDS = ('speech', 'sentence', 'window')
+
+def load_texts(path, limit=None):
+    """The transcripts of the downloaded speeches, each kind of text cut from them."""
+    transcripts = []
+    for speech in iter_speeches(path):
+        if limit is not None and len(transcripts) >= limit:
+            break
+        text = speech.get(TEXT_KEY)
+        if isinstance(text, str) and text.strip():
+            transcripts.append(text)
+    return {
+        'speech': transcripts,
+        'sentence': [segment for text in transcripts for segment in segment_text(text, 'sentence')],
+        'window': [segment for text in transcripts for segment in segment_text(text, 'window')],
+    }
+
+def has_but(text):
+    """Whether VADER's "but" rule applies to the text."""
+    return any(token.strip(string.punctuation).lower() == 'but' for token in text.split())
+
+def best_time(function, repeat):
+    """Fastest of repeat calls, with the result of the last one."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def compare(texts, analyzer, engine, repeat, tolerance):
+    words = sum(len(text.split()) for text in texts)
+    vader_seconds, reference = best_time(
+        lambda: np.array([[analyzer.polarity_scores(text)[key] for key in SCORE_KEYS] for text in texts]), repeat)
+    vectorized_seconds, scores = best_time(lambda: engine.score_texts(texts), repeat)
+    errors = np.abs(scores - reference.reshape(scores.shape))
+    compound_errors = errors[:, SCORE_KEYS.index('compound')]
+    without_but = np.array([not has_but(text) for text in texts], dtype=bool)
+    return {
+        'docs': len(texts),
+        'words': words,
+        'vader_docs_per_sec': len(texts) / vader_seconds,
+        'vectorized_docs_per_sec': len(texts) / vectorized_seconds,
+        'vader_words_per_sec': words / vader_seconds,
+        'vectorized_words_per_sec': words / vectorized_seconds,
+        'speedup': vader_seconds / vectorized_seconds,
+        'identical_share': float(np.mean(errors.max(axis=1) == 0)) if len(texts) else 1.0,
+        'without_but': int(without_but.sum()),
+        'without_but_differing': int((errors[without_but].max(axis=1) > 0).sum()) if without_but.any() else 0,
+        'within_tolerance_share': float(np.mean(compound_errors <= tolerance)) if len(texts) else 1.0,
+        'compound_mean_error': float(compound_errors.mean()) if len(texts) else 0.0,
+        'compound_max_error': float(compound_errors.max()) if len(texts) else 0.0,
+        'ratio_max_error': float(errors[:, :3].max()) if len(texts) else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and agreement of the VADER and vectorized sentiment engines.")
+    parser.add_argument('--input', default=INPUT_PATH, help="downloaded speeches (default: the sample corpus)")
+    parser.add_argument('--limit', type=int, default=None, help="score only the first LIMIT speeches")
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS))
+    parser.add_argument('--repeat', type=int, default=1, help="runs per engine, the fastest is kept (default: 1)")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--output', default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+    try:
+        texts = load_texts(args.input, args.limit)
+    except FileNotFoundError:
+        print(f"Error: The file {args.input} was not found.")
+        sys.exit(1)
+    analyzer = SentimentIntensityAnalyzer()
+    engine = VectorizedVader()
+
+    print(f"{'kind':9} {'docs':>7} {'vader docs/s':>13} {'vector docs/s':>14} {'speedup':>8} "
+          f"{'identical':>9} {'within':>7} {'mean err':>9} {'max err':>8} {'no but':>7}")
+    results = {'input': args.input, 'tolerance': args.tolerance, 'kinds': {}}
+    failed = []
+    for kind in args.kinds:
+        result = compare(texts[kind], analyzer, engine, args.repeat, args.tolerance)
+        results['kinds'][kind] = result
+        if result['without_but_differing']:
+            failed.append(kind)
+        print(f"{kind:9} {result['docs']:7d} {result['vader_docs_per_sec']:13.1f} "
+              f"{result['vectorized_docs_per_sec']:14.1f} {result['speedup']:7.1f}x "
+              f"{result['identical_share']:9.1%} {result['within_tolerance_share']:7.1%} "
+              f"{result['compound_mean_error']:9.5f} {result['compound_max_error']:8.4f} "
+              f"{result['without_but'] - result['without_but_differing']:>3}/{result['without_but']:<3}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to '{args.output}'.")
+    if failed:
+        print(f"Some {', '.join(failed)} texts without \"but\" score differently with the two engines.")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Compares the --sketch mode of 7_rethorical_analysis.py with its exact mode.
+
+For every president it reports the relative error of the HyperLogLog type count, and
+for every n-gram size how many of the exact top-5 n-grams the Space-Saving summary
+also reports, the largest count error among the reported ones, the guaranteed bound,
+and how many counters each mode keeps. Run it from the directory holding the
+analyzed table (the sample corpus is enough):
+
+    python misc/benchmark_sketches.py --max-n 5 --ngram-error 0.001 --distinct-error 0.01
+
+The counters are only part of the memory: each mode also runs alone in a fresh interpreter,
+streaming the per-speech partials into the groups as the script does, and its peak RSS is
+reported, along with how far it rose above the loaded table. On synthetic tables of 300 and
+1200 speeches (--max-n 3) the exact mode rose by 269 and 484 MB, the sketch mode by 247 and
+304 MB: the summaries take a fixed ~200 MB, and what still grows is the per-word caches of
+the tokenizer and of textstat, which follow the vocabulary.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from speech_store import ANALYZED, load_speeches  # noqa: E402
+
+MEASURE = r"""
+import importlib.util, json, os, sys
+sys.path.insert(0, {repo!r})
+import resource
+from speech_store import ANALYZED, load_speeches
+def peak():
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (kb // 1024 if sys.platform == 'darwin' else kb) / 1024
+spec = importlib.util.spec_from_file_location('rhetorical_analysis', os.path.join({repo!r}, '7_rethorical_analysis.py'))
+rhetoric = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(rhetoric)
+df = load_speeches(ANALYZED, columns=['president', 'processed_text'])
+before = peak()
+sketch = rhetoric.sketch_config({ngram_error!r}, {distinct_error!r}) if {sketch!r} else None
+rhetoric.aggregate(rhetoric.iter_partials(df['processed_text'], sizes={sizes!r}),
+                   rhetoric.group_labels(df, 'president'), sizes={sizes!r}, sketch=sketch)
+print(json.dumps({{'peak_rss_mb': peak(), 'growth_mb': peak() - before}}))
+"""
+
+def load_rhetorical_analysis():
+    spec = importlib.util.spec_from_file_location('rhetorical_analysis', os.path.join(REPO, '7_rethorical_analysis.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def compare(exact, sketched, top_n):
+    """Error of one president's sketched partial against the exact one."""
+    exact_types = len(exact['types'])
+    result = {
+        'types': exact_types,
+        'types_estimate': len(sketched['types']),
+        'types_relative_error': abs(len(sketched['types']) - exact_types) / exact_types if exact_types else 0.0,
+        'ngrams': {},
+    }
+    for n, counts in exact['ngrams'].items():
+        summary = sketched['ngrams'][n]
+        exact_top = [gram for gram, _ in counts.most_common(top_n)]
+        reported = summary.most_common(top_n)
+        result['ngrams'][n] = {
+            'top_recall': len(set(exact_top) & {gram for gram, _ in reported}) / len(exact_top) if exact_top else 1.0,
+            'max_count_error': max((count - counts[gram] for gram, count in reported), default=0),
+            'error_bound': summary.max_error(),
+            'exact_counters': len(counts),
+            'sketch_counters': len(summary),
+        }
+    return result
+
+def measure_memory(sizes, ngram_error, distinct_error, sketch):
+    """Peak RSS of one mode, run alone in a fresh interpreter (None where resource is unavailable)."""
+    code = MEASURE.format(repo=REPO, sizes=sizes, ngram_error=ngram_error, distinct_error=distinct_error,
+                          sketch=sketch)
+    process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    lines = process.stdout.strip().splitlines()
+    if process.returncode != 0 or not lines:
+        return None
+    return json.loads(lines[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Error of the sketch mode of the rhetorical analysis against the exact mode.")
+    parser.add_argument('--max-n', type=int, default=5)
+    parser.add_argument('--ngram-error', type=float, default=None)
+    parser.add_argument('--distinct-error', type=float, default=None)
+    args = parser.parse_args()
+
+    rhetoric = load_rhetorical_analysis()
+    ngram_error = args.ngram_error if args.ngram_error is not None else rhetoric.NGRAM_ERROR
+    distinct_error = args.distinct_error if args.distinct_error is not None else rhetoric.DISTINCT_ERROR
+    sizes = tuple(range(2, args.max_n + 1))
+
+    # Measured first: a child process starts from the peak RSS of this one
+    memory = {mode: measure_memory(sizes, ngram_error, distinct_error, mode == 'sketch') for mode in ('exact', 'sketch')}
+
+    try:
+        df = load_speeches(ANALYZED, columns=['president', 'processed_text'])
+    except FileNotFoundError as e:
+        print(f"Error: The file {e} was not found. Run 3_sentiment_analysis.py first.")
+        sys.exit(1)
+
+    labels = rhetoric.group_labels(df, 'president')
+    exact = rhetoric.aggregate(rhetoric.iter_partials(df['processed_text'], sizes=sizes), labels, sizes=sizes)
+    sketched = rhetoric.aggregate(rhetoric.iter_partials(df['processed_text'], sizes=sizes), labels, sizes=sizes,
+                                  sketch=rhetoric.sketch_config(ngram_error, distinct_error))
+
+    results = {president: compare(exact[president], sketched[president], rhetoric.TOP_NGRAMS) for president in exact}
+    print(f"ngram error {ngram_error}, distinct error {distinct_error}")
+    print(f"{'president':24} {'types':>7} {'est.':>7} {'rel.err':>8}  " +
+          "  ".join(f"{n}-gram recall/err/bound" for n in sizes))
+    for president, result in results.items():
+        columns = "  ".join(f"{r['top_recall']:6.0%} {r['max_count_error']:5d} {r['error_bound']:7.1f}   "
+                            for r in result['ngrams'].values())
+        print(f"{president:24} {result['types']:7d} {result['types_estimate']:7d} "
+              f"{result['types_relative_error']:8.2%}  {columns}")
+
+    worst = max((result['types_relative_error'] for result in results.values()), default=0.0)
+    counters = sum(r['exact_counters'] for result in results.values() for r in result['ngrams'].values())
+    sketch_counters = sum(r['sketch_counters'] for result in results.values() for r in result['ngrams'].values())
+    print(f"\nWorst type-count error: {worst:.2%}. N-gram counters kept: {counters} exact, {sketch_counters} sketched.")
+
+    for mode, result in memory.items():
+        if result is None:
+            print(f"Peak RSS of the {mode} mode: n/a")
+        else:
+            print(f"Peak RSS of the {mode} mode: {result['peak_rss_mb']:.1f} MB "
+                  f"(+{result['growth_mb']:.1f} MB over the loaded table)")
+
+    with open('benchmark_sketches.json', 'w') as f:
+        json.dump({'ngram_error': ngram_error, 'distinct_error': distinct_error, 'memory': memory,
+                   'presidents': results}, f, indent=2)
+    print("Results saved to 'benchmark_sketches.json'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Generates a synthetic corpus in the format of speeches.json, scaled from the bundled sample.
+
+Speeches are assembled from the sentences of misc/speeches-sample.json, so sentence lengths,
+punctuation and local word order are those of real speeches. Speech lengths follow a
+log-normal distribution fitted to the sample. Since resampled sentences alone would never
+grow the vocabulary, a share of the words is replaced by synthetic words whose number grows
+with the corpus size as Heaps' law predicts (V = K * N^beta, with K fitted to the sample),
+reused with a skewed, Zipf-like frequency. Presidents and dates are spread over the real terms.
+
+    python misc/generate_synthetic_corpus.py --scale 10 --output speeches.json
+
+--scale is relative to the size of the real Miller Center corpus (--base-speeches). The
+output is fully determined by --seed, and nothing is downloaded.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import re
+import sys
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from presidents import PRESIDENTIAL_TERMS  # noqa: E402
+
+# --- START: CONFIGURATION ---
+SAMPLE_PATH = os.path.join(REPO, 'misc', 'speeches-sample.json')
+# Approximate number of speeches in the Miller Center corpus, i.e. --scale 1
+BASE_SPEECHES = 1000
+# Heaps' law exponent for English text
+HEAPS_BETA = 0.55
+# Spread of the log of speech lengths; the sample is too small to estimate it
+LENGTH_SIGMA = 0.8
+MIN_WORDS = 50
+# Share of lowercase words replaced by synthetic vocabulary
+SUBSTITUTION_RATE = 0.04
+# --- END: CONFIGURATION ---
+
+SENTENCE_PATTERN = re.compile(r'[^.!?]+[.!?]+|[^.!?]+$')
+SYLLABLES = ['ba', 'de', 'ri', 'mo', 'lu', 'ka', 'ne', 'si', 'to', 'va', 'pe', 'gor', 'lin', 'dar', 'mes', 'tun']
+LAST_YEAR = datetime.date.today().year
+
+def synthetic_word(index):
+    """A pronounceable word, distinct for every index."""
+    syllables = []
+    index += len(SYLLABLES)
+    while index:
+        index, digit = divmod(index, len(SYLLABLES))
+        syllables.append(SYLLABLES[digit])
+    return ''.join(reversed(syllables))
+
+class CorpusModel:
+    """Sentence pool, length distribution and vocabulary growth estimated from sample speeches."""
+
+    def __init__(self, speeches, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.sentences = []
+        lengths = []
+        vocabulary = set()
+        for speech in speeches:
+            words = speech.get('transcript', '').split()
+            lengths.append(len(words))
+            vocabulary.update(word.lower() for word in words)
+            self.sentences.extend(sentence.split() for sentence in SENTENCE_PATTERN.findall(speech.get('transcript', '')))
+        self.sentences = [sentence for sentence in self.sentences if sentence]
+        self.sentence_lengths = np.array([len(sentence) for sentence in self.sentences])
+        self.length_mu = float(np.mean(np.log(lengths)))
+        self.sample_vocabulary = len(vocabulary)
+        self.heaps_k = len(vocabulary) / sum(lengths) ** HEAPS_BETA
+        self.tokens = 0
+        self.used_synthetic = set()
+
+    def synthetic_vocabulary(self):
+        """Synthetic words available once self.tokens words were generated."""
+        return max(1, int(self.heaps_k * max(self.tokens, 1) ** HEAPS_BETA) - self.sample_vocabulary)
+
+    def transcript(self):
+        target = max(MIN_WORDS, int(self.rng.lognormal(self.length_mu, LENGTH_SIGMA)))
+        # Enough sentences on average, trimmed to the target length
+        count = max(1, math.ceil(target / self.sentence_lengths.mean() * 1.2))
+        picked = self.rng.integers(0, len(self.sentences), size=count)
+        words = [word for i in picked for word in self.sentences[i]][:target]
+
+        replace = np.flatnonzero(self.rng.random(len(words)) < SUBSTITUTION_RATE)
+        size = self.synthetic_vocabulary()
+        ranks = (size * self.rng.random(len(replace)) ** 3).astype(int)
+        for position, rank in zip(replace, ranks):
+            if words[position].isalpha() and words[position].islower():
+                words[position] = synthetic_word(int(rank))
+                self.used_synthetic.add(int(rank))
+        self.tokens += len(words)
+        return ' '.join(words)
+
+    def speech(self, number):
+        president, start, end = PRESIDENTIAL_TERMS[self.rng.integers(0, len(PRESIDENTIAL_TERMS))]
+        first = datetime.date(start, 1, 1)
+        last = datetime.date(end if end is not None else LAST_YEAR, 12, 31)
+        date = first + datetime.timedelta(days=int(self.rng.integers(0, (last - first).days + 1)))
+        slug = re.sub(r'[^a-z]+', '-', president.lower()).strip('-')
+        return {
+            'doc_name': f"synthetic-{number:07d}-{slug}",
+            'date': date.isoformat(),
+            'transcript': self.transcript(),
+            'president': president,
+            'title': f"Synthetic Speech {number}",
+        }
+
+def generate(path, speeches, sample_path=SAMPLE_PATH, seed=0):
+    """Writes `speeches` synthetic speeches to path as a JSON array, one speech at a time."""
+    with open(sample_path, 'r', encoding='utf-8') as f:
+        model = CorpusModel(json.load(f), seed=seed)
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write('[')
+        for number in range(speeches):
+            out.write((',' if number else '') + json.dumps(model.speech(number)))
+        out.write(']')
+    return {'speeches': speeches, 'words': model.tokens,
+            'vocabulary': model.sample_vocabulary + len(model.used_synthetic)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic speeches.json scaled from the sample.")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help=f"corpus size relative to the real corpus of {BASE_SPEECHES} speeches (default: 1)")
+    parser.add_argument('--base-speeches', type=int, default=BASE_SPEECHES)
+    parser.add_argument('--sample', default=SAMPLE_PATH, help="speeches to learn from (default: the bundled sample)")
+    parser.add_argument('--output', default='speeches.json')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    speeches = max(1, int(round(args.scale * args.base_speeches)))
+    stats = generate(args.output, speeches, sample_path=args.sample, seed=args.seed)
+    print(f"Wrote {stats['speeches']} speeches ({stats['words']} words, about "
+          f"{stats['vocabulary']} distinct words) to '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Load-tests query_service.py: concurrent clients send a mix of range, aggregate and keyword
+queries, and the latency percentiles are reported per query type and concurrency level.
+
+    python query_service.py &
+    python misc/load_test_queries.py --clients 1 4 16 --requests 500
+
+The presidents, their dates and the search terms are taken from the service itself, so the
+queries hit real data. Every client is a thread with its own keep-alive HTTP connection,
+and latency is measured from sending a request to reading the whole response. The client
+threads share one interpreter, so with many clients their own overhead shows up in the
+tail; run several copies of the script for more load. Results are saved to load_test_results.json.
+"""
+import argparse
+import http.client
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+import numpy as np
+
+# --- START: CONFIGURATION ---
+URL = 'http://127.0.0.1:8765'
+RESULTS_PATH = 'load_test_results.json'
+# Search terms drawn from the most widespread tokens of the corpus
+TERM_POOL = 300
+# --- END: CONFIGURATION ---
+
+QUERY_TYPES = ['range', 'aggregate', 'keyword']
+
+def get_json(connection, path):
+    connection.request('GET', path)
+    response = connection.getresponse()
+    body = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"GET {path} answered {response.status}: {body[:200]!r}")
+    return json.loads(body)
+
+def corpus_facts(host, port):
+    """Presidents with their first and last speech date, and a pool of search terms."""
+    connection = http.client.HTTPConnection(host, port)
+    presidents = [group for group in get_json(connection, '/sentiment?by=president')['groups'] if group['first_date']]
+    terms = [entry['term'] for entry in get_json(connection, f'/terms?limit={TERM_POOL}')['terms']]
+    connection.close()
+    if not presidents or not terms:
+        raise RuntimeError("the service has no dated speeches or no terms to query")
+    return presidents, terms
+
+def random_window(rng, first, last):
+    """A random (start, end) pair of ISO dates within [first, last]."""
+    first, last = np.datetime64(first), np.datetime64(last)
+    days = int((last - first) / np.timedelta64(1, 'D'))
+    start = first + np.timedelta64(rng.randint(0, days), 'D')
+    end = start + np.timedelta64(rng.randint(0, days - int((start - first) / np.timedelta64(1, 'D'))), 'D')
+    return str(start), str(end)
+
+def build_query(kind, rng, presidents, terms):
+    """A random query path of the given type."""
+    group = rng.choice(presidents)
+    if kind == 'range':
+        start, end = random_window(rng, group['first_date'], group['last_date'])
+        return '/speeches?' + urlencode({'president': group['president'], 'start': start, 'end': end, 'limit': 20})
+    if kind == 'aggregate':
+        start, end = random_window(rng, min(p['first_date'] for p in presidents), max(p['last_date'] for p in presidents))
+        return '/sentiment?' + urlencode({'start': start, 'end': end, 'by': rng.choice(['president', 'party', 'year'])})
+    params = {'q': ' '.join(rng.sample(terms, rng.randint(1, 2))), 'mode': rng.choice(['all', 'any']), 'limit': 10}
+    if rng.random() < 0.5:
+        params['president'] = group['president']
+    return '/search?' + urlencode(params)
+
+def run_client(host, port, requests, seed, presidents, terms):
+    """Sends `requests` queries over one connection. Returns [(type, seconds, ok)]."""
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection(host, port)
+    timings = []
+    for i in range(requests):
+        kind = QUERY_TYPES[i % len(QUERY_TYPES)]
+        path = build_query(kind, rng, presidents, terms)
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(host, port)
+            ok = False
+        timings.append((kind, time.perf_counter() - start, ok))
+    connection.close()
+    return timings
+
+def summarize(timings, elapsed):
+    """Latency percentiles (ms) per query type and overall."""
+    summary = {}
+    for kind in QUERY_TYPES + ['all']:
+        selected = [(seconds, ok) for name, seconds, ok in timings if kind in ('all', name)]
+        latencies = np.array([seconds for seconds, ok in selected if ok]) * 1000
+        summary[kind] = {
+            'requests': len(selected),
+            'errors': sum(1 for _, ok in selected if not ok),
+            'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'max_ms': float(latencies.max()) if len(latencies) else None,
+        }
+    summary['all']['requests_per_second'] = len(timings) / elapsed if elapsed > 0 else None
+    return summary
+
+def format_ms(value):
+    return f"{value:8.2f}" if value is not None else "     n/a"
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of query_service.py under concurrent clients.")
+    parser.add_argument('--url', default=URL, help=f"address of the running service (default: {URL})")
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16],
+                        help="concurrency levels to measure (default: 1 4 16)")
+    parser.add_argument('--requests', type=int, default=300, help="queries sent by every client (default: 300)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    try:
+        presidents, terms = corpus_facts(host, port)
+    except (OSError, RuntimeError) as e:
+        print(f"Error: could not query the service at {args.url} ({e}). Is query_service.py running?")
+        exit()
+
+    results = []
+    print(f"{'clients':>7} {'query':10} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for clients in args.clients:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            futures = [executor.submit(run_client, host, port, args.requests, args.seed * 1000 + client,
+                                       presidents, terms) for client in range(clients)]
+            timings = [timing for future in futures for timing in future.result()]
+        summary = summarize(timings, time.perf_counter() - start)
+        results.append({'clients': clients, 'requests_per_client': args.requests, 'queries': summary})
+        for kind, stats in summary.items():
+            print(f"{clients:7d} {kind:10} {stats['requests']:8d} {stats['errors']:6d} {format_ms(stats['p50_ms'])} "
+                  f"{format_ms(stats['p99_ms'])} {format_ms(stats['max_ms'])}")
+        print(f"{'':7} {summary['all']['requests_per_second']:.0f} requests/sec")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to '{args.output}'.")
+
+if __name__ == '__main__':
+    main()
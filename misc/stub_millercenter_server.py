@@ -0,0 +1,65 @@
+"""
+Local stand-in for api.millercenter.org/speeches, for trying out 1_download_mc_speeches.py offline.
+
+It serves the speeches of a JSON file with the same paging protocol as the real API:
+every POST returns {"Items": [...]} plus a {"LastEvaluatedKey": {"doc_name": ...}} while
+more pages remain, and the next page is requested with ?LastEvaluatedKey=<doc_name>.
+
+    python misc/stub_millercenter_server.py --port 8000 --page-size 2 --fail-every 3
+    python 1_download_mc_speeches.py --endpoint http://localhost:8000/speeches
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+def make_handler(speeches, page_size, fail_every):
+    doc_names = [speech['doc_name'] for speech in speeches]
+    state = {'requests': 0}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            state['requests'] += 1
+            if fail_every and state['requests'] % fail_every == 0:
+                self.send_error(503, "simulated outage")
+                return
+
+            query = parse_qs(urlparse(self.path).query)
+            last_key = query.get('LastEvaluatedKey', [None])[0]
+            start = doc_names.index(last_key) + 1 if last_key in doc_names else 0
+            page = speeches[start:start + page_size]
+
+            body = {'Items': page}
+            if start + page_size < len(speeches):
+                body['LastEvaluatedKey'] = {'doc_name': page[-1]['doc_name']}
+
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return StubHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a speeches JSON file with the Miller Center paging protocol.")
+    parser.add_argument('--speeches', default='misc/speeches-sample.json', help="JSON array of speeches to serve")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--page-size', type=int, default=2)
+    parser.add_argument('--fail-every', type=int, default=0,
+                        help="answer every Nth request with HTTP 503 to exercise the retries (0 disables)")
+    args = parser.parse_args()
+
+    with open(args.speeches, 'r', encoding='utf-8') as f:
+        speeches = json.load(f)
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), make_handler(speeches, args.page_size, args.fail_every))
+    print(f"Serving {len(speeches)} speeches on http://127.0.0.1:{args.port}/speeches (page size {args.page_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
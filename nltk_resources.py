@@ -0,0 +1,39 @@
+"""
+One-time checks for the NLTK data the scripts need.
+
+nltk.data.find only looks in the local data directories, so once a resource is installed
+the downloader (and its network round trip) is never touched again. Each resource is
+checked at most once per process:
+
+    ensure_nltk_data('stopwords', 'punkt_tab')
+"""
+# Package name -> path nltk.data.find looks up. word_tokenize needs punkt_tab since NLTK 3.9.
+RESOURCES = {
+    'stopwords': 'corpora/stopwords',
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab/english/',
+    'wordnet': 'corpora/wordnet',
+    'cmudict': 'corpora/cmudict',
+}
+
+_checked = set()
+
+def ensure_nltk_data(*packages):
+    """Downloads the NLTK packages that are not installed yet."""
+    import nltk
+
+    for package in packages:
+        if package in _checked:
+            continue
+        try:
+            nltk.data.find(RESOURCES[package])
+        except LookupError:
+            print(f"Downloading the NLTK '{package}' data...")
+            nltk.download(package, quiet=True)
+        _checked.add(package)
+
+def english_stopwords():
+    """NLTK's English stopwords as a frozenset, downloading them the first time."""
+    ensure_nltk_data('stopwords')
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
@@ -0,0 +1,119 @@
+"""
+Reference data about the presidents, shared by the analysis scripts.
+"""
+
+# This dictionary maps all presidents to their political parties
+PRESIDENT_TO_PARTY = {
+    'George Washington': 'Unaffiliated',
+    'John Adams': 'Federalist',
+    'Thomas Jefferson': 'Democratic-Republican',
+    'James Madison': 'Democratic-Republican',
+    'James Monroe': 'Democratic-Republican',
+    'John Quincy Adams': 'Democratic-Republican',
+    'Andrew Jackson': 'Democrat',
+    'Martin Van Buren': 'Democrat',
+    'William Harrison': 'Whig',
+    'John Tyler': 'Whig',
+    'James K. Polk': 'Democrat',
+    'Zachary Taylor': 'Whig',
+    'Millard Fillmore': 'Whig',
+    'Franklin Pierce': 'Democrat',
+    'James Buchanan': 'Democrat',
+    'Abraham Lincoln': 'Republican',
+    'Andrew Johnson': 'Democrat',
+    'Ulysses S. Grant': 'Republican',
+    'Rutherford B. Hayes': 'Republican',
+    'James A. Garfield': 'Republican',
+    'Chester A. Arthur': 'Republican',
+    'Grover Cleveland': 'Democrat',
+    'Benjamin Harrison': 'Republican',
+    'William McKinley': 'Republican',
+    'Theodore Roosevelt': 'Republican',
+    'William Taft': 'Republican',
+    'Woodrow Wilson': 'Democrat',
+    'Warren G. Harding': 'Republican',
+    'Calvin Coolidge': 'Republican',
+    'Herbert Hoover': 'Republican',
+    'Franklin D. Roosevelt': 'Democrat',
+    'Harry S. Truman': 'Democrat',
+    'Dwight D. Eisenhower': 'Republican',
+    'John F. Kennedy': 'Democrat',
+    'Lyndon B. Johnson': 'Democrat',
+    'Richard M. Nixon': 'Republican',
+    'Gerald Ford': 'Republican',
+    'Jimmy Carter': 'Democrat',
+    'Ronald Reagan': 'Republican',
+    'George H. W. Bush': 'Republican',
+    'Bill Clinton': 'Democrat',
+    'George W. Bush': 'Republican',
+    'Barack Obama': 'Democrat',
+    'Donald Trump': 'Republican',
+    'Joe Biden': 'Democrat'
+}
+
+# One record per continuous tenure: (president, first year, last year or None while in office).
+# Grover Cleveland served two non-consecutive terms, so he has two records.
+PRESIDENTIAL_TERMS = [
+    ('George Washington', 1789, 1797),
+    ('John Adams', 1797, 1801),
+    ('Thomas Jefferson', 1801, 1809),
+    ('James Madison', 1809, 1817),
+    ('James Monroe', 1817, 1825),
+    ('John Quincy Adams', 1825, 1829),
+    ('Andrew Jackson', 1829, 1837),
+    ('Martin Van Buren', 1837, 1841),
+    ('William Harrison', 1841, 1841),
+    ('John Tyler', 1841, 1845),
+    ('James K. Polk', 1845, 1849),
+    ('Zachary Taylor', 1849, 1850),
+    ('Millard Fillmore', 1850, 1853),
+    ('Franklin Pierce', 1853, 1857),
+    ('James Buchanan', 1857, 1861),
+    ('Abraham Lincoln', 1861, 1865),
+    ('Andrew Johnson', 1865, 1869),
+    ('Ulysses S. Grant', 1869, 1877),
+    ('Rutherford B. Hayes', 1877, 1881),
+    ('James A. Garfield', 1881, 1881),
+    ('Chester A. Arthur', 1881, 1885),
+    ('Grover Cleveland', 1885, 1889),
+    ('Benjamin Harrison', 1889, 1893),
+    ('Grover Cleveland', 1893, 1897),
+    ('William McKinley', 1897, 1901),
+    ('Theodore Roosevelt', 1901, 1909),
+    ('William Taft', 1909, 1913),
+    ('Woodrow Wilson', 1913, 1921),
+    ('Warren G. Harding', 1921, 1923),
+    ('Calvin Coolidge', 1923, 1929),
+    ('Herbert Hoover', 1929, 1933),
+    ('Franklin D. Roosevelt', 1933, 1945),
+    ('Harry S. Truman', 1945, 1953),
+    ('Dwight D. Eisenhower', 1953, 1961),
+    ('John F. Kennedy', 1961, 1963),
+    ('Lyndon B. Johnson', 1963, 1969),
+    ('Richard M. Nixon', 1969, 1974),
+    ('Gerald Ford', 1974, 1977),
+    ('Jimmy Carter', 1977, 1981),
+    ('Ronald Reagan', 1981, 1989),
+    ('George H. W. Bush', 1989, 1993),
+    ('Bill Clinton', 1993, 2001),
+    ('George W. Bush', 2001, 2009),
+    ('Barack Obama', 2009, 2017),
+    ('Donald Trump', 2017, 2021),
+    ('Joe Biden', 2021, None),
+]
+
+def presidential_terms(president):
+    """The (first year, last year) of every tenure of a president, in order."""
+    return [(start, end) for name, start, end in PRESIDENTIAL_TERMS if name == president]
+
+def presidency_years(president):
+    """Years of presidency for labels, e.g. '(1885-1889, 1893-1897)'."""
+    spans = [f"{start}-{end if end is not None else 'Present'}" for start, end in presidential_terms(president)]
+    return f"({', '.join(spans)})" if spans else None
+
+def term_of(president, year):
+    """The tenure label ('1885-1889') of a speech given by president in year, or None when it matches none."""
+    for start, end in presidential_terms(president):
+        if start <= year and (end is None or year <= end):
+            return f"{start}-{end if end is not None else 'Present'}"
+    return None
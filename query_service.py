@@ -0,0 +1,448 @@
+"""
+Local HTTP service that answers queries about the scored speeches from an in-memory index.
+
+The analyzed table is loaded once. Speeches are sorted by president and date, so the
+speeches of a president between two dates are a contiguous slice found by binary search.
+A second, date-sorted order does the same for date-only queries. An inverted index maps
+every token of processed_text (tokenized as in dtm_store) to the speeches containing it.
+The table is polled, and a new index is swapped in once the pipeline wrote a new version;
+requests in flight keep the index they started with.
+
+    python query_service.py --port 8765
+
+    GET  /speeches?president=Abraham Lincoln&start=1861-03-04&end=1862-12-31&limit=20
+    GET  /sentiment?start=1900-01-01&end=1949-12-31&by=party       (by: president, party or year)
+    GET  /search?q=tariff trade&mode=all&president=...&start=...&end=...&limit=20
+    GET  /terms?limit=100                                          (most widespread tokens)
+    GET  /status
+    POST /reload
+
+Every parameter is optional and dates are inclusive. processed_text is lemmatized, so
+keywords match lemmas ("tariff", not "tariffs"). Responses are JSON and report the time
+the query took on the server. misc/load_test_queries.py measures the latency seen by
+concurrent clients.
+"""
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+import pandas as pd
+from dtm_store import DocumentTermMatrix
+from presidents import PRESIDENT_TO_PARTY
+from speech_store import ANALYZED, load_speeches, source_path
+
+# --- START: CONFIGURATION ---
+INPUT_TABLE = ANALYZED
+HOST = '127.0.0.1'
+PORT = 8765
+# Seconds between two checks of the table for a new version (0 disables hot reload)
+RELOAD_INTERVAL = 2.0
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 1000
+# --- END: CONFIGURATION ---
+
+SCORE_COLUMNS = ['sentiment_score', 'sentiment_neg', 'sentiment_neu', 'sentiment_pos']
+RECORD_COLUMNS = ['doc_name', 'president', 'party', 'date', 'title']
+GROUPINGS = ['president', 'party', 'year']
+# Sort key of undated speeches: after every date, and outside every date range
+UNDATED = np.iinfo(np.int64).max
+
+def table_version(table):
+    """(path, size, mtime) of the file load_speeches reads for a table, or None when it is missing."""
+    path = source_path(table)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+def _value(value):
+    """A cell as a JSON value: NaN and NaT become None, numpy scalars plain numbers."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _key_date(key):
+    return str(np.datetime64(int(key), 'ns').astype('datetime64[D]'))
+
+def score_stats(scores, keys=None):
+    """Count, mean, standard deviation, minimum and maximum of scores (NaN scores are ignored)."""
+    valid = ~np.isnan(scores)
+    scores = scores[valid]
+    stats = {'count': int(len(scores)), 'mean': None, 'std': None, 'min': None, 'max': None}
+    if len(scores):
+        stats.update(mean=float(scores.mean()), min=float(scores.min()), max=float(scores.max()),
+                     std=float(scores.std(ddof=1)) if len(scores) > 1 else None)
+    if keys is not None:
+        dated = keys[valid]
+        dated = dated[dated != UNDATED]
+        stats['first_date'] = _key_date(dated.min()) if len(dated) else None
+        stats['last_date'] = _key_date(dated.max()) if len(dated) else None
+    return stats
+
+class SpeechIndex:
+    """Speeches sorted by president and date, a date-sorted order and an inverted token index."""
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        presidents = df['president'].astype(object).where(df['president'].notna(), None)
+        dates = pd.to_datetime(df['date'], errors='coerce')
+        keys = dates.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        keys[dates.isna().to_numpy()] = UNDATED
+        codes, labels = pd.factorize(presidents, sort=True)
+
+        # Speeches without a president sort first (code -1) and belong to no president's slice
+        order = np.lexsort((keys, codes))
+        codes = codes[order]
+        self.keys = keys[order]
+        self.bounds = {str(label): (int(np.searchsorted(codes, code, 'left')), int(np.searchsorted(codes, code, 'right')))
+                       for code, label in enumerate(labels)}
+        self.by_date = np.argsort(self.keys, kind='stable')
+        self.date_keys = self.keys[self.by_date]
+
+        rows = df.loc[order].reset_index(drop=True)
+        rows['president'] = presidents.iloc[order].reset_index(drop=True)
+        rows['party'] = rows['president'].map(PRESIDENT_TO_PARTY)
+        self.scores = rows['sentiment_score'].to_numpy(dtype=float)
+        # Integer code of every speech per grouping (-1 when it has no value) and the code labels
+        self.group_codes = {}
+        for by, values in (('president', rows['president']), ('party', rows['party']),
+                           ('year', pd.Series(dates.iloc[order].dt.year.to_numpy(), dtype='Int64'))):
+            codes, labels = pd.factorize(values, sort=True)
+            self.group_codes[by] = (codes, [_value(label) for label in labels.tolist()])
+
+        # What the queries return for every speech, built once
+        columns = RECORD_COLUMNS + [column for column in SCORE_COLUMNS if column in rows.columns]
+        values = {column: rows[column].astype(object).tolist() for column in columns}
+        values['date'] = [None if key == UNDATED else _key_date(key) for key in self.keys]
+        self.records = [{column: _value(values[column][i]) for column in columns} for i in range(len(rows))]
+
+        # Postings of every token: the speeches containing it (sorted) and how often it occurs in each
+        dtm = DocumentTermMatrix.from_texts(rows['processed_text'], rows[['doc_name']])
+        self.postings = dtm.matrix.tocsc()
+        self.postings.sort_indices()
+        self.term_ids = {term: i for i, term in enumerate(dtm.vocab)}
+        self.vocab = dtm.vocab
+        doc_freqs = np.diff(self.postings.indptr)
+        self.terms_by_spread = np.argsort(-doc_freqs, kind='stable')
+        self.doc_freqs = doc_freqs
+
+    def __len__(self):
+        return len(self.records)
+
+    def select(self, president=None, start=None, end=None):
+        """
+        Positions of the speeches of a president (all when None) dated from start to end (ns keys,
+        end exclusive; either may be None), found by binary search in the matching order.
+        """
+        if president is not None:
+            lo, hi = self.bounds.get(president, (0, 0))
+            first, last = self._span(self.keys[lo:hi], start, end)
+            return np.arange(lo + first, lo + last)
+        first, last = self._span(self.date_keys, start, end)
+        return self.by_date[first:last]
+
+    @staticmethod
+    def _span(keys, start, end):
+        first = int(np.searchsorted(keys, start, 'left')) if start is not None else 0
+        if start is None and end is None:
+            return first, len(keys)
+        return first, int(np.searchsorted(keys, end if end is not None else UNDATED, 'left'))
+
+    def postings_of(self, term):
+        i = self.term_ids.get(term)
+        if i is None:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+        start, end = self.postings.indptr[i], self.postings.indptr[i + 1]
+        return self.postings.indices[start:end], self.postings.data[start:end]
+
+    def search(self, terms, mode='all'):
+        """Positions of the speeches containing all (or any) of terms, and their summed term counts."""
+        docs, hits = None, None
+        for term in terms:
+            term_docs, term_hits = self.postings_of(term)
+            if docs is None:
+                docs, hits = term_docs, term_hits.astype(np.int64)
+            elif mode == 'all':
+                docs, mine, theirs = np.intersect1d(docs, term_docs, assume_unique=True, return_indices=True)
+                hits = hits[mine] + term_hits[theirs]
+            else:
+                merged = np.concatenate([docs, term_docs])
+                docs, inverse = np.unique(merged, return_inverse=True)
+                hits = np.bincount(inverse, weights=np.concatenate([hits, term_hits]), minlength=len(docs)).astype(np.int64)
+        if docs is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return docs, hits
+
+    def in_range(self, docs, president=None, start=None, end=None):
+        """Mask of the positions in docs matching a president and date filter."""
+        mask = np.ones(len(docs), dtype=bool)
+        if president is not None:
+            lo, hi = self.bounds.get(president, (0, 0))
+            mask &= (docs >= lo) & (docs < hi)
+        if start is not None:
+            mask &= self.keys[docs] >= start
+        if start is not None or end is not None:
+            mask &= self.keys[docs] < (end if end is not None else UNDATED)
+        return mask
+
+    def stats(self, positions):
+        return score_stats(self.scores[positions], self.keys[positions])
+
+    def groups(self, positions, by):
+        """score_stats per value of a grouping over the given positions, all groups at once."""
+        codes, labels = self.group_codes[by]
+        codes, scores, keys = codes[positions], self.scores[positions], self.keys[positions]
+        valid = (codes >= 0) & ~np.isnan(scores)
+        order = np.argsort(codes[valid], kind='stable')
+        codes, scores, keys = codes[valid][order], scores[valid][order], keys[valid][order]
+        if not len(codes):
+            return []
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        counts = np.diff(np.r_[starts, len(codes)])
+        sums = np.add.reduceat(scores, starts)
+        means = sums / counts
+        squares = np.add.reduceat(scores * scores, starts)
+        variances = np.maximum(squares - sums * means, 0) / np.maximum(counts - 1, 1)
+        minimums = np.minimum.reduceat(scores, starts)
+        maximums = np.maximum.reduceat(scores, starts)
+        first_keys = np.minimum.reduceat(keys, starts)
+        last_keys = np.maximum.reduceat(np.where(keys == UNDATED, np.iinfo(np.int64).min, keys), starts)
+        dated = first_keys != UNDATED
+        first_dates = np.where(dated, first_keys, 0).astype('datetime64[ns]').astype('datetime64[D]').astype(str)
+        last_dates = np.where(dated, last_keys, 0).astype('datetime64[ns]').astype('datetime64[D]').astype(str)
+
+        return [{by: labels[codes[start]], 'count': int(counts[i]), 'mean': float(means[i]),
+                 'std': float(np.sqrt(variances[i])) if counts[i] > 1 else None,
+                 'min': float(minimums[i]), 'max': float(maximums[i]),
+                 'first_date': str(first_dates[i]) if dated[i] else None,
+                 'last_date': str(last_dates[i]) if dated[i] else None}
+                for i, start in enumerate(starts)]
+
+    def speeches(self, positions, limit):
+        return [self.records[i] for i in positions[:limit]]
+
+class QueryError(ValueError):
+    """A malformed query, answered with 400 Bad Request."""
+
+def _param(params, name, default=None):
+    values = params.get(name)
+    return values[0] if values else default
+
+def _date_param(params, name, inclusive_end=False):
+    value = _param(params, name)
+    if value is None or value == '':
+        return None
+    try:
+        day = pd.Timestamp(value).normalize()
+    except ValueError:
+        raise QueryError(f"'{name}' is not a date: {value!r}")
+    if inclusive_end:
+        day += pd.Timedelta(days=1)
+    return day.as_unit('ns').value
+
+def _limit_param(params):
+    try:
+        limit = int(_param(params, 'limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise QueryError("'limit' must be an integer")
+    return max(0, min(limit, MAX_LIMIT))
+
+def _filters(params):
+    return {'president': _param(params, 'president') or None,
+            'start': _date_param(params, 'start'),
+            'end': _date_param(params, 'end', inclusive_end=True)}
+
+def query_speeches(index, params):
+    positions = index.select(**_filters(params))
+    return {'count': len(positions), 'sentiment': index.stats(positions),
+            'speeches': index.speeches(positions, _limit_param(params))}
+
+def query_sentiment(index, params):
+    by = _param(params, 'by')
+    if by is not None and by not in GROUPINGS:
+        raise QueryError(f"'by' must be one of {', '.join(GROUPINGS)}")
+    positions = index.select(**_filters(params))
+    result = {'sentiment': index.stats(positions)}
+    if by is not None:
+        result['by'] = by
+        result['groups'] = index.groups(positions, by)
+    return result
+
+def query_search(index, params):
+    terms = [term for value in params.get('q', []) for term in value.lower().split()]
+    if not terms:
+        raise QueryError("'q' must hold at least one keyword")
+    mode = _param(params, 'mode', 'all')
+    if mode not in ('all', 'any'):
+        raise QueryError("'mode' must be 'all' or 'any'")
+    docs, hits = index.search(terms, mode)
+    mask = index.in_range(docs, **_filters(params))
+    docs, hits = docs[mask], hits[mask]
+    # Most mentions first, then by date
+    ranked = np.lexsort((index.keys[docs], -hits))
+    limit = _limit_param(params)
+    return {'terms': terms, 'mode': mode, 'count': len(docs), 'sentiment': index.stats(docs),
+            'speeches': [dict(index.records[docs[i]], hits=int(hits[i])) for i in ranked[:limit]]}
+
+def query_terms(index, params):
+    top = index.terms_by_spread[:_limit_param(params)]
+    return {'terms': [{'term': index.vocab[i], 'speeches': int(index.doc_freqs[i])} for i in top]}
+
+QUERIES = {
+    '/speeches': query_speeches,
+    '/sentiment': query_sentiment,
+    '/search': query_search,
+    '/terms': query_terms,
+}
+
+class QueryService:
+    """Holds the current index of a table and replaces it when the table changes."""
+
+    def __init__(self, table=INPUT_TABLE, reload_interval=RELOAD_INTERVAL):
+        self.table = table
+        self.reload_interval = reload_interval
+        self.index = None
+        self.version = None
+        self.loaded_at = None
+        self.reloads = 0
+        self._seen = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def load(self):
+        """Builds a new index from the table and swaps it in. Raises FileNotFoundError when it is missing."""
+        with self._lock:
+            version = table_version(self.table)
+            start = time.perf_counter()
+            index = SpeechIndex(load_speeches(self.table))
+            if self.index is not None:
+                self.reloads += 1
+            self.index, self.version, self._seen = index, version, version
+            self.loaded_at = datetime.datetime.now().isoformat(timespec='seconds')
+        print(f"Indexed {len(index)} speeches and {len(index.vocab)} terms from '{version[0]}' "
+              f"in {time.perf_counter() - start:.2f}s.")
+
+    def check(self):
+        """
+        Reloads once the table changed and stayed unchanged for a whole interval, so a
+        table still being written is not picked up.
+        """
+        version = table_version(self.table)
+        if version is None or version == self.version:
+            return
+        if version == self._seen:
+            self.load()
+        else:
+            self._seen = version
+
+    def watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.check()
+            except Exception as e:
+                # Keep serving the previous index; the next check tries again
+                print(f"Reload of '{self.table}' failed: {e}")
+                self._seen = None
+
+    def start(self):
+        if self.reload_interval > 0:
+            threading.Thread(target=self.watch, name='reload', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self):
+        index = self.index
+        return {'table': self.version[0], 'speeches': len(index), 'presidents': len(index.bounds),
+                'terms': len(index.vocab), 'loaded_at': self.loaded_at, 'reloads': self.reloads}
+
+    def answer(self, path):
+        """Returns (HTTP status, JSON payload) for a GET request."""
+        url = urlsplit(path)
+        if url.path == '/status':
+            return 200, self.status()
+        if url.path not in QUERIES:
+            return 404, {'error': f"unknown path {url.path}", 'paths': sorted(QUERIES) + ['/status']}
+        # The index of this request, even if a reload swaps in a new one meanwhile
+        index = self.index
+        start = time.perf_counter()
+        try:
+            result = QUERIES[url.path](index, parse_qs(url.query))
+        except QueryError as e:
+            return 400, {'error': str(e)}
+        result['took_ms'] = (time.perf_counter() - start) * 1000
+        return 200, result
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients do not pay a new connection per query. The headers and the body
+    # are separate writes: without TCP_NODELAY, the body waits for the client's delayed ACK.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.respond(*self.server.service.answer(self.path))
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/reload':
+            self.respond(404, {'error': f"unknown path {self.path}"})
+            return
+        try:
+            self.server.service.load()
+        except Exception as e:
+            self.respond(500, {'error': f"reload failed: {e}"})
+            return
+        self.respond(200, self.server.service.status())
+
+    def respond(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve range, aggregate and keyword queries over the scored speeches.")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                        help=f"seconds between checks of the table for a new version, 0 to disable (default: {RELOAD_INTERVAL})")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    service = QueryService(reload_interval=args.reload_interval)
+    try:
+        service.load()
+    except FileNotFoundError as e:
+        print(f"Error: The file {e} was not found. Please ensure the sentiment analysis script ran successfully.")
+        exit()
+
+    server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = args.verbose
+    service.start()
+    print(f"Serving queries on http://{args.host}:{server.server_port}/ (Ctrl+C to stop).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
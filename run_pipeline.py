@@ -0,0 +1,306 @@
+"""
+Runs the whole analysis as a DAG of stages, instead of the numbered scripts one by one.
+
+Every stage declares the files it reads and writes. A stage is skipped when the content
+hash of its inputs, its script, the repo modules the script imports and its arguments
+match the last successful run and its outputs still exist. Stages whose inputs are ready run concurrently in a process pool, so
+the charts, the keyword analysis, the topic models and the rhetorical analysis all run
+side by side once the speeches are scored. Every pool process keeps the heavy libraries
+it imported and the table columns it read (speech_store.share_tables) for the next stage
+it runs. A summary of wall time and memory per stage is printed at the end.
+
+    python run_pipeline.py                          # everything out of date
+    python run_pipeline.py --workers 4
+    python run_pipeline.py --only keywords rhetoric # these stages, if their inputs exist
+    python run_pipeline.py --force sentiment        # rerun a stage (and what it changes)
+    python run_pipeline.py --dry-run
+
+The stage state is kept in pipeline_state.json. The download stage has no inputs: it only
+runs when speeches.json is missing or when it is forced.
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import instrumentation
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# --- START: CONFIGURATION ---
+STATE_PATH = 'pipeline_state.json'
+ANALYZED_TABLE = ['analyzed_speeches.parquet', 'analyzed_speeches.csv']
+PREPROCESSED_TABLE = ['preprocessed_speeches.parquet', 'preprocessed_speeches.csv']
+
+# In dependency order. 'args' are passed to the script and are part of the stage's hash.
+STAGES = [
+    {'name': 'download', 'script': '1_download_mc_speeches.py', 'after': [],
+     'inputs': [], 'outputs': ['speeches.json']},
+    {'name': 'dedup', 'script': 'speech_dedup.py', 'after': ['download'],
+     'inputs': ['speeches.json'], 'outputs': ['duplicates.json']},
+    {'name': 'preprocess', 'script': '2_preprocessing_speeches.py', 'after': ['dedup'],
+     'inputs': ['speeches.json', 'duplicates.json'], 'outputs': PREPROCESSED_TABLE},
+    {'name': 'sentiment', 'script': '3_sentiment_analysis.py', 'after': ['preprocess'],
+     'inputs': PREPROCESSED_TABLE, 'outputs': ANALYZED_TABLE + ['sentiment_cube.sqlite']},
+    {'name': 'party_chart', 'script': '4_visualize_avg_sentiment_by_party.py', 'after': ['sentiment'],
+     'inputs': ANALYZED_TABLE, 'outputs': ['average_sentiment_by_president.png']},
+    {'name': 'president_plots', 'script': '4_visualize_data_by_president.py', 'after': ['sentiment'],
+     'inputs': ANALYZED_TABLE, 'outputs': ['individual_sentiment_plots/fingerprints.json']},
+    # Built once here, so the stages sharing it do not race to build it
+    {'name': 'dtm', 'script': 'dtm_store.py', 'after': ['sentiment'],
+     'inputs': ANALYZED_TABLE, 'outputs': ['dtm/meta.json']},
+    {'name': 'keywords', 'script': '5_advance_sentiment_analysis.py', 'after': ['dtm'],
+     'inputs': ANALYZED_TABLE, 'outputs': ['distinctive_words.csv', 'positive_sentiment_wordcloud.png',
+                                           'negative_sentiment_wordcloud.png']},
+    {'name': 'topics', 'script': '6_topic_modeling.py', 'after': ['dtm'],
+     'inputs': ANALYZED_TABLE, 'outputs': ['coherence_scores.png', 'lda_visualization.html']},
+    {'name': 'topics_by_president', 'script': '6_topic_modeling_by_president.py', 'after': ['dtm'],
+     'inputs': ANALYZED_TABLE, 'outputs': ['topic_distribution_by_president.csv', 'lda_visualization_12_topics.html']},
+    {'name': 'rhetoric', 'script': '7_rethorical_analysis.py', 'after': ['dtm'],
+     'inputs': ANALYZED_TABLE, 'outputs': ['rhetorical_analysis_results.csv']},
+]
+# --- END: CONFIGURATION ---
+
+STAGE_NAMES = [stage['name'] for stage in STAGES]
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {'stages': {}, 'files': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(state, path=STATE_PATH):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def file_hash(path, state):
+    """sha256 of a file's content, reused from the state while its size and mtime are unchanged."""
+    stat = os.stat(path)
+    known = state['files'].get(path)
+    if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+        return known['sha256']
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    state['files'][path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+    return digest.hexdigest()
+
+def local_imports(path, found=None):
+    """
+    Paths of the repo modules a script imports, directly or through other repo modules,
+    including the imports inside functions.
+    """
+    found = set() if found is None else found
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            module = os.path.join(REPO, name.split('.')[0] + '.py')
+            if module not in found and os.path.exists(module):
+                found.add(module)
+                local_imports(module, found)
+    return found
+
+def stage_signature(stage, state):
+    """Hash of a stage's script, the repo modules it imports, its arguments and the content of the inputs that exist."""
+    digest = hashlib.sha256()
+    script = os.path.join(REPO, stage['script'])
+    digest.update(f"{file_hash(script, state)}\0{json.dumps(stage.get('args', []))}\0".encode('utf-8'))
+    # Editing a shared module (the party map in presidents.py, the tokenization in dtm_store.py)
+    # changes the output of every stage that uses it
+    for module in sorted(local_imports(script) - {script}):
+        digest.update(f"{os.path.basename(module)}\0{file_hash(module, state)}\0".encode('utf-8'))
+    for path in stage['inputs']:
+        if os.path.exists(path):
+            digest.update(f"{path}\0{file_hash(path, state)}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+def is_current(stage, signature, state):
+    if not all(os.path.exists(path) for path in stage['outputs']):
+        return False
+    if not stage['inputs']:
+        return True
+    return state['stages'].get(stage['name']) == signature
+
+def init_worker():
+    from speech_store import share_tables
+    share_tables()
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_kb //= 1024
+    return peak_kb / 1024
+
+def run_stage(stage, trace_dir=None):
+    """
+    Runs a stage's script in this process, as `python <script> <args>` would. Returns its
+    wall time, the process' peak RSS afterwards and how much the stage raised it. With a
+    trace_dir the stage's timers and counters are written to <trace_dir>/<stage>.json.
+    """
+    if trace_dir:
+        instrumentation.enable(os.path.join(trace_dir, f"{stage['name']}.json"), stage=stage['name'])
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    argv = sys.argv
+    sys.argv = [stage['script']] + stage.get('args', [])
+    error = None
+    try:
+        runpy.run_path(os.path.join(REPO, stage['script']), run_name='__main__')
+    except SystemExit as e:
+        # The scripts only exit early when something is missing or failed
+        error = f"exited early ({e.code})" if e.code not in (None, 0) else "exited early"
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        sys.argv = argv
+        if trace_dir:
+            instrumentation.finish(quiet=True)
+    after = peak_rss_mb()
+    return {
+        'status': 'failed' if error else 'ran',
+        'error': error,
+        'seconds': time.perf_counter() - start,
+        'peak_rss_mb': after,
+        'rss_growth_mb': after - before if after is not None else None,
+        'pid': os.getpid(),
+    }
+
+def select_stages(only):
+    if not only:
+        return list(STAGES)
+    return [stage for stage in STAGES if stage['name'] in only]
+
+def run_pipeline(stages, force=(), workers=1, dry_run=False, state_path=STATE_PATH, trace_dir=None):
+    """
+    Runs the stages in dependency order, skipping the current ones and running the ready ones
+    concurrently on `workers` processes (in this process when workers is 1). A stage whose
+    dependency failed is blocked. Returns {name: result}.
+    """
+    state = load_state(state_path)
+    if trace_dir and not dry_run:
+        os.makedirs(trace_dir, exist_ok=True)
+    selected = {stage['name'] for stage in stages}
+    pending = list(stages)
+    results = {}
+    running = {}
+
+    executor = None
+    if workers > 1 and not dry_run:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+    else:
+        init_worker()
+
+    def finish(stage, signature, result):
+        results[stage['name']] = result
+        if result['status'] == 'ran':
+            state['stages'][stage['name']] = signature
+            save_state(state, state_path)
+        elif result['status'] == 'failed':
+            print(f"\n[pipeline] {stage['name']} failed: {result['error']}")
+
+    try:
+        while pending or running:
+            progress = True
+            while progress:
+                progress = False
+                for stage in list(pending):
+                    deps = [name for name in stage['after'] if name in selected]
+                    if any(results.get(name, {}).get('status') in ('failed', 'blocked') for name in deps):
+                        results[stage['name']] = {'status': 'blocked'}
+                    elif any(results.get(name, {}).get('status') == 'would run' for name in deps):
+                        results[stage['name']] = {'status': 'would run'}
+                    elif all(name in results and results[name]['status'] != 'running' for name in deps):
+                        signature = stage_signature(stage, state)
+                        if stage['name'] not in force and is_current(stage, signature, state):
+                            results[stage['name']] = {'status': 'skipped'}
+                        elif dry_run:
+                            results[stage['name']] = {'status': 'would run'}
+                        elif executor is None:
+                            print(f"\n[pipeline] running {stage['name']} ({stage['script']})")
+                            finish(stage, signature, run_stage(stage, trace_dir))
+                        else:
+                            print(f"\n[pipeline] starting {stage['name']} ({stage['script']})")
+                            running[executor.submit(run_stage, stage, trace_dir)] = (stage, signature)
+                            results[stage['name']] = {'status': 'running'}
+                    else:
+                        continue
+                    pending.remove(stage)
+                    progress = True
+
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, signature = running.pop(future)
+                    finish(stage, signature, future.result())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if not dry_run:
+        save_state(state, state_path)
+    return results
+
+def format_number(value, width, digits=1):
+    return f"{value:{width}.{digits}f}" if value is not None else " " * (width - 3) + "n/a"
+
+def print_summary(results, elapsed):
+    print(f"\n{'stage':22} {'status':10} {'seconds':>8} {'peak MB':>8} {'+MB':>8} {'pid':>7}")
+    for name in STAGE_NAMES:
+        if name not in results:
+            continue
+        result = results[name]
+        if result['status'] in ('ran', 'failed'):
+            print(f"{name:22} {result['status']:10} {format_number(result['seconds'], 8, 2)} "
+                  f"{format_number(result['peak_rss_mb'], 8)} {format_number(result['rss_growth_mb'], 8)} "
+                  f"{result['pid']:7d}")
+        else:
+            print(f"{name:22} {result['status']:10}")
+    print(f"Total wall time: {elapsed:.1f}s")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the analysis pipeline, skipping the stages that are up to date.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="stages run at the same time (default: 1, all in this process)")
+    parser.add_argument('--only', nargs='+', choices=STAGE_NAMES, metavar='STAGE',
+                        help=f"run only these stages: {', '.join(STAGE_NAMES)}")
+    parser.add_argument('--force', nargs='+', choices=STAGE_NAMES + ['all'], default=[], metavar='STAGE',
+                        help="run these stages even when they are up to date ('all' for every stage)")
+    parser.add_argument('--dry-run', action='store_true', help="only show which stages would run")
+    parser.add_argument('--trace', metavar='DIR',
+                        help="write the timers, counters and peak memory of every stage run to DIR/<stage>.json")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    force = set(STAGE_NAMES) if 'all' in args.force else set(args.force)
+
+    start = time.perf_counter()
+    results = run_pipeline(select_stages(args.only), force=force, workers=args.workers, dry_run=args.dry_run,
+                           trace_dir=args.trace)
+    print_summary(results, time.perf_counter() - start)
+    if any(result['status'] in ('failed', 'blocked') for result in results.values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Sentiment scores of the segments of every speech.
+
+VADER scores a whole speech as one text, and on long addresses its compound score
+saturates near +-1. `3_sentiment_analysis.py --segments sentence` (or `window`) splits
+every raw transcript into sentences or fixed windows of words and scores each one. The
+scores are stored as arrays rather than per-row objects: a float32 matrix with one row
+of (neg, neu, pos, compound) per segment, and the offsets of every speech's first
+segment, aligned with a row index of doc_name, president and date. They are persisted in
+SEGMENT_DIR:
+
+    segments = load_segments()
+    per_speech = segments.speech_stats()            # one row per speech
+    per_president = segments.group_stats('president')
+
+Every statistic is computed from the compound scores with a few bincount passes over
+the segments, whatever the number of speeches.
+"""
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# --- START: CONFIGURATION ---
+SEGMENT_DIR = 'segments'
+# Words per segment in window mode
+WINDOW_WORDS = 40
+# --- END: CONFIGURATION ---
+
+SEGMENT_MODES = ('sentence', 'window')
+SCORE_KEYS = ['neg', 'neu', 'pos', 'compound']
+ROW_COLUMNS = ['doc_name', 'president', 'date']
+
+# A sentence runs up to its terminal punctuation (and any closing quotes or brackets)
+SENTENCE_PATTERN = re.compile(r'[^.!?]*[^.!?\s][^.!?]*(?:[.!?]+["\'”’)\]]*|$)')
+
+def split_sentences(text):
+    return [match.group().strip() for match in SENTENCE_PATTERN.finditer(text)]
+
+def split_windows(text, size=WINDOW_WORDS):
+    words = text.split()
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+def segment_text(text, mode='sentence', window=WINDOW_WORDS):
+    """Splits a raw transcript into the segments that are scored one by one (none for a missing text)."""
+    if not isinstance(text, str) or not text.strip():
+        return []
+    if mode == 'sentence':
+        return split_sentences(text)
+    if mode == 'window':
+        return split_windows(text, window)
+    raise ValueError(f"unknown segment mode {mode!r}, expected one of {SEGMENT_MODES}")
+
+def _group_slope(groups, n, x, y):
+    """Least-squares slope of y against x per group in range(n). NaN where x does not vary."""
+    counts = np.bincount(groups, minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.bincount(groups, weights=x, minlength=n) / counts
+        mean_y = np.bincount(groups, weights=y, minlength=n) / counts
+        dx = x - mean_x[groups]
+        covariance = np.bincount(groups, weights=dx * (y - mean_y[groups]), minlength=n)
+        variance = np.bincount(groups, weights=dx * dx, minlength=n)
+        slope = covariance / variance
+    slope[~(variance > 0)] = np.nan
+    return slope
+
+def _stats(ids, n, values):
+    """count, mean, var (ddof=1), min and max of values per id in range(n)."""
+    counts = np.bincount(ids, minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.bincount(ids, weights=values, minlength=n) / counts
+        squares = np.bincount(ids, weights=(values - means[ids]) ** 2, minlength=n)
+        variances = np.where(counts > 1, squares / (counts - 1), np.nan)
+    minimums = np.full(n, np.inf)
+    maximums = np.full(n, -np.inf)
+    np.minimum.at(minimums, ids, values)
+    np.maximum.at(maximums, ids, values)
+    minimums[counts == 0] = np.nan
+    maximums[counts == 0] = np.nan
+    return counts, means, variances, minimums, maximums
+
+class SegmentScores:
+    """Per-segment VADER scores of a set of speeches, with the offsets of every speech's segments."""
+
+    def __init__(self, offsets, scores, rows, settings=None):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1, len(SCORE_KEYS))
+        self.rows = rows.reset_index(drop=True)
+        self.settings = dict(settings or {})
+
+    @classmethod
+    def from_lists(cls, per_speech, rows, settings=None):
+        """Builds the store from one list of score rows (neg, neu, pos, compound) per speech."""
+        counts = [len(scores) for scores in per_speech]
+        offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        flat = [row for scores in per_speech for row in scores]
+        return cls(offsets, np.array(flat, dtype=np.float32).reshape(-1, len(SCORE_KEYS)), rows, settings)
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def doc_ids(self):
+        """The row of the speech every segment belongs to."""
+        return np.repeat(np.arange(len(self.rows)), self.counts)
+
+    def column(self, key='compound'):
+        return self.scores[:, SCORE_KEYS.index(key)].astype(np.float64)
+
+    def speech(self, i):
+        """The score rows of the i-th speech."""
+        return self.scores[self.offsets[i]:self.offsets[i + 1]]
+
+    def speech_stats(self, key='compound'):
+        """
+        One row per speech: number of segments, mean, variance, min and max of the segment
+        scores, and their trend (slope from the first to the last segment).
+        """
+        doc_ids = self.doc_ids()
+        values = self.column(key)
+        counts, means, variances, minimums, maximums = _stats(doc_ids, len(self.rows), values)
+        stats = self.rows[ROW_COLUMNS].copy()
+        stats['segment_count'] = counts
+        stats['segment_mean'] = means
+        stats['segment_var'] = variances
+        stats['segment_min'] = minimums
+        stats['segment_max'] = maximums
+        # Position of every segment in its speech, from 0 (first) to 1 (last)
+        first = self.offsets[:-1][doc_ids]
+        position = (np.arange(len(doc_ids)) - first) / np.maximum(counts - 1, 1)[doc_ids]
+        stats['segment_trend'] = _group_slope(doc_ids, len(self.rows), position, values)
+        return stats
+
+    def group_stats(self, column='president', key='compound'):
+        """
+        Statistics over all segments of each group's speeches, plus the mean within-speech
+        trend and the trajectory across speeches: the slope of the speech means per year.
+        """
+        codes, labels = pd.factorize(self.rows[column], sort=True)
+        doc_ids = self.doc_ids()
+        values = self.column(key)
+        segment_groups = codes[doc_ids]
+        valid = segment_groups >= 0
+        counts, means, variances, minimums, maximums = _stats(segment_groups[valid], len(labels), values[valid])
+
+        per_speech = self.speech_stats(key)
+        speech_means = per_speech['segment_mean'].to_numpy()
+        trends = per_speech['segment_trend'].to_numpy()
+        years = (pd.to_datetime(per_speech['date'], errors='coerce') - pd.Timestamp('1789-01-01')).dt.days / 365.25
+        years = years.to_numpy()
+
+        table = pd.DataFrame(index=pd.Index(list(labels), name=column))
+        table['speeches'] = np.bincount(codes[codes >= 0], minlength=len(labels))
+        table['segments'] = counts
+        table['mean'] = means
+        table['var'] = variances
+        table['min'] = minimums
+        table['max'] = maximums
+        has_trend = (codes >= 0) & ~np.isnan(trends)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table['within_speech_trend'] = (np.bincount(codes[has_trend], weights=trends[has_trend],
+                                                        minlength=len(labels))
+                                            / np.bincount(codes[has_trend], minlength=len(labels)))
+        dated = (codes >= 0) & ~np.isnan(speech_means) & ~np.isnan(years)
+        table['trend_per_year'] = _group_slope(codes[dated], len(labels), years[dated], speech_means[dated])
+        return table
+
+    def save(self, path=SEGMENT_DIR):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(path, 'scores.npy'), self.scores)
+        self.rows.to_pickle(os.path.join(path, 'rows.pkl'))
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'columns': SCORE_KEYS, 'segments': int(self.offsets[-1]), **self.settings}, f, indent=2)
+
+    @classmethod
+    def load(cls, path=SEGMENT_DIR):
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        settings = {key: value for key, value in meta.items() if key not in ('columns', 'segments')}
+        return cls(
+            np.load(os.path.join(path, 'offsets.npy')),
+            np.load(os.path.join(path, 'scores.npy')),
+            pd.read_pickle(os.path.join(path, 'rows.pkl')),
+            settings,
+        )
+
+def load_segments(path=SEGMENT_DIR):
+    """
+    Loads the segment scores written by 3_sentiment_analysis.py --segments.
+    Raises FileNotFoundError when there are none.
+    """
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        raise FileNotFoundError(os.path.join(path, 'meta.json'))
+    return SegmentScores.load(path)
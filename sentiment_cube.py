@@ -0,0 +1,252 @@
+"""
+Materialized sentiment aggregates by president, party, year and term.
+
+Every cell of the cube holds the count, sum, sum of squares, minimum and maximum of the
+compound sentiment score of the speeches falling in it, so means, variances and confidence
+intervals can be derived at any rollup level without rescanning the speeches:
+
+    cube = load_cube()
+    by_party = cube.rollup(['party', 'decade'])   # count, mean, std, ci95_low, ci95_high...
+
+The cube also keeps a ledger of the score and cell of every speech it has seen. Syncing
+it with a new version of the analyzed table only touches the speeches that were added,
+rescored or removed: added speeches are folded into their cells, and the few cells that
+lost a speech are recomputed from the ledger (a minimum or maximum cannot be subtracted).
+A term is one continuous tenure from presidents.PRESIDENTIAL_TERMS, so Grover Cleveland's
+two terms are separate cells. Rebuild or query the cube from the command line:
+
+    python sentiment_cube.py rebuild
+    python sentiment_cube.py rollup --by party decade
+"""
+import argparse
+import json
+import os
+import sqlite3
+import pandas as pd
+from presidents import PRESIDENT_TO_PARTY, term_of
+from speech_store import ANALYZED, load_speeches, source_path
+
+# --- START: CONFIGURATION ---
+CUBE_PATH = 'sentiment_cube.sqlite'
+SCORE_COLUMN = 'sentiment_score'
+# --- END: CONFIGURATION ---
+
+DIMENSIONS = ['president', 'party', 'year', 'term']
+# Derived from 'year' at rollup time
+DERIVED_DIMENSIONS = ['decade']
+# Stored in place of a missing value, since NULLs do not compare equal in SQLite keys
+MISSING = {'president': '', 'party': '', 'year': 0, 'term': ''}
+# Two-sided 95% quantile of the normal distribution
+Z_95 = 1.959963984540054
+
+def _fingerprint(table):
+    path = source_path(table)
+    stat = os.stat(path)
+    return {'source': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def cube_rows(df):
+    """
+    One ledger row per scored speech of df: key, the cell dimensions and the score.
+    The key is the doc_name plus its occurrence number, as doc_names are not guaranteed unique.
+    """
+    df = df[df[SCORE_COLUMN].notna()]
+    doc_names = df['doc_name'].astype(str)
+    presidents = df['president'].astype(object).where(df['president'].notna(), None)
+    years = pd.to_datetime(df['date'], errors='coerce').dt.year
+
+    rows = pd.DataFrame({
+        'key': doc_names + '#' + doc_names.groupby(doc_names).cumcount().astype(str),
+        'president': presidents.fillna(MISSING['president']),
+        'party': presidents.map(PRESIDENT_TO_PARTY).fillna(MISSING['party']),
+        'year': years.fillna(MISSING['year']).astype(int),
+        'score': df[SCORE_COLUMN].astype(float),
+    })
+    rows['term'] = [(term_of(president, year) or MISSING['term']) if year != MISSING['year'] else MISSING['term']
+                    for president, year in zip(rows['president'], rows['year'])]
+    return rows[['key'] + DIMENSIONS + ['score']].reset_index(drop=True)
+
+class SentimentCube:
+    """SQLite-backed cube of score aggregates, with the per-speech ledger it is maintained from."""
+
+    def __init__(self, path=CUBE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cells ("
+            " president TEXT NOT NULL, party TEXT NOT NULL, year INTEGER NOT NULL, term TEXT NOT NULL,"
+            " count INTEGER NOT NULL, sum REAL NOT NULL, sum_squares REAL NOT NULL,"
+            " min REAL NOT NULL, max REAL NOT NULL,"
+            " PRIMARY KEY (president, party, year, term))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS speeches ("
+            " key TEXT PRIMARY KEY,"
+            " president TEXT NOT NULL, party TEXT NOT NULL, year INTEGER NOT NULL, term TEXT NOT NULL,"
+            " score REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS speeches_cell ON speeches (president, party, year, term)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.commit()
+
+    def ledger(self):
+        return pd.read_sql_query("SELECT key, president, party, year, term, score FROM speeches", self.conn)
+
+    def update(self, df):
+        """
+        Brings the cube in line with df (the full current table: doc_name, president, date and
+        the score). Returns the number of speeches added, changed and removed.
+        """
+        new = cube_rows(df)
+        old = self.ledger()
+        merged = old.merge(new, on='key', how='outer', suffixes=('_old', ''), indicator=True)
+        same = (merged['_merge'] == 'both')
+        for column in DIMENSIONS + ['score']:
+            same &= merged[column + '_old'] == merged[column]
+        removed = merged['_merge'] == 'left_only'
+        added = merged['_merge'] == 'right_only'
+        changed = (merged['_merge'] == 'both') & ~same
+
+        retracted = merged.loc[removed | changed, ['key'] + [column + '_old' for column in DIMENSIONS]]
+        retracted.columns = ['key'] + DIMENSIONS
+        inserted = merged.loc[added | changed, ['key'] + DIMENSIONS + ['score']]
+        inserted = inserted.astype({'year': int})
+        retracted = retracted.astype({'year': int})
+
+        with self.conn:
+            self.conn.executemany("DELETE FROM speeches WHERE key = ?", [(key,) for key in retracted['key']])
+            self.conn.executemany("INSERT INTO speeches VALUES (?, ?, ?, ?, ?, ?)",
+                                  inserted.itertuples(index=False, name=None))
+
+            # Cells that lost a speech are recomputed from the ledger
+            touched = retracted[DIMENSIONS].drop_duplicates()
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS touched (president, party, year, term)")
+            self.conn.execute("DELETE FROM touched")
+            self.conn.executemany("INSERT INTO touched VALUES (?, ?, ?, ?)", touched.itertuples(index=False, name=None))
+            self.conn.execute("DELETE FROM cells WHERE (president, party, year, term) IN (SELECT * FROM touched)")
+            self.conn.execute(
+                "INSERT INTO cells SELECT s.president, s.party, s.year, s.term,"
+                " COUNT(*), SUM(s.score), SUM(s.score * s.score), MIN(s.score), MAX(s.score)"
+                " FROM speeches s JOIN touched t USING (president, party, year, term)"
+                " GROUP BY s.president, s.party, s.year, s.term"
+            )
+
+            # The other cells only gained speeches, which are folded in
+            is_touched = inserted[DIMENSIONS].merge(touched, how='left', indicator=True)['_merge'].eq('both').to_numpy()
+            folded = inserted[~is_touched].assign(score_squared=lambda rows: rows['score'] ** 2)
+            partials = folded.groupby(DIMENSIONS, sort=False).agg(
+                count=('score', 'size'), sum=('score', 'sum'), sum_squares=('score_squared', 'sum'),
+                min=('score', 'min'), max=('score', 'max')).reset_index()
+            self.conn.executemany(
+                "INSERT INTO cells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (president, party, year, term) DO UPDATE SET"
+                " count = count + excluded.count, sum = sum + excluded.sum,"
+                " sum_squares = sum_squares + excluded.sum_squares,"
+                " min = MIN(min, excluded.min), max = MAX(max, excluded.max)",
+                [(president, party, int(year), term, int(count), float(total), float(squares), float(low), float(high))
+                 for president, party, year, term, count, total, squares, low, high
+                 in partials.itertuples(index=False, name=None)]
+            )
+        return {'added': int(added.sum()), 'changed': int(changed.sum()), 'removed': int(removed.sum())}
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM cells")
+            self.conn.execute("DELETE FROM speeches")
+            self.conn.execute("DELETE FROM meta")
+
+    def sync(self, table=ANALYZED, df=None, rebuild=False):
+        """
+        Updates the cube from a table written by save_speeches when the table changed since the
+        last sync. df, when given, is the table's current content and saves reading it again.
+        Returns the counts of update(), or None when the cube was already current.
+        """
+        fingerprint = _fingerprint(table)
+        if rebuild:
+            self.clear()
+        else:
+            row = self.conn.execute("SELECT value FROM meta WHERE name = 'source'").fetchone()
+            if row is not None and json.loads(row[0]) == fingerprint:
+                return None
+        if df is None:
+            df = load_speeches(table, columns=['doc_name', 'president', 'date', SCORE_COLUMN])
+        changes = self.update(df)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (json.dumps(fingerprint),))
+        return changes
+
+    def cells(self):
+        """Every cell of the cube, with missing dimension values as NA."""
+        cells = pd.read_sql_query("SELECT * FROM cells", self.conn)
+        for column, missing in MISSING.items():
+            cells[column] = cells[column].where(cells[column] != missing)
+        cells['year'] = cells['year'].astype('Int64')
+        return cells
+
+    def rollup(self, by=()):
+        """
+        Aggregates the cells over the dimensions in `by` (any of DIMENSIONS and 'decade').
+        Returns one row per group with count, sum, sum_squares, min, max, mean, variance
+        (sample), std and the bounds of the normal 95% confidence interval of the mean.
+        Groups with a missing dimension value are left out, like pandas' groupby.
+        """
+        by = list(by)
+        unknown = set(by) - set(DIMENSIONS) - set(DERIVED_DIMENSIONS)
+        if unknown:
+            raise ValueError(f"unknown dimensions: {', '.join(sorted(unknown))}")
+
+        cells = self.cells()
+        if 'decade' in by:
+            cells['decade'] = cells['year'] // 10 * 10
+        measures = {'count': 'sum', 'sum': 'sum', 'sum_squares': 'sum', 'min': 'min', 'max': 'max'}
+        if by:
+            rolled = cells.groupby(by, observed=True).agg(measures).reset_index()
+        else:
+            rolled = cells.agg(measures).to_frame().T.astype({'count': int})
+
+        count = rolled['count'].astype(float)
+        rolled['mean'] = rolled['sum'] / count
+        rolled['variance'] = ((rolled['sum_squares'] - rolled['sum'] ** 2 / count) / (count - 1)).clip(lower=0)
+        rolled.loc[count < 2, 'variance'] = float('nan')
+        rolled['std'] = rolled['variance'] ** 0.5
+        margin = Z_95 * rolled['std'] / count ** 0.5
+        rolled['ci95_low'] = rolled['mean'] - margin
+        rolled['ci95_high'] = rolled['mean'] + margin
+        return rolled
+
+    def close(self):
+        self.conn.close()
+
+def load_cube(table=ANALYZED, path=CUBE_PATH, rebuild=False):
+    """
+    Opens the cube and syncs it with the table first when the table changed.
+    Raises FileNotFoundError when the table does not exist.
+    """
+    cube = SentimentCube(path)
+    cube.sync(table, rebuild=rebuild)
+    return cube
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain or query the sentiment aggregate cube.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild', help="rebuild the cube from the analyzed table")
+    rollup_parser = subparsers.add_parser('rollup', help="print the aggregates over some dimensions")
+    rollup_parser.add_argument('--by', nargs='*', default=['party'],
+                               choices=DIMENSIONS + DERIVED_DIMENSIONS)
+    args = parser.parse_args()
+
+    try:
+        cube = load_cube(rebuild=args.command == 'rebuild')
+    except FileNotFoundError as e:
+        print(f"Error: The file {e} was not found. Run 3_sentiment_analysis.py first.")
+        return
+    if args.command == 'rebuild':
+        cells = cube.cells()
+        print(f"Rebuilt the cube: {len(cells)} cells over {int(cells['count'].sum())} speeches.")
+    else:
+        rolled = cube.rollup(args.by)
+        columns = args.by + ['count', 'mean', 'std', 'ci95_low', 'ci95_high', 'min', 'max']
+        print(rolled[columns].to_string(index=False, float_format=lambda value: f"{value:.4f}"))
+    cube.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Bounded-memory summaries for the rhetorical analysis.
+
+SpaceSaving keeps the heavy hitters of a stream of items (n-grams) in a fixed number of
+counters; HyperLogLog estimates the number of distinct items (word types) from a fixed
+array of registers. Both take the same updates as the exact structures they replace
+(Counter.update / set |=) and can be built from an error bound:
+
+    ngrams = SpaceSaving.for_error(0.001)    # counts overestimated by at most 0.1% of the total
+    types = HyperLogLog.for_error(0.01)      # ~1% standard error on the distinct count
+"""
+import hashlib
+import heapq
+import math
+from collections.abc import Mapping
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitter summary (Metwally et al.) with weighted updates.
+    Every reported count overestimates the true one by at most total / capacity, and
+    every item more frequent than total / capacity is monitored.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.counts = {}
+        self.errors = {}
+        self.total = 0
+        # Min-heap of (count, insertion order, item); stale entries are skipped lazily
+        self._heap = []
+        self._pushes = 0
+
+    @classmethod
+    def for_error(cls, epsilon):
+        """Summary whose counts are within epsilon * total of the true counts."""
+        return cls(math.ceil(1 / epsilon))
+
+    def _push(self, item):
+        self._pushes += 1
+        heapq.heappush(self._heap, (self.counts[item], self._pushes, item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, order, key) for count, order, key in self._heap if self.counts.get(key) == count]
+            heapq.heapify(self._heap)
+
+    def _pop_min(self):
+        while True:
+            count, _, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return item, count
+
+    def add(self, item, count=1):
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            # Replace the smallest counter; its count becomes the new item's possible overestimate
+            evicted, minimum = self._pop_min()
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[item] = minimum + count
+            self.errors[item] = minimum
+        self._push(item)
+
+    def update(self, items):
+        """Adds a mapping of item -> count (a Counter, another summary) or an iterable of items."""
+        if isinstance(items, SpaceSaving):
+            items = items.counts
+        if isinstance(items, Mapping):
+            for item, count in items.items():
+                self.add(item, count)
+        else:
+            for item in items:
+                self.add(item)
+
+    def most_common(self, n=None):
+        ranked = sorted(self.counts.items(), key=lambda pair: pair[1], reverse=True)
+        return ranked if n is None else ranked[:n]
+
+    def max_error(self):
+        """Upper bound on the overestimate of any reported count."""
+        return self.total / self.capacity
+
+    def __len__(self):
+        return len(self.counts)
+
+class HyperLogLog:
+    """HyperLogLog distinct counter (Flajolet et al.) with the small-range correction."""
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    @classmethod
+    def for_error(cls, relative_error):
+        """Counter with about relative_error standard error (1.04 / sqrt(registers))."""
+        precision = math.ceil(math.log2((1.04 / relative_error) ** 2))
+        return cls(min(18, max(4, precision)))
+
+    def add(self, item):
+        digest = hashlib.blake2b(str(item).encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'big')
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, items):
+        if isinstance(items, HyperLogLog):
+            if items.precision != self.precision:
+                raise ValueError("cannot merge HyperLogLog counters of different precision")
+            self.registers = bytearray(max(a, b) for a, b in zip(self.registers, items.registers))
+        else:
+            for item in items:
+                self.add(item)
+
+    def __ior__(self, items):
+        self.update(items)
+        return self
+
+    def estimate(self):
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m * self.m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * self.m and zeros:
+            return self.m * math.log(self.m / zeros)
+        return raw
+
+    def standard_error(self):
+        return 1.04 / math.sqrt(self.m)
+
+    def __len__(self):
+        return int(round(self.estimate()))
@@ -0,0 +1,152 @@
+"""
+Per-speech cache shared by the pipeline stages.
+
+Every entry is keyed by stage, doc_name and a hash of the stage's input (the transcript
+for preprocessing, the processed text for sentiment scoring) together with the stage's
+configuration. doc_names are not guaranteed unique, so two speeches sharing one keep an
+entry each. A stage only recomputes the speeches whose hash changed and merges the rest
+from the cache. Each stage keeps at most MAX_ENTRIES_PER_STAGE
+entries; the least recently used ones are evicted first.
+
+Clear one stage or all of them from the command line:
+
+    python speech_cache.py clear --stage preprocess
+    python speech_cache.py clear --stage all
+    python speech_cache.py stats
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+
+# --- START: CONFIGURATION ---
+CACHE_PATH = 'speech_cache.sqlite'
+MAX_ENTRIES_PER_STAGE = 100000
+# --- END: CONFIGURATION ---
+
+STAGES = ('preprocess', 'sentiment', 'segments', 'rhetoric')
+# doc_names per SELECT in get_many (SQLite limits the number of bound parameters)
+LOOKUP_BATCH_SIZE = 500
+# Bumped when the table layout changes; an older cache is dropped and rebuilt
+SCHEMA_VERSION = 2
+
+def content_hash(text, config):
+    """Hashes a stage input together with the stage configuration that produced the result."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(config, sort_keys=True).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(text.encode('utf-8') if isinstance(text, str) else b'')
+    return digest.hexdigest()
+
+class SpeechCache:
+    """SQLite-backed store of per-speech stage results with LRU eviction."""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES_PER_STAGE):
+        self.path = path
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Version 1 was keyed by (stage, doc_name) only
+            self.conn.execute("DROP TABLE IF EXISTS entries")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " stage TEXT NOT NULL,"
+            " doc_name TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (stage, doc_name, content_hash))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (stage, last_used)")
+        self.conn.commit()
+
+    def get_many(self, stage, keys):
+        """
+        Looks up many speeches at once. `keys` are (doc_name, current content hash) pairs.
+        Returns {(doc_name, content_hash): value} for the pairs that are cached.
+        """
+        hits = {}
+        wanted = set(keys)
+        doc_names = sorted({doc_name for doc_name, _ in wanted})
+        # Only the requested rows are read, so a stage can look its speeches up chunk by chunk
+        for i in range(0, len(doc_names), LOOKUP_BATCH_SIZE):
+            batch = doc_names[i:i + LOOKUP_BATCH_SIZE]
+            rows = self.conn.execute(
+                "SELECT doc_name, content_hash, value FROM entries"
+                f" WHERE stage = ? AND doc_name IN ({', '.join('?' * len(batch))})", [stage] + batch
+            )
+            for doc_name, stored_hash, value in rows:
+                if (doc_name, stored_hash) in wanted:
+                    hits[doc_name, stored_hash] = json.loads(value)
+
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE entries SET last_used = ? WHERE stage = ? AND doc_name = ? AND content_hash = ?",
+            [(now, stage, doc_name, digest) for doc_name, digest in hits]
+        )
+        self.conn.commit()
+        return hits
+
+    def put_many(self, stage, items):
+        """Stores (doc_name, content_hash, value) triples, then evicts beyond the size bound."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO entries (stage, doc_name, content_hash, value, last_used) VALUES (?, ?, ?, ?, ?)",
+            [(stage, doc_name, digest, json.dumps(value), now) for doc_name, digest, value in items]
+        )
+        self.conn.commit()
+        self.evict(stage)
+
+    def evict(self, stage):
+        """Drops the least recently used entries of a stage beyond max_entries."""
+        count = self.conn.execute("SELECT COUNT(*) FROM entries WHERE stage = ?", (stage,)).fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM entries WHERE rowid IN ("
+                " SELECT rowid FROM entries WHERE stage = ? ORDER BY last_used LIMIT ?)",
+                (stage, excess)
+            )
+            self.conn.commit()
+        return max(excess, 0)
+
+    def clear(self, stage=None):
+        """Removes every entry of one stage, or of all stages when stage is None."""
+        if stage is None:
+            cursor = self.conn.execute("DELETE FROM entries")
+        else:
+            cursor = self.conn.execute("DELETE FROM entries WHERE stage = ?", (stage,))
+        self.conn.commit()
+        return cursor.rowcount
+
+    def stats(self):
+        """Returns {stage: number of cached speeches}."""
+        rows = self.conn.execute("SELECT stage, COUNT(*) FROM entries GROUP BY stage")
+        return dict(rows.fetchall())
+
+    def close(self):
+        self.conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the per-speech pipeline cache.")
+    parser.add_argument('--path', default=CACHE_PATH, help=f"cache database (default: {CACHE_PATH})")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    clear_parser = subparsers.add_parser('clear', help="invalidate cached results")
+    clear_parser.add_argument('--stage', choices=STAGES + ('all',), default='all')
+    subparsers.add_parser('stats', help="show how many speeches are cached per stage")
+    args = parser.parse_args()
+
+    cache = SpeechCache(args.path)
+    if args.command == 'clear':
+        removed = cache.clear(None if args.stage == 'all' else args.stage)
+        print(f"Removed {removed} cached entries ({args.stage}).")
+    else:
+        stats = cache.stats()
+        for stage in STAGES:
+            print(f"{stage}: {stats.get(stage, 0)} speeches")
+    cache.close()
+
+if __name__ == '__main__':
+    main()
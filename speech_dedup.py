@@ -0,0 +1,329 @@
+"""
+Near-duplicate detection for the downloaded speeches.
+
+The Miller Center feed repeats some transcripts: reissued remarks, or the same address
+under another title. Left in, they are lemmatized, scored, topic-modeled and counted more
+than once, which skews the per-president figures. This stage runs between
+1_download_mc_speeches.py and 2_preprocessing_speeches.py and writes a duplicate map:
+
+    python speech_dedup.py                      # speeches.json -> duplicates.json
+    python speech_dedup.py --threshold 0.9 --input speeches.ndjson
+
+Every transcript becomes the set of its word shingles (SHINGLE_SIZE consecutive words),
+and every set a MinHash signature: the minimum of NUM_PERM hash functions over the set.
+Two signatures agree at a position with probability equal to the Jaccard similarity of the
+two sets. LSH cuts the signatures into bands of rows, and only speeches that agree on a
+whole band become candidate pairs, so the work grows with the number of speeches instead
+of the number of pairs. The band layout is chosen for the threshold. The exact Jaccard
+similarity of every candidate pair is then checked, and the pairs at or above the
+threshold are grouped. Each group keeps its first speech in the input, and the others are
+listed in the map with the speech they duplicate.
+
+2_preprocessing_speeches.py leaves the listed speeches out, so no later stage sees them.
+The map records the size, modification time and content hash of the input and is refused
+once the input changes.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import zlib
+import numpy as np
+import instrumentation
+from instrumentation import count, timer
+from speech_stream import iter_speeches
+
+# --- START: CONFIGURATION ---
+INPUT_PATH = 'speeches.json'
+DUPLICATES_PATH = 'duplicates.json'
+TEXT_KEY = 'transcript'
+DOC_NAME_KEY = 'doc_name'
+TITLE_KEY = 'title'
+# Jaccard similarity of the shingle sets from which two speeches are duplicates
+THRESHOLD = 0.8
+# Words per shingle
+SHINGLE_SIZE = 5
+# Hash functions per MinHash signature
+NUM_PERM = 128
+SEED = 1
+# How much worse a lost pair is than a false candidate when choosing the LSH bands. Every
+# candidate is checked exactly, so false candidates only cost time.
+FALSE_NEGATIVE_WEIGHT = 20
+# --- END: CONFIGURATION ---
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Largest number of (shingle, hash function) values computed at a time
+BLOCK_VALUES = 1 << 22
+_SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_EMPTY = np.iinfo(np.uint32).max
+
+def _mix(x):
+    """splitmix64 finalizer: spreads the bits of every uint64 in x."""
+    with np.errstate(over='ignore'):
+        x = x ^ (x >> np.uint64(30))
+        x = x * np.uint64(0xBF58476D1CE4E5B9)
+        x = x ^ (x >> np.uint64(27))
+        x = x * np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+def shingle_hashes(text, size=SHINGLE_SIZE, word_hashes=None):
+    """
+    Sorted, unique 64-bit hashes of the shingles of a transcript: every run of `size` words,
+    lowercased and without punctuation. A text shorter than `size` words is one shingle.
+    word_hashes caches the hash of every word seen so far.
+    """
+    if not isinstance(text, str):
+        return np.empty(0, dtype=np.uint64)
+    if word_hashes is None:
+        word_hashes = {}
+    words = WORD_PATTERN.findall(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    ids = np.array([word_hashes[word] if word in word_hashes
+                    else word_hashes.setdefault(word, zlib.crc32(word.encode('utf-8')))
+                    for word in words], dtype=np.uint64)
+    size = min(size, len(ids))
+    shingles = np.zeros(len(ids) - size + 1, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for offset in range(size):
+            shingles = shingles * _SHINGLE_MULTIPLIER + ids[offset:offset + len(shingles)]
+    return np.unique(_mix(shingles))
+
+class ShingleSets:
+    """The shingle hashes of a set of speeches, concatenated, with the offsets of each speech."""
+
+    def __init__(self, offsets, hashes):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+
+    @classmethod
+    def from_texts(cls, texts, size=SHINGLE_SIZE):
+        word_hashes = {}
+        sets = [shingle_hashes(text, size, word_hashes) for text in texts]
+        offsets = np.concatenate([[0], np.cumsum([len(hashes) for hashes in sets], dtype=np.int64)])
+        return cls(offsets, np.concatenate(sets) if sets else np.empty(0, dtype=np.uint64))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def get(self, i):
+        return self.hashes[self.offsets[i]:self.offsets[i + 1]]
+
+    def jaccard(self, i, j):
+        """Exact Jaccard similarity of the shingle sets of speeches i and j."""
+        first, second = self.get(i), self.get(j)
+        if not len(first) or not len(second):
+            return 0.0
+        shared = len(np.intersect1d(first, second, assume_unique=True))
+        return shared / (len(first) + len(second) - shared)
+
+def minhash_signatures(sets, num_perm=NUM_PERM, seed=SEED):
+    """
+    (speeches, num_perm) uint32 MinHash signatures. Hash function k is the multiply-shift
+    hash (a_k * x + b_k) >> 32 over the 64-bit shingle hashes, computed for all speeches
+    at once a block of functions at a time. Speeches without shingles get all-max rows.
+    """
+    rng = np.random.default_rng(seed)
+    multipliers = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    increments = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    filled = sets.counts > 0
+    signatures = np.full((len(sets), num_perm), _EMPTY, dtype=np.uint32)
+    if not filled.any():
+        return signatures
+    starts = sets.offsets[:-1][filled]
+    block = max(1, min(num_perm, BLOCK_VALUES // max(1, len(sets.hashes))))
+    buffer = np.empty((block, len(sets.hashes)), dtype=np.uint64)
+    for first in range(0, num_perm, block):
+        last = min(num_perm, first + block)
+        values = buffer[:last - first]
+        # In place, one contiguous row per function
+        with np.errstate(over='ignore'):
+            np.multiply(multipliers[first:last, None], sets.hashes, out=values)
+            np.add(values, increments[first:last, None], out=values)
+            np.right_shift(values, np.uint64(32), out=values)
+        signatures[filled, first:last] = np.minimum.reduceat(values, starts, axis=1).T
+    return signatures
+
+def lsh_params(threshold=THRESHOLD, num_perm=NUM_PERM, false_negative_weight=FALSE_NEGATIVE_WEIGHT):
+    """
+    (bands, rows) for LSH. A pair with similarity s becomes a candidate with probability
+    1 - (1 - s^rows)^bands. The layout minimizes the area of that curve below the threshold
+    (false candidates) plus false_negative_weight times the area above it that it misses
+    (lost pairs).
+    """
+    similarity = np.linspace(0, 1, 1001)
+    below = similarity < threshold
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        probability = 1 - (1 - similarity ** rows) ** bands
+        error = probability[below].sum() + false_negative_weight * (1 - probability[~below]).sum()
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+def candidate_pairs(signatures, bands, rows, mask=None):
+    """
+    Pairs (i, j), i < j, of speeches whose signatures agree on at least one band, as an
+    (n, 2) int64 array. Each band's rows are folded into one 64-bit key per speech, and
+    the speeches sharing a key are found by sorting; key collisions only add candidates.
+    Speeches outside mask (e.g. without shingles) are never candidates.
+    """
+    docs = np.arange(len(signatures)) if mask is None else np.flatnonzero(mask)
+    codes = []
+    with np.errstate(over='ignore'):
+        for band in range(bands):
+            keys = np.zeros(len(docs), dtype=np.uint64)
+            for column in range(band * rows, (band + 1) * rows):
+                keys = keys * _SHINGLE_MULTIPLIER + signatures[docs, column].astype(np.uint64)
+            keys = _mix(keys)
+            order = np.argsort(keys, kind='stable')
+            ordered = keys[order]
+            run_starts = np.flatnonzero(np.concatenate([[True], ordered[1:] != ordered[:-1]]))
+            run_ends = np.concatenate([run_starts[1:], [len(ordered)]])
+            for start, end in zip(run_starts, run_ends):
+                if end - start > 1:
+                    members = np.sort(docs[order[start:end]])
+                    first, second = np.triu_indices(len(members), k=1)
+                    codes.append(members[first] * len(signatures) + members[second])
+    if not codes:
+        return np.empty((0, 2), dtype=np.int64)
+    codes = np.unique(np.concatenate(codes))
+    return np.column_stack([codes // len(signatures), codes % len(signatures)])
+
+def find_duplicates(sets, threshold=THRESHOLD, num_perm=NUM_PERM, seed=SEED):
+    """
+    Groups the speeches whose shingle sets are at least `threshold` similar (directly or
+    through other members of the group). Returns ({duplicate: first speech of its group},
+    number of candidate pairs checked).
+    """
+    with timer('dedup.minhash'):
+        signatures = minhash_signatures(sets, num_perm, seed)
+    bands, rows = lsh_params(threshold, num_perm)
+    with timer('dedup.lsh'):
+        candidates = candidate_pairs(signatures, bands, rows, mask=sets.counts > 0)
+    count('candidate_pairs', len(candidates))
+
+    parent = {}
+
+    def root(i):
+        while parent.get(i, i) != i:
+            i = parent[i]
+        return i
+
+    with timer('dedup.verify'):
+        for i, j in candidates.tolist():
+            if sets.jaccard(i, j) >= threshold:
+                first, second = sorted((root(i), root(j)))
+                if first != second:
+                    parent[second] = first
+    return {i: root(i) for i in parent}, len(candidates)
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return {'source': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': _sha256(path)}
+
+def build_duplicate_map(path=INPUT_PATH, threshold=THRESHOLD, shingle_size=SHINGLE_SIZE, num_perm=NUM_PERM,
+                        seed=SEED):
+    """
+    Finds the near-duplicate speeches of a JSON array or NDJSON file, streamed one speech at
+    a time. Speeches are identified by their position in the file, as iter_speeches reads it.
+    """
+    names = []
+
+    def transcripts():
+        for speech in iter_speeches(path):
+            names.append((speech.get(DOC_NAME_KEY, 'Unknown'), speech.get(TITLE_KEY, 'Unknown')))
+            yield speech.get(TEXT_KEY, '')
+
+    with timer('dedup.shingle'):
+        sets = ShingleSets.from_texts(transcripts(), shingle_size)
+    count('docs', len(sets))
+    groups, candidates = find_duplicates(sets, threshold, num_perm, seed)
+    bands, rows = lsh_params(threshold, num_perm)
+    duplicates = []
+    for index, original in sorted(groups.items()):
+        if index != original:
+            duplicates.append({
+                'index': index, 'doc_name': names[index][0], 'title': names[index][1],
+                'duplicate_of': original, 'duplicate_of_doc_name': names[original][0],
+                'similarity': round(sets.jaccard(index, original), 4),
+            })
+    return {
+        **_fingerprint(path),
+        'speeches': len(sets),
+        'settings': {'threshold': threshold, 'shingle_size': shingle_size, 'num_perm': num_perm,
+                     'bands': bands, 'rows': rows, 'seed': seed},
+        'candidate_pairs': candidates,
+        'duplicates': duplicates,
+    }
+
+def save_duplicate_map(duplicate_map, path=DUPLICATES_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(duplicate_map, f, indent=2)
+
+def load_duplicates(source=INPUT_PATH, path=DUPLICATES_PATH):
+    """
+    {position in source: duplicate entry} of the speeches to leave out, empty when there is
+    no duplicate map. Raises ValueError when the map was built from another version of source.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        duplicate_map = json.load(f)
+    stat = os.stat(source)
+    # The content is only hashed again when the file was touched since the map was built
+    current = (duplicate_map.get('size') == stat.st_size
+               and (duplicate_map.get('mtime_ns') == stat.st_mtime_ns or duplicate_map.get('sha256') == _sha256(source)))
+    if not current:
+        raise ValueError(f"{path} was built from another version of {source}, run speech_dedup.py again")
+    return {entry['index']: entry for entry in duplicate_map['duplicates']}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find near-duplicate transcripts with MinHash and LSH.")
+    parser.add_argument('--input', default=INPUT_PATH,
+                        help=f"speeches as a JSON array or NDJSON (default: {INPUT_PATH})")
+    parser.add_argument('--output', default=DUPLICATES_PATH)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help=f"Jaccard similarity of the shingle sets from which speeches are duplicates "
+                             f"(default: {THRESHOLD})")
+    parser.add_argument('--shingle-size', type=int, default=SHINGLE_SIZE,
+                        help=f"words per shingle (default: {SHINGLE_SIZE})")
+    parser.add_argument('--num-perm', type=int, default=NUM_PERM,
+                        help=f"hash functions per MinHash signature (default: {NUM_PERM})")
+    instrumentation.add_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    instrumentation.setup(args, stage='dedup')
+    if not os.path.exists(args.input):
+        print(f"Error: The file {args.input} was not found.")
+        sys.exit()
+
+    duplicate_map = build_duplicate_map(args.input, args.threshold, args.shingle_size, args.num_perm)
+    save_duplicate_map(duplicate_map, args.output)
+    settings = duplicate_map['settings']
+    print(f"Compared {duplicate_map['speeches']} speeches: {duplicate_map['candidate_pairs']} candidate pairs "
+          f"from {settings['bands']} bands of {settings['rows']} rows.")
+    for entry in duplicate_map['duplicates']:
+        print(f"  {entry['doc_name']} duplicates {entry['duplicate_of_doc_name']} "
+              f"(similarity {entry['similarity']:.2f})")
+    print(f"{len(duplicate_map['duplicates'])} near-duplicate speeches listed in '{args.output}'. "
+          f"2_preprocessing_speeches.py will leave them out.")
+
+if __name__ == '__main__':
+    main()
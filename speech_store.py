@@ -0,0 +1,248 @@
+"""
+Columnar storage for the tables the pipeline stages hand to each other.
+
+Every table is written as Parquet (president as a categorical, date as a datetime)
+and, for compatibility, as the CSV file the scripts always produced. Readers ask
+for the columns they need and only those are read from disk:
+
+    df = load_speeches(ANALYZED, columns=['president', 'sentiment_score'])
+
+Next to the two files, <name>.meta.json records which of them was written last and the
+size, mtime and checksum each had then, so the choice does not depend on file times that
+copies and checkouts reshuffle. When the Parquet file is missing, was not written last, the
+CSV changed since, or pyarrow is not installed, the CSV is read instead (still limited to
+the requested columns).
+
+Stages that produce a table chunk by chunk write it with a SpeechWriter instead, which
+appends every chunk to both files as it arrives (one Parquet row group per chunk):
+
+    with SpeechWriter(PREPROCESSED, columns) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+
+After share_tables(), load_speeches keeps the columns it read in memory for later calls in
+the same process, as long as the file does not change.
+"""
+import hashlib
+import json
+import os
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAVE_PARQUET = True
+except ImportError:
+    HAVE_PARQUET = False
+
+# Table names, shared by the writing and the reading stages
+PREPROCESSED = 'preprocessed_speeches'
+ANALYZED = 'analyzed_speeches'
+
+CATEGORICAL_COLUMNS = ['president']
+DATE_COLUMNS = ['date']
+
+# Columns read so far, by file: {path: ((size, mtime_ns), {column: Series})}; see share_tables
+_shared_columns = None
+
+def csv_path(name):
+    return f'{name}.csv'
+
+def parquet_path(name):
+    return f'{name}.parquet'
+
+def meta_path(name):
+    return f'{name}.meta.json'
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _stamp(path):
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': _sha256(path)}
+
+def _unchanged(path, stamp):
+    """Whether path is still the file stamp describes; the content is only hashed again when it was touched."""
+    if stamp is None or not os.path.exists(path):
+        return stamp is None and not os.path.exists(path)
+    stat = os.stat(path)
+    return stat.st_size == stamp['size'] and (stat.st_mtime_ns == stamp['mtime_ns'] or _sha256(path) == stamp['sha256'])
+
+def _record_written(name, last):
+    """Records that the `last` format ('parquet' or 'csv') of the table was written last."""
+    record = {'written_last': last, 'csv': _stamp(csv_path(name)), 'parquet': _stamp(parquet_path(name))}
+    with open(meta_path(name) + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    os.replace(meta_path(name) + '.tmp', meta_path(name))
+
+def to_columnar(df):
+    """Returns a copy of df with the categorical and date columns typed."""
+    df = df.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+    return df
+
+def save_speeches(df, name, write_csv=True):
+    """Writes a table as Parquet and, unless write_csv is False, as CSV. Returns the paths written."""
+    written = []
+    if write_csv or not HAVE_PARQUET:
+        df.to_csv(csv_path(name), index=False)
+        written.append(csv_path(name))
+    if HAVE_PARQUET:
+        to_columnar(df).to_parquet(parquet_path(name), index=False)
+        written.insert(0, parquet_path(name))
+    _record_written(name, 'parquet' if HAVE_PARQUET else 'csv')
+    return written
+
+class SpeechWriter:
+    """
+    Writes a table in chunks, as Parquet and, unless write_csv is False, as CSV. The files are
+    written under a temporary name and only replace the previous table when the writer is
+    closed without an error. `written` lists the paths of the table once closed.
+    """
+
+    def __init__(self, name, columns, write_csv=True):
+        self.name = name
+        self.columns = list(columns)
+        self.paths = []
+        if HAVE_PARQUET:
+            self.paths.append(parquet_path(name))
+        if write_csv or not HAVE_PARQUET:
+            self.paths.append(csv_path(name))
+        self.written = []
+        self.rows = 0
+        self._parquet = None
+        self._schema = None
+        self._csv = None
+
+    def _parquet_schema(self, table):
+        """Schema of the first chunk, with types every later chunk can be cast to."""
+        fields = []
+        for field in table.schema:
+            # Categories and all-missing columns vary from chunk to chunk
+            if pa.types.is_dictionary(field.type):
+                field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+            elif pa.types.is_null(field.type):
+                field = field.with_type(pa.string())
+            fields.append(field)
+        return pa.schema(fields, metadata=table.schema.metadata)
+
+    def write(self, df):
+        """Appends a chunk with the writer's columns."""
+        df = df[self.columns]
+        if parquet_path(self.name) in self.paths:
+            if self._parquet is None:
+                table = pa.Table.from_pandas(to_columnar(df), preserve_index=False)
+                self._schema = self._parquet_schema(table)
+                self._parquet = pq.ParquetWriter(parquet_path(self.name) + '.tmp', self._schema)
+            self._parquet.write_table(pa.Table.from_pandas(to_columnar(df), schema=self._schema, preserve_index=False))
+        if csv_path(self.name) in self.paths:
+            if self._csv is None:
+                self._csv = open(csv_path(self.name) + '.tmp', 'w', encoding='utf-8', newline='')
+                df.to_csv(self._csv, index=False)
+            else:
+                df.to_csv(self._csv, index=False, header=False)
+        self.rows += len(df)
+
+    def close(self):
+        if self.rows == 0:
+            # Still produce a table with the header only
+            self.write(pd.DataFrame(columns=self.columns))
+        if self._csv is not None:
+            self._csv.close()
+        if self._parquet is not None:
+            self._parquet.close()
+        for path in self.paths:
+            os.replace(path + '.tmp', path)
+        _record_written(self.name, 'parquet' if parquet_path(self.name) in self.paths else 'csv')
+        self.written = list(self.paths)
+
+    def abort(self):
+        for handle in (self._parquet, self._csv):
+            if handle is not None:
+                handle.close()
+        for path in self.paths:
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+def _parquet_is_current(name):
+    if not HAVE_PARQUET or not os.path.exists(parquet_path(name)):
+        return False
+    if not os.path.exists(csv_path(name)):
+        return True
+    if not os.path.exists(meta_path(name)):
+        # Written before the record existed: the CSV is always there and current
+        return False
+    with open(meta_path(name), 'r', encoding='utf-8') as f:
+        record = json.load(f)
+    # A file that changed since the record was written is newer than the other one
+    if record.get('written_last') == 'parquet':
+        return _unchanged(csv_path(name), record.get('csv'))
+    return not _unchanged(parquet_path(name), record.get('parquet'))
+
+def source_path(name):
+    """Returns the file load_speeches would read for a table (Parquet or CSV)."""
+    return parquet_path(name) if _parquet_is_current(name) else csv_path(name)
+
+def _read_columns(name, columns):
+    if _parquet_is_current(name):
+        return pd.read_parquet(parquet_path(name), columns=columns)
+    if not os.path.exists(csv_path(name)):
+        raise FileNotFoundError(f"{parquet_path(name)} / {csv_path(name)}")
+    return to_columnar(pd.read_csv(csv_path(name), usecols=columns))
+
+def _table_columns(name):
+    if _parquet_is_current(name):
+        return [column for column in pq.read_schema(parquet_path(name)).names if not column.startswith('__index_level')]
+    return list(pd.read_csv(csv_path(name), nrows=0).columns)
+
+def share_tables(enabled=True):
+    """
+    Keeps every column load_speeches reads in memory, so the next stage running in the same
+    process (see run_pipeline.py) gets it without going back to disk. A column is read again
+    once its file changed. Callers still get their own copy of the columns.
+    """
+    global _shared_columns
+    _shared_columns = {} if enabled else None
+
+def load_speeches(name, columns=None):
+    """
+    Loads a table written by save_speeches, reading only `columns` (all when None).
+    Raises FileNotFoundError when neither the Parquet nor the CSV file exists.
+    """
+    if _shared_columns is None:
+        return _read_columns(name, columns)
+    path = source_path(name)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{parquet_path(name)} / {csv_path(name)}")
+
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    if path not in _shared_columns or _shared_columns[path][0] != stamp:
+        _shared_columns[path] = (stamp, {})
+    shared = _shared_columns[path][1]
+    columns = list(columns) if columns is not None else _table_columns(name)
+    missing = [column for column in columns if column not in shared]
+    if missing:
+        shared.update(_read_columns(name, missing).items())
+    return pd.DataFrame({column: shared[column] for column in columns}).copy()
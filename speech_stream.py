@@ -0,0 +1,105 @@
+"""
+Incremental readers for the downloaded speeches.
+
+`iter_speeches` yields one speech dict at a time from either format written by
+1_download_mc_speeches.py: the JSON array in speeches.json or the NDJSON store in
+speeches.ndjson (one speech per line). Only the speech being decoded and a read buffer
+are held in memory, so the cost of reading does not grow with the corpus:
+
+    for speech in iter_speeches('speeches.json'):
+        ...
+
+`chunked` groups any iterable into lists of a fixed size for stages that work in batches.
+"""
+import itertools
+import json
+
+# --- START: CONFIGURATION ---
+# Characters read from the file at a time
+READ_SIZE = 1 << 16
+# --- END: CONFIGURATION ---
+
+_decoder = json.JSONDecoder()
+
+def _first_char(f):
+    """Skips leading whitespace and returns the first significant character ('' at end of file)."""
+    while True:
+        char = f.read(1)
+        if not char or not char.isspace():
+            return char
+
+def _iter_array(f, read_size):
+    """Yields the elements of a JSON array whose opening '[' was already consumed."""
+    buffer = ''
+    pos = 0
+    eof = False
+    while True:
+        # Skip the separators between elements
+        while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ','):
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        if pos < len(buffer):
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # A number is only complete once the ',' or ']' after it was read: one cut by the
+                # read ("1." of "1.5", "2e" of "2e3") decodes as a shorter number
+                after = end
+                if isinstance(item, (int, float)) and not isinstance(item, bool):
+                    while after < len(buffer) and buffer[after].isspace():
+                        after += 1
+                    complete = after < len(buffer) and buffer[after] in ',]'
+                else:
+                    complete = True
+                if complete or eof:
+                    yield item
+                    pos = end
+                    continue
+        elif eof:
+            raise json.JSONDecodeError("unterminated array", buffer, pos)
+
+        # The next element is not complete yet: drop what was consumed and read more.
+        # Reads grow with the buffer so a long transcript is not decoded over and over.
+        buffer = buffer[pos:]
+        pos = 0
+        more = f.read(max(read_size, len(buffer)))
+        eof = not more
+        buffer += more
+
+def _iter_ndjson(first, f):
+    """Yields the speech of every line, skipping blank lines and lines cut short by an interrupted download."""
+    for line in itertools.chain([first + f.readline()], f):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+def iter_speeches(path, read_size=READ_SIZE):
+    """
+    Yields the speeches of a JSON array or NDJSON file one at a time, without loading the file.
+    Raises FileNotFoundError when the file does not exist and json.JSONDecodeError on a malformed array.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        first = _first_char(f)
+        if first == '[':
+            yield from _iter_array(f, read_size)
+        elif first:
+            yield from _iter_ndjson(first, f)
+
+def chunked(items, size):
+    """Yields lists of up to `size` consecutive items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
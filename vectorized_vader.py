@@ -0,0 +1,278 @@
+"""
+VADER scoring with NumPy array operations over tokenized speeches.
+
+vaderSentiment's polarity_scores walks every text token by token in Python, and several of
+its rules rebuild the lowercased word list for every lexicon word, so long texts get slower
+per word. VectorizedVader applies the same rules to a whole batch at once:
+
+- every text is split into vocabulary ids once (or an existing tokenization such as the
+  shared document-term matrix is used as is), and the lexicon valence, booster value,
+  negation flag and capitalization of every vocabulary term are looked up once per term;
+- the rules that look at the words around a lexicon word (boosters, negations, "no",
+  "least", idioms, "kind of") are masks over the token arrays shifted by 1 to 3 positions,
+  applied in the same order as VADER so the arithmetic is the same;
+- the "but" rule, the sums and the pos/neg/neu ratios are per-text bincounts.
+
+    engine = VectorizedVader()
+    scores = engine.score_texts(texts)      # (len(texts), 4): neg, neu, pos, compound
+    scores = engine.score_dtm(load_dtm())   # the shared vocabulary ids, no tokenizing at all
+
+The scores match polarity_scores, with one deliberate difference. VADER's "but" rule
+finds the token to rescale with list.index(value), which hits the wrong token when an
+earlier token already has the same score; here every token before the first "but" is
+halved and every token after it gets 1.5 times its score.
+misc/benchmark_sentiment_engines.py measures the difference on the sample corpus.
+"""
+import string
+import numpy as np
+
+SCORE_KEYS = ['neg', 'neu', 'pos', 'compound']
+
+# Words the rules compare the neighbours of a lexicon word with
+RULE_WORDS = ['no', 'or', 'nor', 'never', 'so', 'this', 'without', 'doubt', 'least', 'at', 'very', 'but',
+              'kind', 'of']
+
+def _punctuation_amplifier(exclamations, questions):
+    """VADER's emphasis for '!' (up to 4) and for two or more '?'."""
+    amplifier = np.minimum(exclamations, 4) * 0.292
+    return amplifier + np.where(questions > 3, 0.96, np.where(questions > 1, questions * 0.18, 0.0))
+
+class VectorizedVader:
+    """VADER's lexicon and rules, applied to token-id arrays."""
+
+    def __init__(self):
+        from vaderSentiment import vaderSentiment as vader
+
+        self.vader = vader
+        self.lexicon = vader.SentimentIntensityAnalyzer().lexicon
+        emojis = {emoji: description for emoji, description in vader.SentimentIntensityAnalyzer().emojis.items()
+                  if len(emoji) == 1}
+        # Like VADER, a space before the description and none after: "😀?" is "grinning face?"
+        self.emoji_table = str.maketrans({emoji: f" {description}" for emoji, description in emojis.items()})
+        self.emojis = frozenset(emojis)
+
+        # Two- and three-word patterns of the idiom and booster rules, as tuples of rule-word codes
+        phrases = [key.split() for key in list(vader.SPECIAL_CASES) + list(vader.BOOSTER_DICT)]
+        words = RULE_WORDS + sorted({word for phrase in phrases for word in phrase} - set(RULE_WORDS))
+        self.codes = {word: code for code, word in enumerate(words, start=1)}
+        self.special_cases = [(tuple(self.codes[w] for w in key.split()), value)
+                              for key, value in vader.SPECIAL_CASES.items() if len(key.split()) > 1]
+        self.booster_phrases = [(tuple(self.codes[w] for w in key.split()), value)
+                                for key, value in vader.BOOSTER_DICT.items() if len(key.split()) > 1]
+
+    def term_features(self, vocab):
+        """Looks up everything the rules need about each vocabulary term, once per term."""
+        n = len(vocab)
+        features = {
+            'valence': np.zeros(n), 'in_lexicon': np.zeros(n, dtype=bool),
+            'booster': np.zeros(n), 'is_booster': np.zeros(n, dtype=bool),
+            'negation': np.zeros(n, dtype=bool), 'upper': np.zeros(n, dtype=bool),
+            'code': np.zeros(n, dtype=np.int32),
+        }
+        negate = set(self.vader.NEGATE)
+        for i, term in enumerate(vocab):
+            # VADER strips the punctuation around a word unless that leaves two characters or less
+            stripped = term.strip(string.punctuation)
+            word = stripped if len(stripped) > 2 else term
+            lower = word.lower()
+            if lower in self.lexicon:
+                features['valence'][i] = self.lexicon[lower]
+                features['in_lexicon'][i] = True
+            if lower in self.vader.BOOSTER_DICT:
+                features['booster'][i] = self.vader.BOOSTER_DICT[lower]
+                features['is_booster'][i] = True
+            features['negation'][i] = lower in negate or "n't" in lower
+            features['upper'][i] = word.isupper()
+            features['code'][i] = self.codes.get(lower, 0)
+        return features
+
+    def tokenize(self, texts):
+        """
+        Splits texts like VADER (emojis replaced by their description, whitespace split) into
+        vocabulary ids. Returns (vocab, tokens, offsets, '!' counts, '?' counts).
+        """
+        vocab = {}
+        tokens = []
+        offsets = [0]
+        exclamations = []
+        questions = []
+        for text in texts:
+            if isinstance(text, str):
+                if not self.emojis.isdisjoint(text):
+                    text = text.translate(self.emoji_table)
+                tokens.extend(vocab.setdefault(token, len(vocab)) for token in text.split())
+                exclamations.append(text.count('!'))
+                questions.append(text.count('?'))
+            else:
+                exclamations.append(0)
+                questions.append(0)
+            offsets.append(len(tokens))
+        return (list(vocab), np.asarray(tokens, dtype=np.int64), np.asarray(offsets, dtype=np.int64),
+                np.asarray(exclamations), np.asarray(questions))
+
+    def score_texts(self, texts):
+        """Scores a batch of texts. Returns a (len(texts), 4) array of neg, neu, pos, compound."""
+        vocab, tokens, offsets, exclamations, questions = self.tokenize(texts)
+        return self.score_tokens(vocab, tokens, offsets, exclamations, questions)
+
+    def score_dtm(self, dtm):
+        """Scores every row of a document-term matrix (see dtm_store) from its token stream."""
+        return self.score_tokens(dtm.vocab, dtm.tokens, dtm.offsets)
+
+    def score_tokens(self, vocab, tokens, offsets, exclamations=None, questions=None):
+        """
+        Scores the texts given as vocabulary ids: text d is tokens[offsets[d]:offsets[d + 1]].
+        Returns a (number of texts, 4) array of neg, neu, pos, compound.
+        """
+        vader = self.vader
+        features = self.term_features(vocab)
+        tokens = np.asarray(tokens, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        n_docs = len(offsets) - 1
+        lengths = np.diff(offsets)
+        doc = np.repeat(np.arange(n_docs), lengths)
+        position = np.arange(len(tokens)) - offsets[:-1][doc]
+        remaining = lengths[doc] - position - 1
+
+        code = features['code'][tokens]
+        upper = features['upper'][tokens]
+        # Some but not all words of the text are in capitals
+        capitals = np.bincount(doc, weights=upper, minlength=n_docs)
+        cap_differential = (capitals > 0) & (capitals < lengths)
+
+        # Boosters, and "kind" followed by "of", are modifiers and score 0 themselves
+        kind_of = (code == self.codes['kind']) & (remaining >= 1)
+        kind_of[kind_of] = code[np.flatnonzero(kind_of) + 1] == self.codes['of']
+        lexicon_words = np.flatnonzero(features['in_lexicon'][tokens] & ~features['is_booster'][tokens] & ~kind_of)
+
+        def term_at(k):
+            """Term of the word k positions after every lexicon word (negative k: before), and whether it exists."""
+            exists = (position[lexicon_words] + k >= 0) & (k <= remaining[lexicon_words])
+            return tokens[np.where(exists, lexicon_words + k, 0)], exists
+
+        def code_at(k):
+            term, exists = term_at(k)
+            return np.where(exists, features['code'][term], 0)
+
+        def is_word(codes, *words):
+            return np.isin(codes, [self.codes[word] for word in words])
+
+        words_cap_diff = cap_differential[doc[lexicon_words]]
+        base = features['valence'][tokens[lexicon_words]]
+        c = {k: code_at(k) for k in (-3, -2, -1, 0, 1, 2)}
+
+        # "no" before another lexicon word negates it instead of counting itself
+        next_term, has_next = term_at(1)
+        valence = np.where((c[0] == self.codes['no']) & has_next & features['in_lexicon'][next_term], 0.0, base)
+        no_before = (is_word(c[-1], 'no') | is_word(c[-2], 'no')
+                     | (is_word(c[-3], 'no') & is_word(c[-1], 'or', 'nor')))
+        valence = np.where(no_before, base * vader.N_SCALAR, valence)
+        capitalized = upper[lexicon_words] & words_cap_diff
+        valence = np.where(capitalized, np.where(valence > 0, valence + vader.C_INCR, valence - vader.C_INCR), valence)
+
+        for start in range(3):
+            term, exists = term_at(-(start + 1))
+            applies = exists & ~features['in_lexicon'][term]
+
+            # Boosters and dampeners up to three words before, less the further they are
+            scalar = np.where(valence < 0, -features['booster'][term], features['booster'][term])
+            booster_caps = features['is_booster'][term] & features['upper'][term] & words_cap_diff
+            scalar = np.where(booster_caps, np.where(valence > 0, scalar + vader.C_INCR, scalar - vader.C_INCR), scalar)
+            if start == 1:
+                scalar = scalar * 0.95
+            elif start == 2:
+                scalar = scalar * 0.9
+            valence = np.where(applies, valence + scalar, valence)
+
+            negated = features['negation'][term]
+            if start == 0:
+                factor = np.where(negated, vader.N_SCALAR, 1.0)
+            elif start == 1:
+                emphasis = is_word(c[-2], 'never') & is_word(c[-1], 'so', 'this')
+                without_doubt = is_word(c[-2], 'without') & is_word(c[-1], 'doubt')
+                factor = np.where(emphasis, 1.25, np.where(~without_doubt & negated, vader.N_SCALAR, 1.0))
+            else:
+                emphasis = (is_word(c[-3], 'never') & is_word(c[-2], 'so', 'this')) | is_word(c[-1], 'so', 'this')
+                without_doubt = is_word(c[-3], 'without') & (is_word(c[-2], 'doubt') | is_word(c[-1], 'doubt'))
+                factor = np.where(emphasis, 1.25, np.where(~without_doubt & negated, vader.N_SCALAR, 1.0))
+            valence = np.where(applies, valence * factor, valence)
+
+            if start == 2:
+                valence = np.where(applies, self._idioms(valence, c, remaining[lexicon_words]), valence)
+
+        # "least" right before negates, unless it is "at least" or "very least"
+        term, exists = term_at(-1)
+        least = exists & ~features['in_lexicon'][term] & is_word(c[-1], 'least')
+        least &= (position[lexicon_words] == 1) | ~is_word(c[-2], 'at', 'very')
+        valence = np.where(least, valence * vader.N_SCALAR, valence)
+
+        sentiments = np.zeros(len(tokens))
+        sentiments[lexicon_words] = valence
+
+        # Contrastive "but": the words before the first one count half, the words after it 1.5 times
+        buts = np.flatnonzero(code == self.codes['but'])
+        first_but = np.full(n_docs, np.iinfo(np.int64).max)
+        np.minimum.at(first_but, doc[buts], position[buts])
+        before = position < first_but[doc]
+        after = (position > first_but[doc]) & (first_but[doc] < np.iinfo(np.int64).max)
+        sentiments = np.where(before & (first_but[doc] < np.iinfo(np.int64).max), sentiments * 0.5,
+                              np.where(after, sentiments * 1.5, sentiments))
+
+        return self._score_valence(sentiments, doc, lengths, exclamations, questions)
+
+    def _idioms(self, valence, c, remaining):
+        """VADER's special-case idioms and multi-word boosters around every lexicon word."""
+        # The first idiom ending at or just before the word wins
+        matched = np.zeros(len(valence), dtype=bool)
+        result = valence.copy()
+        for window in [(-1, 0), (-2, -1, 0), (-2, -1), (-3, -2, -1), (-3, -2)]:
+            for phrase, value in self.special_cases:
+                if len(phrase) != len(window):
+                    continue
+                hit = ~matched & np.logical_and.reduce([c[k] == word for k, word in zip(window, phrase)])
+                result[hit] = value
+                matched |= hit
+        # An idiom starting at the word overrides it
+        for window, needed in [((0, 1), 1), ((0, 1, 2), 2)]:
+            for phrase, value in self.special_cases:
+                if len(phrase) == len(window):
+                    hit = (remaining >= needed) & np.logical_and.reduce([c[k] == word for k, word in zip(window, phrase)])
+                    result[hit] = value
+        for window in [(-3, -2, -1), (-3, -2), (-2, -1)]:
+            for phrase, value in self.booster_phrases:
+                if len(phrase) == len(window):
+                    hit = np.logical_and.reduce([c[k] == word for k, word in zip(window, phrase)])
+                    result = np.where(hit, result + value, result)
+        return result
+
+    def _score_valence(self, sentiments, doc, lengths, exclamations, questions):
+        """Sums the token valences of every text into VADER's neg, neu, pos and compound."""
+        n_docs = len(lengths)
+        if exclamations is None:
+            amplifier = np.zeros(n_docs)
+        else:
+            amplifier = _punctuation_amplifier(np.asarray(exclamations), np.asarray(questions))
+
+        total = np.bincount(doc, weights=sentiments, minlength=n_docs)
+        total = np.where(total > 0, total + amplifier, np.where(total < 0, total - amplifier, total))
+        compound = np.clip(total / np.sqrt(total * total + 15), -1.0, 1.0)
+
+        positive = sentiments > 0
+        negative = sentiments < 0
+        pos_sum = np.bincount(doc[positive], weights=sentiments[positive] + 1, minlength=n_docs)
+        neg_sum = np.bincount(doc[negative], weights=sentiments[negative] - 1, minlength=n_docs)
+        neu_count = np.bincount(doc[sentiments == 0], minlength=n_docs)
+        # The punctuation emphasis goes to whichever side is larger
+        more_positive = pos_sum > -neg_sum
+        more_negative = pos_sum < -neg_sum
+        pos_sum = np.where(more_positive, pos_sum + amplifier, pos_sum)
+        neg_sum = np.where(more_negative, neg_sum - amplifier, neg_sum)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            denominator = pos_sum + np.abs(neg_sum) + neu_count
+            scores = np.column_stack([np.abs(neg_sum / denominator), np.abs(neu_count / denominator),
+                                      np.abs(pos_sum / denominator), compound])
+        scores[lengths == 0] = 0.0
+        # Python's round, as VADER, rather than np.round, which differs on some halves
+        return np.array([[round(neg, 3), round(neu, 3), round(pos, 3), round(compound, 4)]
+                         for neg, neu, pos, compound in scores.tolist()]).reshape(-1, len(SCORE_KEYS))